@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .errors import UpstreamError
+from .providers.base import BaseProvider
+
+# (priority, queue deadline in seconds or None) of the request being served; set by the /v1 handlers.
+_request: contextvars.ContextVar[Tuple[int, Optional[float]]] = contextvars.ContextVar("admission_request", default=(0, None))
+
+def set_request(priority: int, deadline_seconds: Optional[float]) -> None:
+    _request.set((int(priority), deadline_seconds))
+
+def overloaded(status: str) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail={"error": {"message": f"upstream overloaded ({status})"}}, headers={"Retry-After": "1"}
+    )
+
+class AdmissionController:
+    """Concurrency limit for one upstream with a bounded priority queue.
+
+    Calls beyond ``limit`` wait, highest priority first (FIFO within a priority).
+    A caller is turned away with 503 when the queue is full and it does not
+    outrank anyone queued (otherwise the lowest-priority waiter is shed), when
+    the estimated wait already exceeds its queue deadline, or when the deadline
+    passes while queued.
+
+    ``mode``: ``fixed`` keeps ``limit``. ``aimd`` adds ~1 per ``limit`` good
+    calls and multiplies by ``backoff_ratio`` on overload errors or latency over
+    ``target_latency_seconds``. ``gradient`` scales the limit by the ratio of
+    long-term to recent latency (clamped to [0.5, 1]) plus sqrt(limit) of
+    headroom, smoothed.
+    """
+
+    def __init__(
+        self,
+        limit: int = 64,
+        mode: str = "fixed",
+        min_limit: int = 1,
+        max_limit: int = 1024,
+        max_queue: int = 256,
+        queue_timeout_seconds: float = 2.0,
+        target_latency_seconds: Optional[float] = None,
+        backoff_ratio: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if mode not in ("fixed", "aimd", "gradient"):
+            raise ValueError(f"unknown admission mode '{mode}'")
+        self.mode = mode
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self._limit = float(max(1, int(limit)))
+        if mode != "fixed":  # bounds only constrain adaptive limits
+            self._limit = min(float(self.max_limit), max(float(self.min_limit), self._limit))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_seconds = float(queue_timeout_seconds)
+        self.target_latency_seconds = target_latency_seconds
+        self.backoff_ratio = float(backoff_ratio)
+        self.clock = clock
+        self.in_flight = 0
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._service_seconds: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.shed = 0
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._limit))
+
+    def _estimated_wait(self, ahead: int) -> float:
+        # Rough: each slot frees up once per average service time.
+        if self._service_seconds is None:
+            return 0.0
+        return (ahead + 1) / self.limit * self._service_seconds
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, deadline_seconds: Optional[float] = None) -> AsyncIterator[None]:
+        await self._acquire(priority, deadline_seconds)
+        start = self.clock()
+        overload = False
+        try:
+            yield
+        except UpstreamError as e:
+            overload = e.retryable
+            raise
+        finally:
+            self._release(self.clock() - start, overload)
+
+    async def _acquire(self, priority: int, deadline_seconds: Optional[float]) -> None:
+        if self.in_flight < self.limit and self._queued == 0:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        timeout = self.queue_timeout_seconds if deadline_seconds is None else min(deadline_seconds, self.queue_timeout_seconds)
+        ahead = sum(1 for p, _s, f in self._heap if not f.done() and -p >= priority)
+        if self._estimated_wait(ahead) > timeout:
+            self.rejected_deadline += 1
+            raise overloaded("queue wait over deadline")
+        if self._queued >= self.max_queue and not self._shed_below(priority):
+            self.rejected_full += 1
+            raise overloaded("queue full")
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (-priority, next(self._seq), fut))
+        self._queued += 1
+        try:
+            await asyncio.wait({fut}, timeout=timeout)
+        except BaseException:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release(None, False)  # granted just as we were cancelled: give it back
+            elif not fut.done():
+                fut.cancel()
+                self._queued -= 1
+            raise
+        if not fut.done():
+            fut.cancel()
+            self._queued -= 1
+            self.timed_out += 1
+            raise overloaded("queue deadline exceeded")
+        fut.result()  # re-raises if this waiter was shed
+
+    def _shed_below(self, priority: int) -> bool:
+        live = [(p, s, f) for p, s, f in self._heap if not f.done()]
+        if not live:
+            return False
+        lowest = max(live, key=lambda e: (e[0], e[1]))  # lowest priority, newest
+        if -lowest[0] >= priority:
+            return False
+        lowest[2].set_exception(overloaded("shed for higher priority"))
+        self._queued -= 1
+        self.shed += 1
+        return True
+
+    def _release(self, latency: Optional[float], overload: bool) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency, overload)
+        while self._heap and self.in_flight < self.limit:
+            _p, _s, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue
+            self._queued -= 1
+            self.in_flight += 1
+            self.admitted += 1
+            fut.set_result(None)
+
+    def _observe(self, latency: float, overload: bool) -> None:
+        s = self._service_seconds
+        self._service_seconds = latency if s is None else s + 0.1 * (latency - s)
+        if self.mode == "aimd":
+            slow = self.target_latency_seconds is not None and latency > self.target_latency_seconds
+            if overload or slow:
+                self._limit *= self.backoff_ratio
+            else:
+                self._limit += 1.0 / self._limit
+        elif self.mode == "gradient":
+            long = self._long_latency
+            self._long_latency = latency if long is None else long + 0.01 * (latency - long)
+            if overload:
+                new = self._limit * 0.5
+            else:
+                gradient = max(0.5, min(1.0, self._long_latency / max(latency, 1e-9)))
+                new = self._limit * gradient + math.sqrt(self._limit)
+            self._limit = 0.8 * self._limit + 0.2 * new
+        if self.mode != "fixed":
+            self._limit = min(float(self.max_limit), max(float(self.min_limit), self._limit))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "timed_out": self.timed_out,
+            "shed": self.shed,
+        }
+
+class AdmittedProvider(BaseProvider):
+    """Runs every call to ``inner`` inside an ``AdmissionController`` slot.
+
+    Priority and queue deadline come from ``set_request`` in the calling task.
+    Streams hold their slot until the stream ends.
+    """
+
+    def __init__(self, name: str, inner: BaseProvider, controller: AdmissionController):
+        self.name = name
+        self.inner = inner
+        self.controller = controller
+
+    async def startup(self) -> None:
+        await self.inner.startup()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    async def _call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.controller.slot(*_request.get()):
+            return await getattr(self.inner, method)(payload)
+
+    async def _stream(self, method: str, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async with self.controller.slot(*_request.get()):
+            async for chunk in getattr(self.inner, method)(payload):
+                yield chunk
+
+    async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("chat_completions", payload)
+
+    async def completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("completions", payload)
+
+    async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("embeddings", payload)
+
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("chat_completions_stream", payload):
+            yield chunk
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("completions_stream", payload):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.inner.stats(), "admission": self.controller.stats()}
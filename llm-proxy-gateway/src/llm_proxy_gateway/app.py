@@ -1,152 +1,605 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import hashlib
-import json
 import logging
-from typing import Any, Dict, Optional
-
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-
-from .cache import TTLCache
-from .config import LoadedConfig
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.middleware import Middleware
+from pydantic import BaseModel, ValidationError
+
+from . import jsonutil
+
+from .admission import set_request
+from .batch import BATCH_ENDPOINTS, BatchRunner, BatchStore, public
+from .cache import ResponseCache, TieredCache, build_cache
+from .config import LoadedConfig, load_config
+from .digests import MessageDigests
+from .embeddings import EmbeddingsBatcher, embed_with_item_cache
 from .errors import http_error
-from .logging import setup_logging
-from .middleware.access_log import access_log_middleware
-from .middleware.auth import auth_middleware
-from .middleware.body_limit import body_limit_middleware
-from .middleware.rate_limit import TokenBucketLimiter, rate_limit_middleware
-from .middleware.request_id import request_id_middleware
-from .policies.basic import enforce_model_allowlist, enforce_prompt_size, extract_prompt_from_chat
-from .routing import ProviderRegistry, build_registry, provider_from_model
+from .jsonutil import FastJSONResponse
+from .keystore import ANONYMOUS, KeyStore, key_id, watch_config
+from .logging import logging_stats, setup_logging
+from .metrics import METRICS_DIR_ENV, GatewayMetrics
+from .middleware.access_log import AccessLogMiddleware
+from .middleware.auth import AuthMiddleware
+from .middleware.body_limit import BodyLimitMiddleware
+from .middleware.in_flight import InFlightCounter, InFlightMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.rate_limit import (
+    BucketLimiter,
+    RateLimitMiddleware,
+    TokenLimits,
+    TokenReservation,
+    TokenUsageLimiter,
+    build_limiter,
+)
+from .middleware.request_id import RequestIdMiddleware
+from .policies.basic import enforce_model_allowlist, enforce_prompt_length, enforce_prompt_size
+from .resilience import Target, call_with_fallback, stream_with_fallback
+from .routing import ProviderRegistry, build_registry, route_chain
 from .schemas.openai import ChatCompletionsRequest, CompletionsRequest, EmbeddingsRequest
+from .singleflight import SingleFlight
 
 log = logging.getLogger("llm-proxy")
 
+CONFIG_ENV = "LLM_PROXY_CONFIG"
+
+M = TypeVar("M", bound=BaseModel)
+
 def _cache_key(path: str, payload: Dict[str, Any]) -> str:
-    raw = json.dumps({"path": path, "payload": payload}, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    raw = jsonutil.dumps({"path": path, "payload": payload}, sort_keys=True)
     return hashlib.sha256(raw).hexdigest()
 
+async def _parse_body(request: Request, model: Type[M]) -> Tuple[M, Dict[str, Any]]:
+    """Decode the request body once and validate it.
+
+    Returns the validated model plus the payload dict that policies, the cache key
+    and the upstream call all share. Top-level scalars come from the model (so
+    defaults and coercions match ``model_dump()``); nested containers such as
+    ``messages`` are the decoded objects themselves, not re-dumped copies.
+    """
+    raw = await request.body()
+    try:
+        data = jsonutil.loads(raw)
+    except ValueError as e:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", 0), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}]
+        ) from None
+    return _validated(model, data)
+
+def _validated(model: Type[M], data: Any) -> Tuple[M, Dict[str, Any]]:
+    try:
+        req = model.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)], body=data
+        ) from None
+    payload: Dict[str, Any] = {}
+    for name in model.model_fields:
+        value = getattr(req, name)
+        if value is None and name not in req.model_fields_set:
+            continue  # unset optional parameter: let the upstream apply its default
+        payload[name] = value if value is None or isinstance(value, (str, int, float, bool)) else data[name]
+    return req, payload
+
+def _metered(res: Optional[TokenReservation], call: Callable[..., Awaitable[Dict[str, Any]]]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    # Record the usage of every real upstream response against the reservation.
+    if res is None:
+        return call
+
+    async def run(*args: Any) -> Dict[str, Any]:
+        out = await call(*args)
+        res.record(out.get("usage"))
+        return out
+
+    return run
+
+async def _stream_response(chunks: AsyncIterator[bytes]) -> StreamingResponse:
+    # Pull the first chunk before committing to a 200 so upstream/connect errors
+    # still surface as a normal error response; everything after is relayed as-is.
+    try:
+        first: Optional[bytes] = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 def create_app(loaded: LoadedConfig) -> FastAPI:
     cfg = loaded.cfg
-    setup_logging(cfg.server.log_level)
-
-    app = FastAPI(title="llm-proxy-gateway", version="0.1.0")
+    setup_logging(cfg.server.log_level, cfg.logging)
 
     registry: ProviderRegistry = build_registry(cfg.routing.providers)
-    limiter = TokenBucketLimiter(
+    metrics: Optional[GatewayMetrics] = None
+    if cfg.metrics.enabled:
+        metrics = GatewayMetrics(os.environ.get(METRICS_DIR_ENV) or cfg.metrics.multiprocess_dir, cfg.metrics.buckets)
+    keys = KeyStore.from_cfg(cfg.auth)
+
+    limiter = build_limiter(
+        cfg.rate_limit,
+        "requests",
         refill_per_sec=cfg.rate_limit.per_key.refill_per_sec,
         capacity=cfg.rate_limit.per_key.capacity,
     )
-    cache: Optional[TTLCache] = None
-    if cfg.cache.enabled:
-        cache = TTLCache(ttl_seconds=cfg.cache.ttl_seconds, max_items=cfg.cache.max_items)
-
-    @app.middleware("http")
-    async def _request_id(request: Request, call_next):
-        return await request_id_middleware(request, call_next)
-
-    @app.middleware("http")
-    async def _body_limit(request: Request, call_next):
-        return await body_limit_middleware(cfg.server.request_body_max_bytes, request, call_next)
-
-    @app.middleware("http")
-    async def _auth(request: Request, call_next):
-        return await auth_middleware(cfg.auth.enabled, cfg.auth.api_keys, request, call_next)
-
-    @app.middleware("http")
-    async def _rate_limit(request: Request, call_next):
-        return await rate_limit_middleware(cfg.rate_limit.enabled, limiter, request, call_next)
-
-    @app.middleware("http")
-    async def _access_log(request: Request, call_next):
-        return await access_log_middleware(request, call_next)
+    limiters: List[BucketLimiter] = [limiter]
+    digests = MessageDigests(cfg.policies.message_digest_items, cfg.policies.message_digest_chars)
+    token_limiter: Optional[TokenUsageLimiter] = None
+    tok = cfg.rate_limit.tokens
+    if cfg.rate_limit.enabled and tok.enabled:
+        token_limiter = TokenUsageLimiter(
+            prompt=build_limiter(cfg.rate_limit, "prompt_tokens", tok.prompt_tokens_per_sec, tok.prompt_capacity),
+            completion=build_limiter(cfg.rate_limit, "completion_tokens", tok.completion_tokens_per_sec, tok.completion_capacity),
+            chars_per_token=tok.chars_per_token,
+            default_max_tokens=tok.default_max_tokens,
+            overrides={key_id(k): TokenLimits(**v.model_dump()) for k, v in tok.overrides.items()},
+            message_chars=digests.text_chars,
+        )
+        limiters += [token_limiter.prompt, token_limiter.completion]
+
+    async def gc_limiters() -> None:
+        # Limiters backed by one shared table collect it once, a slice at a time.
+        owners = list({id(o): o for o in (getattr(lim, "table", lim) for lim in limiters)}.values())
+        while True:
+            await asyncio.sleep(cfg.rate_limit.gc_interval_seconds)
+            for owner in owners:
+                if hasattr(owner, "gc_slices"):
+                    for _ in owner.gc_slices():
+                        await asyncio.sleep(0)
+                else:
+                    owner.gc()
+
+    @contextmanager
+    def token_budget(request: Request, path: str, payload: Dict[str, Any], settle: bool = True) -> Iterator[Optional[TokenReservation]]:
+        if token_limiter is None:
+            yield None
+            return
+        principal = getattr(request.state, "principal", ANONYMOUS)
+        try:
+            res = token_limiter.reserve(principal.key_id, path, payload, principal.token_limits)
+        except HTTPException as e:
+            if metrics is not None and e.status_code == 429:
+                metrics.rate_limited.inc("tokens")
+            raise
+        try:
+            yield res
+        except BaseException:
+            token_limiter.settle(res, refund=True)
+            raise
+        if settle:
+            token_limiter.settle(res)
+
+    cache: Optional[ResponseCache] = build_cache(cfg.cache)
+    flight: Optional[SingleFlight] = None
+    if cache is not None and cfg.cache.single_flight:
+        flight = SingleFlight()
+    batcher: Optional[EmbeddingsBatcher] = None
+    if cfg.embeddings.batch_enabled:
+        batcher = EmbeddingsBatcher(cfg.embeddings.batch_window_ms, cfg.embeddings.batch_max_items)
+
+    if metrics is not None and cache is not None:
+        def collect_cache() -> None:
+            l1 = cache.l1 if isinstance(cache, TieredCache) else cache
+            tiers = [("memory", l1.hits, l1.misses, l1.evictions)]
+            if isinstance(cache, TieredCache):
+                tiers.append(("disk", cache.l2.hits, cache.l2.misses, 0))
+            for tier, hits, misses, evictions in tiers:
+                metrics.cache_hits.set(tier, value=hits)
+                metrics.cache_misses.set(tier, value=misses)
+                metrics.cache_evictions.set(tier, value=evictions)
+
+        metrics.registry.on_collect(collect_cache)
+
+    # Client-chosen model names would make unbounded label series. Configured names always
+    # get a label; with no allowlist, names that an upstream actually served are learned
+    # up to max_model_labels. Everything else is "other".
+    label_models = set(cfg.metrics.model_labels) | set(cfg.routing.allowed_models) | set(cfg.routing.fallbacks)
+    for chain in cfg.routing.fallbacks.values():
+        label_models.update(chain)
+    learn_labels = not cfg.routing.allowed_models
+
+    def model_label(payload: Dict[str, Any], outcome: str) -> str:
+        model = str(payload.get("model"))
+        if model in label_models:
+            return model
+        if learn_labels and outcome == "ok" and len(label_models) < cfg.metrics.max_model_labels:
+            label_models.add(model)
+            return model
+        return "other"
+
+    def upstream(provider_name: str, call: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+        if metrics is None:
+            return call
+
+        async def run(payload: Dict[str, Any]) -> Dict[str, Any]:
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                out = await call(payload)
+                outcome = "ok"
+                return out
+            finally:
+                model = model_label(payload, outcome)
+                metrics.upstream.inc(provider_name, model, outcome)
+                metrics.upstream_seconds.observe(time.perf_counter() - start, provider_name, model)
+
+        return run
+
+    def upstream_stream(provider_name: str, open_stream: Callable[[Dict[str, Any]], AsyncIterator[bytes]]) -> Callable[[Dict[str, Any]], AsyncIterator[bytes]]:
+        if metrics is None:
+            return open_stream
+
+        async def run(payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+            # Latency of a stream is until its last chunk; a client disconnect counts as an error.
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                async for chunk in open_stream(payload):
+                    yield chunk
+                outcome = "ok"
+            finally:
+                model = model_label(payload, outcome)
+                metrics.upstream.inc(provider_name, model, outcome)
+                metrics.upstream_seconds.observe(time.perf_counter() - start, provider_name, model)
+
+        return run
+
+    for model in cfg.routing.fallbacks:
+        for name, target in route_chain(model, cfg.routing):
+            if name not in registry.providers:
+                raise ValueError(f"fallback '{target}' for '{model}' uses unknown provider '{name}'")
+
+    # One wrapped callable per (provider, method), so callers that key on the call
+    # (the embeddings batcher) see the same object on every request.
+    calls: Dict[Tuple[str, str], Any] = {}
+
+    def provider_call(name: str, method: str, stream: bool = False) -> Any:
+        fn = calls.get((name, method))
+        if fn is None:
+            wrap = upstream_stream if stream else upstream
+            fn = calls[(name, method)] = wrap(name, getattr(registry.get(name), method))
+        return fn
+
+    def targets(model: str, method: str) -> List[Target]:
+        # The requested model first, then its configured fallbacks.
+        return [(t, provider_call(name, method)) for name, t in route_chain(model, cfg.routing)]
+
+    def stream_targets(model: str, method: str) -> List[Target]:
+        return [(t, provider_call(name, method, stream=True)) for name, t in route_chain(model, cfg.routing)]
+
+    async def flush_metrics() -> None:
+        while True:
+            await asyncio.sleep(cfg.metrics.flush_interval_seconds)
+            await metrics.registry.awrite_snapshot()
+
+    async def cached(path: str, payload: Dict[str, Any], call: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if cache is None:
+            return await call()
+        key = digests.chat_key(path, payload) if path == "/v1/chat/completions" else _cache_key(path, payload)
+        hit = await cache.aget(key)
+        if hit is not None:
+            return hit
+
+        async def fill() -> Dict[str, Any]:
+            out = await call()
+            cache.set(key, out)
+            return out
+
+        if flight is None:
+            return await fill()
+        # Identical requests arriving while the first is upstream share its result.
+        return await flight.do(key, fill)
+
+    def check_prompt(path: str, payload: Dict[str, Any]) -> None:
+        if not cfg.policies.enabled:
+            return
+        if path == "/v1/chat/completions":
+            # Memoized per message, so a long history is not re-joined every turn.
+            enforce_prompt_length(digests.prompt_chars(payload["messages"]), cfg.policies.max_prompt_chars)
+            return
+        if isinstance(payload["prompt"], list):
+            # prompt can be list or str
+            prompt = "\n".join([str(x) for x in payload["prompt"]])
+        else:
+            prompt = str(payload["prompt"])
+        enforce_prompt_size(prompt, cfg.policies.max_prompt_chars)
+
+    async def complete(path: str, method: str, model: str, payload: Dict[str, Any], res: Optional[TokenReservation]) -> Dict[str, Any]:
+        call = functools.partial(call_with_fallback, targets(model, method))
+        return await cached(path, payload, _metered(res, lambda: call(payload)))
+
+    async def embed_all(model: str, payload: Dict[str, Any], res: Optional[TokenReservation]) -> Dict[str, Any]:
+        embed = functools.partial(call_with_fallback, targets(model, "embeddings"))
+        if batcher is not None:
+            # The partial is new per request; batch on the route chain instead.
+            embed = functools.partial(batcher.embed, call=embed, key=tuple(route_chain(model, cfg.routing)))
+        embed = _metered(res, embed)
+        if cache is not None and cfg.embeddings.per_item_cache:
+            return await embed_with_item_cache(cache, payload, embed)
+        return await cached("/v1/embeddings", payload, lambda: embed(payload))
+
+    interactive = InFlightCounter()
+    batches: Optional[BatchStore] = None
+    batch_runner: Optional[BatchRunner] = None
+    if cfg.batch.enabled:
+        batch_schemas: Dict[str, Tuple[Type[BaseModel], Optional[str]]] = {
+            "/v1/chat/completions": (ChatCompletionsRequest, "chat_completions"),
+            "/v1/completions": (CompletionsRequest, "completions"),
+            "/v1/embeddings": (EmbeddingsRequest, None),
+        }
+
+        async def run_batch_request(job: Dict[str, Any], url: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            # Same validation, allowlists, policies, routing and cache as the live endpoints;
+            # no request or token rate limits (the runner's concurrency bounds batch load).
+            schema, method = batch_schemas[url]
+            set_request(cfg.batch.priority, None)
+            try:
+                req, payload = _validated(schema, body)
+                if getattr(req, "stream", False):
+                    raise http_error(400, "stream is not supported in batch requests")
+                enforce_model_allowlist(req.model, cfg.routing.allowed_models)
+                enforce_model_allowlist(req.model, job["allowed_models"])
+                if method is None:
+                    return 200, await embed_all(req.model, payload, None)
+                check_prompt(url, payload)
+                return 200, await complete(url, method, req.model, payload, None)
+            except RequestValidationError as e:
+                msg = "; ".join(f"{'.'.join(str(x) for x in err['loc'][1:])}: {err['msg']}" for err in e.errors())
+                return 400, {"error": {"message": f"invalid request: {msg}"}}
+            except HTTPException as e:
+                return e.status_code, e.detail if isinstance(e.detail, dict) else {"error": {"message": str(e.detail)}}
+
+        batches = BatchStore(cfg.batch.dir)
+        batch_runner = BatchRunner(
+            batches,
+            run_batch_request,
+            provider_of=lambda body: route_chain(str(body.get("model", "")), cfg.routing)[0][0],
+            concurrency=cfg.batch.concurrency,
+            poll_interval_seconds=cfg.batch.poll_interval_seconds,
+            busy=(lambda: interactive.value >= cfg.batch.yield_above_in_flight) if cfg.batch.yield_above_in_flight > 0 else (lambda: False),
+        )
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        await registry.startup()
+        if batch_runner is not None:
+            batch_runner.start()
+        if cache is not None:
+            cache.start()
+        tasks = []
+        if cfg.rate_limit.gc_interval_seconds > 0:
+            tasks.append(asyncio.create_task(gc_limiters()))
+        if cfg.auth.enabled and loaded.path and cfg.auth.reload_interval_seconds > 0:
+            tasks.append(asyncio.create_task(watch_config(keys, loaded.path, cfg.auth.reload_interval_seconds)))
+        if metrics is not None and metrics.registry.multiprocess_dir and cfg.metrics.flush_interval_seconds > 0:
+            tasks.append(asyncio.create_task(flush_metrics()))
+        try:
+            yield
+        finally:
+            for t in tasks:
+                t.cancel()
+            if batch_runner is not None:
+                await batch_runner.aclose()
+            if cache is not None:
+                await cache.aclose()
+            await registry.aclose()
+            if metrics is not None:
+                await metrics.registry.awrite_snapshot()
+
+    # Pure ASGI middleware, outermost first: every response (including 401/413/429
+    # rejections) gets a request id and an access-log line, and rate limiting runs
+    # after auth so it counts against the caller's key.
+    public_paths = [cfg.metrics.path] if metrics is not None and not cfg.metrics.require_auth else []
+    middleware = [
+        Middleware(RequestIdMiddleware),
+        *([Middleware(MetricsMiddleware, metrics=metrics)] if metrics is not None else []),
+        Middleware(
+            AccessLogMiddleware,
+            sample_rate=cfg.logging.sample_rate,
+            route_sample_rates=cfg.logging.route_sample_rates,
+            slow_request_ms=cfg.logging.slow_request_ms,
+        ),
+        *([Middleware(InFlightMiddleware, counter=interactive, paths=BATCH_ENDPOINTS)] if batch_runner is not None else []),
+        Middleware(
+            BodyLimitMiddleware,
+            max_bytes=cfg.server.request_body_max_bytes,
+            path_limits={"/v1/files": cfg.batch.max_file_bytes} if batches is not None else None,
+        ),
+        Middleware(AuthMiddleware, enabled=cfg.auth.enabled, keys=keys, public_paths=public_paths),
+        Middleware(
+            RateLimitMiddleware,
+            enabled=cfg.rate_limit.enabled,
+            limiter=limiter,
+            public_paths=public_paths,
+            on_reject=(lambda: metrics.rate_limited.inc("requests")) if metrics is not None else None,
+        ),
+    ]
+    app = FastAPI(
+        title="llm-proxy-gateway",
+        version="0.1.0",
+        lifespan=lifespan,
+        middleware=middleware,
+        default_response_class=FastJSONResponse,
+    )
 
     @app.get("/healthz")
     async def healthz():
         return {"ok": True}
 
-    @app.post("/v1/chat/completions")
-    async def chat_completions(req: ChatCompletionsRequest, request: Request):
-        model = req.model
+    if metrics is not None:
+        @app.get(cfg.metrics.path, include_in_schema=False)
+        async def prometheus_metrics():
+            return PlainTextResponse(await metrics.arender(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    def check_model(request: Request, model: str) -> None:
         enforce_model_allowlist(model, cfg.routing.allowed_models)
+        enforce_model_allowlist(model, getattr(request.state, "principal", ANONYMOUS).allowed_models)
+
+    def admit(request: Request) -> None:
+        # Queue priority and deadline for providers with admission control.
+        deadline: Optional[float] = None
+        raw = request.headers.get("x-queue-deadline-ms")
+        if raw:
+            try:
+                deadline = max(0.0, float(raw)) / 1000.0
+            except ValueError:
+                raise http_error(400, "invalid X-Queue-Deadline-Ms") from None
+        set_request(getattr(request.state, "principal", ANONYMOUS).priority, deadline)
+
+    @app.get("/stats")
+    async def stats():
+        out: Dict[str, Any] = {"providers": registry.stats(), "message_digests": digests.stats()}
+        if cache is not None:
+            out["cache"] = cache.stats()
+        if flight is not None:
+            out["single_flight"] = flight.stats()
+        if batcher is not None:
+            out["embeddings_batcher"] = batcher.stats()
+        if cfg.logging.queue:
+            out["logging"] = logging_stats()
+        if batch_runner is not None:
+            out["batch"] = {**batch_runner.stats(), "interactive_in_flight": interactive.value}
+        return out
 
-        if cfg.policies.enabled:
-            prompt = extract_prompt_from_chat([m.model_dump() for m in req.messages])
-            enforce_prompt_size(prompt, cfg.policies.max_prompt_chars)
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        req, payload = await _parse_body(request, ChatCompletionsRequest)
+        model = req.model
+        check_model(request, model)
+        admit(request)
 
-        provider_name, upstream_model = provider_from_model(model)
-        provider = registry.get(provider_name or cfg.routing.default_provider)
+        check_prompt("/v1/chat/completions", payload)
 
-        payload = req.model_dump()
         # Preserve original model string in the response (OpenAI-compatible), but pass upstream model to provider if desired.
         # Here we keep it simple: send the full model string; you can map it in providers if you need.
         path = "/v1/chat/completions"
 
-        if cache:
-            key = _cache_key(path, payload)
-            hit = cache.get(key)
-            if hit is not None:
-                return JSONResponse(hit)
-
-        out = await provider.chat_completions(payload)
-
-        if cache:
-            cache.set(key, out)
-        return JSONResponse(out)
+        if req.stream:
+            # Streams carry no usage: the estimate stays charged unless the stream fails to start.
+            with token_budget(request, path, payload, settle=False):
+                return await _stream_response(stream_with_fallback(stream_targets(model, "chat_completions_stream"), payload))
+        with token_budget(request, path, payload) as res:
+            out = await complete(path, "chat_completions", model, payload, res)
+        return FastJSONResponse(out)
 
     @app.post("/v1/completions")
-    async def completions(req: CompletionsRequest, request: Request):
+    async def completions(request: Request):
+        req, payload = await _parse_body(request, CompletionsRequest)
         model = req.model
-        enforce_model_allowlist(model, cfg.routing.allowed_models)
-
-        if cfg.policies.enabled:
-            # prompt can be list or str
-            if isinstance(req.prompt, list):
-                prompt = "\n".join([str(x) for x in req.prompt])
-            else:
-                prompt = str(req.prompt)
-            enforce_prompt_size(prompt, cfg.policies.max_prompt_chars)
-
-        provider_name, _upstream = provider_from_model(model)
-        provider = registry.get(provider_name or cfg.routing.default_provider)
+        check_model(request, model)
+        admit(request)
 
-        payload = req.model_dump()
         path = "/v1/completions"
+        check_prompt(path, payload)
 
-        if cache:
-            key = _cache_key(path, payload)
-            hit = cache.get(key)
-            if hit is not None:
-                return JSONResponse(hit)
-
-        out = await provider.completions(payload)
-
-        if cache:
-            cache.set(key, out)
-        return JSONResponse(out)
+        if req.stream:
+            with token_budget(request, path, payload, settle=False):
+                return await _stream_response(stream_with_fallback(stream_targets(model, "completions_stream"), payload))
+        with token_budget(request, path, payload) as res:
+            out = await complete(path, "completions", model, payload, res)
+        return FastJSONResponse(out)
 
     @app.post("/v1/embeddings")
-    async def embeddings(req: EmbeddingsRequest, request: Request):
+    async def embeddings(request: Request):
+        req, payload = await _parse_body(request, EmbeddingsRequest)
         model = req.model
-        enforce_model_allowlist(model, cfg.routing.allowed_models)
+        check_model(request, model)
+        admit(request)
 
-        provider_name, _upstream = provider_from_model(model)
-        provider = registry.get(provider_name or cfg.routing.default_provider)
-
-        payload = req.model_dump()
         path = "/v1/embeddings"
 
-        if cache:
-            key = _cache_key(path, payload)
-            hit = cache.get(key)
-            if hit is not None:
-                return JSONResponse(hit)
+        with token_budget(request, path, payload) as res:
+            out = await embed_all(model, payload, res)
+        return FastJSONResponse(out)
+
+    if batches is not None:
+        def owner(request: Request) -> str:
+            return getattr(request.state, "principal", ANONYMOUS).key_id
+
+        @app.post("/v1/files")
+        async def upload_file(request: Request, purpose: str = "batch", filename: str = "batch.jsonl"):
+            # Raw JSONL body (not multipart), streamed to disk.
+            if purpose != "batch":
+                raise http_error(400, "only purpose=batch is supported")
+            return await batches.save_upload(owner(request), request.stream(), cfg.batch.max_file_bytes, filename)
+
+        @app.get("/v1/files/{file_id}")
+        async def get_file(request: Request, file_id: str):
+            return {k: v for k, v in batches.file(file_id, owner(request)).items() if k != "owner"}
+
+        @app.get("/v1/files/{file_id}/content")
+        async def file_content(request: Request, file_id: str):
+            batches.file(file_id, owner(request))
+            return FileResponse(batches.file_path(file_id), media_type="application/jsonl")
+
+        @app.post("/v1/batches")
+        async def create_batch(request: Request):
+            try:
+                body = jsonutil.loads(await request.body())
+            except ValueError:
+                raise http_error(400, "request body is not valid JSON") from None
+            if not isinstance(body, dict) or not body.get("input_file_id") or not body.get("endpoint"):
+                raise http_error(400, "input_file_id and endpoint are required")
+            if body.get("metadata") is not None and not isinstance(body["metadata"], dict):
+                raise http_error(400, "metadata must be an object")
+            principal = getattr(request.state, "principal", ANONYMOUS)
+            meta = batches.create(
+                principal.key_id,
+                str(body["input_file_id"]),
+                str(body["endpoint"]),
+                str(body.get("completion_window", "24h")),
+                body.get("metadata"),
+                sorted(principal.allowed_models),
+            )
+            batch_runner.wake()
+            return public(meta)
+
+        @app.get("/v1/batches")
+        async def list_batches(request: Request, limit: int = 20):
+            jobs = await asyncio.to_thread(batches.list, owner(request), limit)
+            return {"object": "list", "data": [public(m) for m in jobs]}
+
+        @app.get("/v1/batches/{batch_id}")
+        async def get_batch(request: Request, batch_id: str):
+            return public(batches.get(batch_id, owner(request)))
+
+        @app.post("/v1/batches/{batch_id}/cancel")
+        async def cancel_batch(request: Request, batch_id: str):
+            meta = batches.cancel(batch_id, owner(request))
+            batch_runner.wake()
+            return public(meta)
 
-        out = await provider.embeddings(payload)
+    return app
 
-        if cache:
-            cache.set(key, out)
-        return JSONResponse(out)
+def app_from_env() -> FastAPI:
+    """App factory for uvicorn (``factory=True``): config path from ``LLM_PROXY_CONFIG``.
 
-    return app
+    Every worker process calls this after the fork, so each gets its own
+    provider pools, caches and background tasks.
+    """
+    path = os.environ.get(CONFIG_ENV)
+    if not path:
+        raise RuntimeError(f"{CONFIG_ENV} is not set")
+    return create_app(load_config(path))
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+from fastapi import HTTPException
+
+from .errors import UpstreamError
+from .hedging import Hedger
+from .providers.base import BaseProvider
+
+def is_endpoint_failure(e: BaseException) -> bool:
+    """Errors that say something about the endpoint (transport, upstream 5xx), not about the request."""
+    if isinstance(e, UpstreamError):
+        return e.upstream_status is None or e.upstream_status >= 500
+    if isinstance(e, httpx.TransportError):
+        return True
+    return isinstance(e, HTTPException) and e.status_code >= 500 and e.status_code != 501
+
+class Endpoint:
+    """One upstream behind a balanced provider, with its load and health state."""
+
+    def __init__(self, name: str, provider: BaseProvider, weight: float = 1.0):
+        self.name = name
+        self.provider = provider
+        self.weight = max(float(weight), 1e-6)
+        self.outstanding = 0
+        self.ewma_seconds: Optional[float] = None
+        self.last_observed = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+class BalancedProvider(BaseProvider):
+    """Spread calls for one provider over several endpoints.
+
+    ``least_outstanding`` picks the endpoint with the fewest in-flight calls per
+    unit of weight. ``ewma`` multiplies that by a time-decayed moving average of
+    latency (time to first chunk for streams), so slow endpoints get less
+    traffic; endpoints with no samples yet count as the fastest known one. Ties
+    break at random.
+
+    ``eject_after`` consecutive failures take an endpoint out for
+    ``cooldown_seconds``; after that it is eligible again and one more failure
+    ejects it again. If every endpoint is ejected, the one that comes back soonest
+    is used rather than failing the request outright.
+
+    With a ``hedger``, idempotent non-streaming calls that outlast the hedge
+    delay get a second attempt on another endpoint (the same one if there is
+    only one); the first answer wins.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: Sequence[Endpoint],
+        strategy: str = "least_outstanding",
+        eject_after: int = 5,
+        cooldown_seconds: float = 30.0,
+        ewma_decay_seconds: float = 10.0,
+        hedger: Optional[Hedger] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rand: Callable[[], float] = random.random,
+    ):
+        if not endpoints:
+            raise ValueError(f"provider '{name}' has no endpoints")
+        if strategy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"unknown balancer strategy '{strategy}'")
+        self.name = name
+        self.endpoints: List[Endpoint] = list(endpoints)
+        self.strategy = strategy
+        self.eject_after = max(1, int(eject_after))
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.ewma_decay_seconds = float(ewma_decay_seconds)
+        self.hedger = hedger
+        self.clock = clock
+        self.rand = rand
+
+    async def startup(self) -> None:
+        for ep in self.endpoints:
+            await ep.provider.startup()
+
+    async def aclose(self) -> None:
+        for ep in self.endpoints:
+            await ep.provider.aclose()
+
+    def _score(self, ep: Endpoint, default_latency: float) -> float:
+        load = (ep.outstanding + 1) / ep.weight
+        if self.strategy == "ewma":
+            return load * (default_latency if ep.ewma_seconds is None else ep.ewma_seconds)
+        return load
+
+    def pick(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        now = self.clock()
+        candidates = [ep for ep in self.endpoints if ep.available(now) and ep is not exclude]
+        if not candidates and exclude is not None and exclude.available(now):
+            candidates = [exclude]
+        if not candidates:
+            return min(self.endpoints, key=lambda ep: ep.ejected_until)
+        # Endpoints without samples are scored optimistically, as fast as the fastest known one.
+        known = [ep.ewma_seconds for ep in candidates if ep.ewma_seconds is not None]
+        default_latency = min(known) if known else 1.0
+        best: Optional[Endpoint] = None
+        best_key = None
+        for ep in candidates:
+            key = (self._score(ep, default_latency), self.rand())
+            if best_key is None or key < best_key:
+                best, best_key = ep, key
+        assert best is not None
+        return best
+
+    def _observe(self, ep: Endpoint, seconds: float) -> None:
+        now = self.clock()
+        if ep.ewma_seconds is None:
+            ep.ewma_seconds = seconds
+        else:
+            alpha = 1.0 - math.exp(-max(0.0, now - ep.last_observed) / self.ewma_decay_seconds)
+            # Always move a little so a burst of samples in one instant still counts.
+            alpha = max(alpha, 0.1)
+            ep.ewma_seconds += alpha * (seconds - ep.ewma_seconds)
+        ep.last_observed = now
+
+    def _succeeded(self, ep: Endpoint) -> None:
+        ep.consecutive_failures = 0
+        ep.ejected_until = 0.0
+
+    def _failed(self, ep: Endpoint) -> None:
+        ep.failures += 1
+        ep.consecutive_failures += 1
+        now = self.clock()
+        # After a cooldown one strike is enough: the endpoint is on probation.
+        on_probation = 0.0 < ep.ejected_until <= now
+        if ep.consecutive_failures >= self.eject_after or on_probation:
+            ep.ejected_until = now + self.cooldown_seconds
+            ep.ejections += 1
+
+    @contextmanager
+    def _track(self, ep: Endpoint) -> Iterator[None]:
+        ep.outstanding += 1
+        ep.requests += 1
+        try:
+            yield
+        except BaseException as e:
+            if is_endpoint_failure(e):
+                self._failed(ep)
+            raise
+        else:
+            self._succeeded(ep)
+        finally:
+            ep.outstanding -= 1
+
+    async def _call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.hedger is None or not self.hedger.applies(method, payload):
+            return await self._attempt(method, payload, self.pick())
+        first = self.pick()
+        return await self.hedger.run(
+            lambda: self._attempt(method, payload, first),
+            lambda: self._attempt(method, payload, self.pick(exclude=first)),
+        )
+
+    async def _attempt(self, method: str, payload: Dict[str, Any], ep: Endpoint) -> Dict[str, Any]:
+        start = self.clock()
+        with self._track(ep):
+            out = await getattr(ep.provider, method)(payload)
+        self._observe(ep, self.clock() - start)
+        return out
+
+    async def _stream(self, method: str, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        ep = self.pick()
+        start = self.clock()
+        with self._track(ep):
+            first = True
+            async for chunk in getattr(ep.provider, method)(payload):
+                if first:
+                    self._observe(ep, self.clock() - start)
+                    first = False
+                yield chunk
+
+    async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("chat_completions", payload)
+
+    async def completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("completions", payload)
+
+    async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("embeddings", payload)
+
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("chat_completions_stream", payload):
+            yield chunk
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("completions_stream", payload):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        out: Dict[str, Any] = {
+            "strategy": self.strategy,
+            "endpoints": [
+                {
+                    "name": ep.name,
+                    "weight": ep.weight,
+                    "outstanding": ep.outstanding,
+                    "ewma_ms": round(ep.ewma_seconds * 1000.0, 2) if ep.ewma_seconds is not None else None,
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "ejections": ep.ejections,
+                    "ejected": not ep.available(now),
+                    **ep.provider.stats(),
+                }
+                for ep in self.endpoints
+            ],
+        }
+        if self.hedger is not None:
+            out["hedging"] = self.hedger.stats()
+        return out
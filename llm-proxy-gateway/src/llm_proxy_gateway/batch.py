@@ -0,0 +1,534 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, IO, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
+from .errors import http_error
+
+log = logging.getLogger("llm-proxy.batch")
+
+BATCH_ENDPOINTS = ("/v1/chat/completions", "/v1/completions", "/v1/embeddings")
+
+ACTIVE = ("validating", "in_progress", "finalizing", "cancelling")
+
+# (status code, response body) for one request line
+Execute = Callable[[Dict[str, Any], str, Dict[str, Any]], Awaitable[Tuple[int, Dict[str, Any]]]]
+
+# Input read per thread hop while dispatching a job
+_READ_BYTES = 1 << 20
+
+_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def _check_id(value: str) -> str:
+    # Ids become file names: refuse anything that could leave the store directory.
+    if not _ID.match(value):
+        raise http_error(404, "not found")
+    return value
+
+def _write_json(path: str, obj: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def parse_window(window: str) -> float:
+    """``"24h"`` -> seconds."""
+    m = re.fullmatch(r"(\d+)\s*h", window or "")
+    if not m or int(m.group(1)) <= 0:
+        raise http_error(400, f"invalid completion_window '{window}' (expected e.g. '24h')")
+    return int(m.group(1)) * 3600.0
+
+class BatchStore:
+    """Files and batch jobs on local disk, readable by every worker process.
+
+    ``<dir>/files/<id>.jsonl`` holds file contents with ``<id>.json`` metadata;
+    ``<dir>/batches/<id>.json`` is the batch object (rewritten atomically),
+    ``<id>.cancel`` marks a cancel request and ``<id>.lock`` is flock'ed by the
+    worker running the job.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files_dir = os.path.join(root, "files")
+        self.batches_dir = os.path.join(root, "batches")
+        os.makedirs(self.files_dir, exist_ok=True)
+        os.makedirs(self.batches_dir, exist_ok=True)
+
+    def file_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, _check_id(file_id) + ".jsonl")
+
+    def _file_meta_path(self, file_id: str) -> str:
+        return os.path.join(self.files_dir, _check_id(file_id) + ".json")
+
+    def batch_path(self, batch_id: str, suffix: str = ".json") -> str:
+        return os.path.join(self.batches_dir, _check_id(batch_id) + suffix)
+
+    def register_file(self, file_id: str, owner: str, purpose: str, filename: str) -> Dict[str, Any]:
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": os.path.getsize(self.file_path(file_id)),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "owner": owner,
+        }
+        _write_json(self._file_meta_path(file_id), meta)
+        return meta
+
+    async def save_upload(self, owner: str, chunks: AsyncIterator[bytes], max_bytes: int, filename: str) -> Dict[str, Any]:
+        file_id = "file-" + uuid.uuid4().hex[:24]
+        path = self.file_path(file_id)
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise http_error(413, f"batch file too large (>{max_bytes} bytes)")
+                    f.write(chunk)
+        except BaseException:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        if size == 0:
+            os.remove(path)
+            raise http_error(400, "empty file")
+        return self.register_file(file_id, owner, "batch", filename)
+
+    def file(self, file_id: str, owner: str) -> Dict[str, Any]:
+        meta = _read_json(self._file_meta_path(file_id))
+        if meta is None or meta.get("owner") != owner:
+            raise http_error(404, f"file '{file_id}' not found")
+        return meta
+
+    def load(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        meta = _read_json(self.batch_path(batch_id))
+        if meta is not None and meta["status"] in ("validating", "in_progress"):
+            try:
+                requested = int(os.path.getmtime(self.batch_path(batch_id, ".cancel")))
+            except OSError:
+                return meta
+            meta = {**meta, "status": "cancelling", "cancelling_at": requested}
+        return meta
+
+    def save(self, meta: Dict[str, Any]) -> None:
+        _write_json(self.batch_path(meta["id"]), meta)
+
+    def get(self, batch_id: str, owner: str) -> Dict[str, Any]:
+        meta = self.load(batch_id)
+        if meta is None or meta.get("owner") != owner:
+            raise http_error(404, f"batch '{batch_id}' not found")
+        return meta
+
+    def ids(self) -> List[str]:
+        return sorted(n[:-5] for n in os.listdir(self.batches_dir) if n.endswith(".json"))
+
+    def list(self, owner: str, limit: int = 20) -> List[Dict[str, Any]]:
+        out = [m for m in (self.load(i) for i in self.ids()) if m is not None and m.get("owner") == owner]
+        out.sort(key=lambda m: m["created_at"], reverse=True)
+        return out[:limit]
+
+    def create(self, owner: str, input_file_id: str, endpoint: str, window: str,
+               metadata: Optional[Dict[str, Any]], allowed_models: List[str]) -> Dict[str, Any]:
+        if endpoint not in BATCH_ENDPOINTS:
+            raise http_error(400, f"unsupported batch endpoint '{endpoint}'")
+        self.file(input_file_id, owner)
+        now = int(time.time())
+        batch_id = "batch_" + uuid.uuid4().hex[:24]
+        meta = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": None,
+            "expires_at": now + int(parse_window(window)),
+            "finalizing_at": None,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "cancelling_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata,
+            "owner": owner,
+            # Snapshot of the caller's model allowlist, so a resumed job is held to the same policy.
+            "allowed_models": allowed_models,
+        }
+        self.save(meta)
+        return meta
+
+    def cancel(self, batch_id: str, owner: str) -> Dict[str, Any]:
+        meta = self.get(batch_id, owner)
+        if meta["status"] not in ACTIVE:
+            raise http_error(409, f"batch '{batch_id}' is already {meta['status']}")
+        # The worker running the job (or the next to claim it) sees the marker and finalizes it.
+        with open(self.batch_path(batch_id, ".cancel"), "w"):
+            pass
+        return self.load(batch_id) or meta
+
+    def cancel_requested(self, batch_id: str) -> bool:
+        return os.path.exists(self.batch_path(batch_id, ".cancel"))
+
+def public(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """The OpenAI batch object (without the gateway's bookkeeping fields)."""
+    return {k: v for k, v in meta.items() if k not in ("owner", "allowed_models")}
+
+def _completed_ids(path: str) -> Set[str]:
+    """``custom_id``s already written to a result file; a torn last line (crash mid-write) is cut off."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    good = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                done.add(json.loads(line)["custom_id"])
+            except (ValueError, KeyError, TypeError):
+                break
+            good += len(line)
+    if good != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return done
+
+def _read_pending(src: IO[bytes], done: Set[str], size: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """About ``size`` bytes of input lines, parsed, minus blank and already finished ones; False at EOF."""
+    raw = src.readlines(size)
+    lines = []
+    for r in raw:
+        if r.strip():
+            line = json.loads(r)
+            if line["custom_id"] not in done:
+                lines.append(line)
+    return lines, bool(raw)
+
+class BatchRunner:
+    """Runs batch jobs in the background, in idle capacity.
+
+    Every ``poll_interval_seconds`` (and right after a job is created) the runner
+    looks for active jobs and claims each with a non-blocking ``flock``, so across
+    workers exactly one process runs a job; a job whose worker died is picked up
+    again, skipping requests already in its output files.
+
+    Each provider gets ``concurrency`` slots shared by all jobs in this worker
+    (``provider_of`` maps a request body to its provider). Before taking a slot,
+    dispatch waits while ``busy()`` says interactive traffic needs the capacity;
+    ``execute`` is expected to queue batch calls at the lowest admission priority.
+    Calls shed or throttled in favour of live traffic (429/503) are retried with
+    exponential backoff, up to ``max_attempts`` in all, before they count as failed.
+
+    The input is read in chunks on a thread. Every ``progress_interval_seconds`` a
+    background pass (also on a thread) appends buffered results to the output files,
+    saves the job and checks for cancellation and expiry, so a cancel takes effect
+    within one interval and a crash redoes at most one interval of finished lines.
+    """
+
+    def __init__(
+        self,
+        store: BatchStore,
+        execute: Execute,
+        provider_of: Callable[[Dict[str, Any]], str],
+        concurrency: int = 4,
+        poll_interval_seconds: float = 5.0,
+        busy: Callable[[], bool] = lambda: False,
+        progress_interval_seconds: float = 1.0,
+        max_attempts: int = 5,
+        retry_delay_seconds: float = 1.0,
+    ):
+        self.store = store
+        self.execute = execute
+        self.provider_of = provider_of
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval_seconds = float(poll_interval_seconds)
+        self.busy = busy
+        self.progress_interval_seconds = float(progress_interval_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay_seconds = float(retry_delay_seconds)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._locks: Dict[str, IO[bytes]] = {}
+        self._wake = asyncio.Event()
+        self._scanner: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.retries = 0
+        self.paused_seconds = 0.0
+
+    def start(self) -> None:
+        if fcntl is None:
+            raise ValueError("batch jobs require a POSIX host (fcntl)")
+        self._scanner = asyncio.create_task(self._scan_loop())
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def aclose(self) -> None:
+        tasks = [t for t in (self._scanner, *self._jobs.values()) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for f in self._locks.values():
+            f.close()
+        self._locks.clear()
+
+    async def _scan_loop(self) -> None:
+        while True:
+            try:
+                await self._scan()
+            except Exception:
+                log.exception("batch scan failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _claim(self, batch_id: str) -> bool:
+        f = open(self.store.batch_path(batch_id, ".lock"), "ab")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._locks[batch_id] = f
+        return True
+
+    def _release(self, batch_id: str) -> None:
+        self._jobs.pop(batch_id, None)
+        f = self._locks.pop(batch_id, None)
+        if f is not None:
+            f.close()
+
+    def _active(self, running: Set[str]) -> List[str]:
+        out = []
+        for batch_id in self.store.ids():
+            if batch_id in running:
+                continue
+            meta = self.store.load(batch_id)
+            if meta is not None and meta["status"] in ACTIVE:
+                out.append(batch_id)
+        return out
+
+    async def _scan(self) -> None:
+        # Reading every job's JSON is file I/O; keep it off the loop serving live traffic.
+        for batch_id in await asyncio.to_thread(self._active, set(self._jobs)):
+            if batch_id in self._jobs or not self._claim(batch_id):
+                continue
+            task = asyncio.create_task(self._run(batch_id))
+            task.add_done_callback(lambda _t, b=batch_id: self._release(b))
+            self._jobs[batch_id] = task
+
+    def _slot(self, provider: str) -> asyncio.Semaphore:
+        sem = self._slots.get(provider)
+        if sem is None:
+            sem = self._slots[provider] = asyncio.Semaphore(self.concurrency)
+        return sem
+
+    def _finish(self, meta: Dict[str, Any], status: str) -> None:
+        now = int(time.time())
+        meta["status"] = status
+        meta[f"{status}_at"] = now
+        self.store.save(meta)
+        log.info("batch %s %s", meta["id"], status, extra={"batch_id": meta["id"]})
+
+    def _validate(self, meta: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        errors: List[Dict[str, Any]] = []
+        seen: Set[str] = set()
+        total = 0
+        with open(self.store.file_path(meta["input_file_id"]), "rb") as f:
+            for n, raw in enumerate(f, 1):
+                if not raw.strip():
+                    continue
+                total += 1
+                try:
+                    line = json.loads(raw)
+                    cid = line["custom_id"]
+                    ok = isinstance(cid, str) and isinstance(line.get("body"), dict)
+                except (ValueError, KeyError, TypeError):
+                    ok, cid = False, None
+                if not ok:
+                    errors.append({"code": "invalid_json_line", "message": "expected custom_id, method, url and body", "line": n})
+                elif line.get("method", "POST") != "POST" or line.get("url") != meta["endpoint"]:
+                    errors.append({"code": "invalid_url", "message": f"url must be POST {meta['endpoint']}", "line": n})
+                elif cid in seen:
+                    errors.append({"code": "duplicate_custom_id", "message": f"duplicate custom_id '{cid}'", "line": n})
+                else:
+                    seen.add(cid)
+                if len(errors) >= 100:
+                    break
+        meta["request_counts"]["total"] = total
+        if not total and not errors:
+            errors.append({"code": "empty_file", "message": "input file has no requests", "line": None})
+        return errors or None
+
+    async def _run(self, batch_id: str) -> None:
+        meta = await asyncio.to_thread(self.store.load, batch_id)
+        if meta is None or meta["status"] not in ACTIVE:
+            return
+        if meta["status"] == "validating":
+            # A full pass over an input of up to max_file_bytes: run it on a thread.
+            errors = await asyncio.to_thread(self._validate, meta)
+            if errors:
+                meta["errors"] = {"object": "list", "data": errors}
+                await asyncio.to_thread(self._finish, meta, "failed")
+                return
+            meta["status"] = "in_progress"
+            meta["in_progress_at"] = int(time.time())
+            await asyncio.to_thread(self.store.save, meta)
+        meta["status"] = "in_progress"  # "cancelling" is only how a pending .cancel is reported
+
+        out_id, err_id = f"file-{batch_id}-output", f"file-{batch_id}-errors"
+        out_path, err_path = self.store.file_path(out_id), self.store.file_path(err_id)
+        ok, failed = await asyncio.gather(asyncio.to_thread(_completed_ids, out_path), asyncio.to_thread(_completed_ids, err_path))
+        done = ok | failed
+        counts = meta["request_counts"]
+        counts["completed"], counts["failed"] = len(ok), len(failed)
+        if done:
+            log.info("resuming batch %s (%d of %d done)", batch_id, len(done), counts["total"], extra={"batch_id": batch_id})
+
+        pending: Set[asyncio.Task] = set()
+        results: Tuple[List[bytes], List[bytes]] = ([], [])  # encoded lines for the output / error file
+        finished = asyncio.Event()
+
+        def stopping() -> Optional[str]:
+            if self.store.cancel_requested(batch_id):
+                return "cancelled"
+            if time.time() > meta["expires_at"]:
+                return "expired"
+            return None
+
+        stop = await asyncio.to_thread(stopping)
+
+        async def persist(out: IO[bytes], err: IO[bytes]) -> None:
+            # Take the buffered lines and a copy of the job on the loop; write them on a thread.
+            lines = tuple(r[:] for r in results)
+            for r in results:
+                r.clear()
+            await asyncio.to_thread(self._persist, (out, err), lines, {**meta, "request_counts": dict(counts)})
+
+        async def watch(out: IO[bytes], err: IO[bytes]) -> None:
+            nonlocal stop
+            while not finished.is_set():
+                try:
+                    await asyncio.wait_for(finished.wait(), timeout=self.progress_interval_seconds)
+                except asyncio.TimeoutError:
+                    if stop is None:
+                        stop = await asyncio.to_thread(stopping)
+                await persist(out, err)
+
+        async def one(line: Dict[str, Any], provider: str) -> None:
+            self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+            try:
+                for attempt in range(self.max_attempts):
+                    status, body = await self.execute(meta, line["url"], line["body"])
+                    if status not in (429, 503) or attempt == self.max_attempts - 1:
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(min(30.0, self.retry_delay_seconds * 2 ** attempt))
+            except Exception as e:  # execute maps expected errors itself; never lose a line to a bug
+                log.exception("batch request failed", extra={"batch_id": batch_id})
+                status, body = 500, {"error": {"message": f"internal error ({type(e).__name__})"}}
+            finally:
+                self._in_flight[provider] -= 1
+                self._slot(provider).release()
+            self.requests += 1
+            req_id = "batch_req_" + uuid.uuid4().hex[:24]
+            record = {"id": req_id, "custom_id": line["custom_id"], "response": {"status_code": status, "request_id": req_id, "body": body}, "error": None}
+            results[0 if status == 200 else 1].append(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+            counts["completed" if status == 200 else "failed"] += 1
+
+        with open(out_path, "ab") as out, open(err_path, "ab") as err, \
+                open(self.store.file_path(meta["input_file_id"]), "rb") as src:
+            watcher = asyncio.create_task(watch(out, err))
+            try:
+                more = True
+                while more and not stop:
+                    lines, more = await asyncio.to_thread(_read_pending, src, done, _READ_BYTES)
+                    for line in lines:
+                        paused = time.monotonic()
+                        while self.busy() and not stop:
+                            await asyncio.sleep(0.05)
+                        self.paused_seconds += time.monotonic() - paused
+                        if stop:
+                            break
+                        provider = self.provider_of(line["body"])
+                        await self._slot(provider).acquire()
+                        if stop:  # set by the watcher while we waited for a slot
+                            self._slot(provider).release()
+                            break
+                        task = asyncio.create_task(one(line, provider))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                if pending:
+                    await asyncio.gather(*pending)
+            except asyncio.CancelledError:
+                # Shutdown: leave the job in progress; whichever worker claims it next resumes it.
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                raise
+            finally:
+                finished.set()
+                await watcher  # its last pass writes whatever is still buffered
+
+        await asyncio.to_thread(self._complete, meta, stop)
+
+    def _persist(self, files: Tuple[IO[bytes], IO[bytes]], lines: Tuple[List[bytes], ...], meta: Dict[str, Any]) -> None:
+        for f, chunk in zip(files, lines, strict=True):
+            if chunk:
+                f.write(b"".join(chunk))
+                f.flush()
+        self.store.save(meta)
+
+    def _complete(self, meta: Dict[str, Any], stop: Optional[str]) -> None:
+        batch_id = meta["id"]
+        out_id, err_id = f"file-{batch_id}-output", f"file-{batch_id}-errors"
+        for file_id in (out_id, err_id):
+            self.store.register_file(file_id, meta["owner"], "batch_output", f"{batch_id}-{file_id.rsplit('-', 1)[1]}.jsonl")
+        meta["output_file_id"], meta["error_file_id"] = out_id, err_id
+        if stop == "cancelled":
+            meta["cancelling_at"] = int(os.path.getmtime(self.store.batch_path(batch_id, ".cancel")))
+            self._finish(meta, "cancelled")
+        elif stop == "expired":
+            self._finish(meta, "expired")
+        else:
+            meta["finalizing_at"] = int(time.time())
+            self._finish(meta, "completed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": sorted(self._jobs),
+            "requests": self.requests,
+            "retries": self.retries,
+            "paused_seconds": round(self.paused_seconds, 3),
+            "in_flight": dict(self._in_flight),
+        }
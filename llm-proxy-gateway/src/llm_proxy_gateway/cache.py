@@ -1,37 +1,352 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from . import jsonutil
+from .config import CacheCfg
+
+log = logging.getLogger("llm-proxy.cache")
 
 @dataclass
 class CacheEntry:
     value: Any
     expires_at: float
+    size: int = 0
+
+def approx_size(value: Any) -> int:
+    """Payload size in bytes as the client would see it (compact JSON)."""
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
 
-class TTLCache:
-    def __init__(self, ttl_seconds: int, max_items: int):
-        self.ttl_seconds = int(ttl_seconds)
+class LRUCache:
+    """LRU cache with a uniform TTL, an item cap and an optional byte budget.
+
+    ``get``/``set`` are O(1): ``_data`` is kept in recency order and ``_expiry`` in
+    write order, which is also expiry order because every entry gets the same TTL.
+    Expired entries are dropped on read, a few per write, and in bulk by the
+    background sweeper started with ``start()``.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_items: int,
+        max_bytes: int = 0,
+        sweep_interval_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = float(ttl_seconds)
         self.max_items = int(max_items)
-        self._data: Dict[str, CacheEntry] = {}
+        self.max_bytes = int(max_bytes)
+        self.sweep_interval_seconds = float(sweep_interval_seconds)
+        self._clock = clock
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._expiry: "OrderedDict[str, None]" = OrderedDict()
+        self._bytes = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
-    def _evict_if_needed(self) -> None:
-        if len(self._data) <= self.max_items:
-            return
-        # naive eviction: remove oldest expiry
-        oldest_key = min(self._data.items(), key=lambda kv: kv[1].expires_at)[0]
-        self._data.pop(oldest_key, None)
+    def __len__(self) -> int:
+        return len(self._data)
 
     def get(self, key: str) -> Optional[Any]:
         e = self._data.get(key)
-        if not e:
+        if e is None:
+            self.misses += 1
             return None
-        if time.time() > e.expires_at:
-            self._data.pop(key, None)
+        if self._clock() >= e.expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
             return None
+        self._data.move_to_end(key)
+        self.hits += 1
         return e.value
 
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    def set(self, key: str, value: Any, size: Optional[int] = None) -> None:
+        if self.max_items <= 0:
+            return
+        if size is None:
+            size = approx_size(value) if self.max_bytes > 0 else 0
+        if self.max_bytes > 0 and size > self.max_bytes:
+            # Would evict everything else and still not fit.
+            self._remove(key)
+            return
+        now = self._clock()
+        self._remove(key)
+        self._data[key] = CacheEntry(value=value, expires_at=now + self.ttl_seconds, size=size)
+        self._expiry[key] = None
+        self._bytes += size
+        self.sweep(now, limit=8)
+        while len(self._data) > self.max_items or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+            oldest, e = self._data.popitem(last=False)
+            self._expiry.pop(oldest, None)
+            self._bytes -= e.size
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        e = self._data.pop(key, None)
+        if e is not None:
+            self._expiry.pop(key, None)
+            self._bytes -= e.size
+
+    def sweep(self, now: Optional[float] = None, limit: int = 0) -> int:
+        """Drop expired entries from the front of the expiry order; ``limit`` 0 means all."""
+        now = self._clock() if now is None else now
+        removed = 0
+        while self._expiry and (limit <= 0 or removed < limit):
+            key = next(iter(self._expiry))
+            if self._data[key].expires_at > now:
+                break
+            self._remove(key)
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            self.sweep()
+
+    def start(self) -> None:
+        if self._sweeper is None and self.sweep_interval_seconds > 0:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def aclose(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "bytes": self._bytes,
+            "max_items": self.max_items,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache:
+    """Host-local cache tier in a SQLite file (WAL mode), shared by all workers.
+
+    Survives restarts and deploys. Entries carry a wall-clock expiry (workers do
+    not share a monotonic clock); ``prune`` drops expired rows and then the
+    oldest writes until the total payload size fits ``max_bytes``. Connections
+    are per thread and per process, so the object is safe to use after fork;
+    ``close`` closes every connection this process opened, whichever thread owns it.
+    SQLite errors (e.g. a busy lock) are counted and treated as a miss.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int, busy_timeout_seconds: float = 0.1):
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_bytes = int(max_bytes)
+        self.busy_timeout_seconds = float(busy_timeout_seconds)
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_pid: Optional[int] = None
+        self._conns_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            # check_same_thread=False only so close() can reach it; each thread still uses its own.
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_seconds, isolation_level=None, check_same_thread=False)
+            with self._conns_lock:
+                if self._conns_pid != os.getpid():
+                    self._conns, self._conns_pid = [], os.getpid()  # inherited ones belong to the parent
+                self._conns.append(conn)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, written_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache(expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_written_at ON cache(written_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self._db().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.warning("disk cache read failed: %s", e)
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return jsonutil.loads(row[0])
+
     def set(self, key: str, value: Any) -> None:
-        expires_at = time.time() + self.ttl_seconds
-        self._data[key] = CacheEntry(value=value, expires_at=expires_at)
-        self._evict_if_needed()
+        blob = jsonutil.dumps(value)
+        if self.max_bytes > 0 and len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, written_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + self.ttl_seconds, now),
+            )
+            self.writes += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.warning("disk cache write failed: %s", e)
+
+    def prune(self) -> None:
+        try:
+            db = self._db()
+            db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            if self.max_bytes > 0:
+                # Keep the newest rows whose running size total fits the budget.
+                db.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY written_at DESC) AS running FROM cache)"
+                    " WHERE running > ?)",
+                    (self.max_bytes,),
+                )
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.warning("disk cache prune failed: %s", e)
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns = self._conns if self._conns_pid == os.getpid() else []
+            self._conns = []
+        for conn in conns:
+            conn.close()
+        self._local.conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"hits": self.hits, "misses": self.misses, "writes": self.writes, "errors": self.errors}
+        try:
+            items, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+            out.update(items=items, bytes=size, max_bytes=self.max_bytes)
+        except sqlite3.Error:
+            pass
+        return out
+
+class TieredCache:
+    """In-memory ``LRUCache`` (L1) in front of a shared ``SQLiteCache`` (L2).
+
+    Reads check L1, then L2 (promoting hits into L1); ``aget`` runs the L2 lookup
+    on a small reader pool. Writes land in L1 immediately; the L2 write and
+    periodic pruning run on one background thread. Lookups, writes and pruning
+    therefore never block the event loop (``get`` and ``stats`` still read L2 inline).
+    """
+
+    def __init__(self, l1: LRUCache, l2: SQLiteCache, readers: int = 4):
+        self.l1 = l1
+        self.l2 = l2
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-proxy-cache")
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="llm-proxy-cache-read")
+        self._pruner: Optional[asyncio.Task] = None
+
+    def get(self, key: str) -> Optional[Any]:
+        hit = self.l1.get(key)
+        if hit is not None:
+            return hit
+        hit = self.l2.get(key)
+        if hit is not None:
+            self.l1.set(key, hit)
+        return hit
+
+    async def aget(self, key: str) -> Optional[Any]:
+        hit = self.l1.get(key)
+        if hit is not None:
+            return hit
+        hit = await asyncio.get_running_loop().run_in_executor(self._readers, self.l2.get, key)
+        if hit is not None:
+            self.l1.set(key, hit)
+        return hit
+
+    def set(self, key: str, value: Any) -> None:
+        self.l1.set(key, value)
+        self._writer.submit(self.l2.set, key, value)
+
+    async def _prune_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.l1.sweep_interval_seconds)
+            await loop.run_in_executor(self._writer, self.l2.prune)
+
+    def start(self) -> None:
+        self.l1.start()
+        if self._pruner is None and self.l1.sweep_interval_seconds > 0:
+            self._pruner = asyncio.get_running_loop().create_task(self._prune_loop())
+
+    async def aclose(self) -> None:
+        await self.l1.aclose()
+        if self._pruner is not None:
+            self._pruner.cancel()
+            try:
+                await self._pruner
+            except asyncio.CancelledError:
+                pass
+            self._pruner = None
+        # Flush pending L2 writes, then close every thread's connection.
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._readers.shutdown)
+        await loop.run_in_executor(None, self._writer.shutdown)
+        self.l2.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.l1.stats(), "disk": self.l2.stats()}
+
+ResponseCache = Union[LRUCache, TieredCache]
+
+def build_cache(cfg: CacheCfg) -> Optional[ResponseCache]:
+    if not cfg.enabled:
+        return None
+    l1 = LRUCache(
+        ttl_seconds=cfg.ttl_seconds,
+        max_items=cfg.max_items,
+        max_bytes=cfg.max_bytes,
+        sweep_interval_seconds=cfg.sweep_interval_seconds,
+    )
+    if not cfg.disk.enabled:
+        return l1
+    l2 = SQLiteCache(
+        path=cfg.disk.path,
+        ttl_seconds=cfg.disk.ttl_seconds or cfg.ttl_seconds,
+        max_bytes=cfg.disk.max_bytes,
+    )
+    return TieredCache(l1, l2)
@@ -1,26 +1,89 @@
 from __future__ import annotations
 
 import argparse
+import glob
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Dict
 
 import uvicorn
 
-from .app import create_app
-from .config import load_config
+from .app import CONFIG_ENV
+from .config import AppCfg, load_config
+from .metrics import METRICS_DIR_ENV
+
+log = logging.getLogger("llm-proxy")
 
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="llm-proxy", description="Run llm-proxy-gateway")
     p.add_argument("--config", required=True, help="Path to YAML config")
     p.add_argument("--host", default=None, help="Override host")
     p.add_argument("--port", type=int, default=None, help="Override port")
+    p.add_argument("--workers", type=int, default=None, help="Override worker process count")
+    p.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], default=None, help="Override event loop")
+    p.add_argument("--http", choices=["auto", "h11", "httptools"], default=None, help="Override HTTP parser")
+    p.add_argument("--backlog", type=int, default=None, help="Override listen backlog")
+    p.add_argument("--timeout-keep-alive", type=int, default=None, help="Override keep-alive timeout (seconds)")
+    p.add_argument("--limit-concurrency", type=int, default=None, help="Override max concurrent connections")
     return p
 
+def _require(module: str, option: str) -> None:
+    if importlib.util.find_spec(module) is None:
+        raise SystemExit(f"{option} requires the '{module}' package (pip install 'uvicorn[standard]')")
+
+def uvicorn_options(cfg: AppCfg, args: argparse.Namespace) -> Dict[str, Any]:
+    """Merge CLI overrides over ``server`` config into ``uvicorn.run`` keyword arguments."""
+    s = cfg.server
+    def pick(name: str) -> Any:
+        v = getattr(args, name)
+        return getattr(s, name) if v is None else v
+
+    opts = {
+        "host": pick("host"),
+        "port": pick("port"),
+        "workers": pick("workers"),
+        "loop": pick("loop"),
+        "http": pick("http"),
+        "backlog": pick("backlog"),
+        "timeout_keep_alive": pick("timeout_keep_alive"),
+        "limit_concurrency": pick("limit_concurrency"),
+        "log_level": s.log_level.lower(),
+    }
+    if opts["workers"] < 1:
+        raise SystemExit("--workers must be >= 1")
+    if opts["loop"] == "uvloop":
+        _require("uvloop", "--loop uvloop")
+    if opts["http"] == "httptools":
+        _require("httptools", "--http httptools")
+    return opts
+
 def main() -> None:
     args = build_parser().parse_args()
     loaded = load_config(args.config)
     cfg = loaded.cfg
+    opts = uvicorn_options(cfg, args)
+
+    if opts["workers"] > 1 and cfg.rate_limit.enabled and cfg.rate_limit.backend == "memory":
+        log.warning("rate_limit.backend is 'memory': each of the %d workers enforces its own limits", opts["workers"])
 
-    host = args.host or cfg.server.host
-    port = args.port or cfg.server.port
+    temp_dir = None
+    if opts["workers"] > 1 and cfg.metrics.enabled:
+        # Each worker writes a snapshot here and /metrics merges them; start from a clean slate.
+        metrics_dir = cfg.metrics.multiprocess_dir
+        if not metrics_dir:
+            metrics_dir = temp_dir = tempfile.mkdtemp(prefix="llm-proxy-metrics-")
+        os.makedirs(metrics_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(stale)
+        os.environ[METRICS_DIR_ENV] = metrics_dir
 
-    app = create_app(loaded)
-    uvicorn.run(app, host=host, port=port, log_level=cfg.server.log_level.lower())
+    # Workers import the factory by name and load the config themselves.
+    os.environ[CONFIG_ENV] = os.path.abspath(args.config)
+    try:
+        uvicorn.run("llm_proxy_gateway.app:app_from_env", factory=True, **opts)
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
 import yaml
 from pydantic import BaseModel, Field
@@ -18,37 +18,217 @@ class ServerCfg(BaseModel):
     port: int = 8080
     request_body_max_bytes: int = 1_048_576
     log_level: str = "INFO"
-
-class AuthCfg(BaseModel):
-    enabled: bool = True
-    api_keys: List[str] = Field(default_factory=list)
+    # Worker processes; each builds its own app (registry, pools, caches) after the fork
+    workers: int = 1
+    # auto picks uvloop / httptools when installed
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    backlog: int = 2048
+    timeout_keep_alive: int = 5
+    # Connections beyond this get 503 from the server (None: unlimited)
+    limit_concurrency: Optional[int] = None
 
 class RateLimitPerKeyCfg(BaseModel):
     refill_per_sec: float = 2.0
     capacity: int = 10
 
+class TokenLimitsCfg(BaseModel):
+    prompt_tokens_per_sec: float = 1000.0
+    prompt_capacity: int = 60_000
+    completion_tokens_per_sec: float = 500.0
+    completion_capacity: int = 30_000
+
+class TokenRateLimitCfg(TokenLimitsCfg):
+    # Token-weighted limiting: reserve an estimate before the upstream call,
+    # settle with the real `usage` afterwards
+    enabled: bool = False
+    chars_per_token: float = 4.0
+    default_max_tokens: int = 256
+    # Per-API-key limits replacing the defaults above
+    overrides: Dict[str, TokenLimitsCfg] = Field(default_factory=dict)
+
 class RateLimitCfg(BaseModel):
     enabled: bool = True
     per_key: RateLimitPerKeyCfg = RateLimitPerKeyCfg()
+    tokens: TokenRateLimitCfg = TokenRateLimitCfg()
+    # memory: per-process buckets; shared: mmap'd table used by all workers on the host
+    backend: Literal["memory", "shared"] = "memory"
+    shared_path: str = "/tmp/llm-proxy-gateway/ratelimit.bin"
+    shared_slots: int = 65_536
+    # How often idle (fully refilled) buckets are dropped
+    gc_interval_seconds: float = 60.0
+
+class ApiKeyCfg(BaseModel):
+    key: str
+    tenant: Optional[str] = None
+    # Empty -> any model allowed by routing.allowed_models
+    allowed_models: List[str] = Field(default_factory=list)
+    # Replace rate_limit.per_key / rate_limit.tokens defaults for this key
+    rate_limit: Optional[RateLimitPerKeyCfg] = None
+    token_limits: Optional[TokenLimitsCfg] = None
+    # Upstream queue priority when providers use admission control (higher first)
+    priority: int = 0
+
+class AuthCfg(BaseModel):
+    enabled: bool = True
+    # Plain strings or objects with per-key metadata
+    api_keys: List[Union[str, ApiKeyCfg]] = Field(default_factory=list)
+    # Poll the config file and swap in changed keys without a restart (0 = off)
+    reload_interval_seconds: float = 5.0
+
+class EndpointCfg(BaseModel):
+    base_url: str
+    weight: float = 1.0
+    # Defaults to the provider's api_key_env
+    api_key_env: Optional[str] = None
+
+class HedgeCfg(BaseModel):
+    # Second attempt for idempotent non-streaming calls (embeddings, temperature-0
+    # single-choice completions) slower than `percentile` of recent latency
+    enabled: bool = False
+    percentile: float = 95.0
+    # Extra upstream load cap (0.05 = at most ~5% more requests)
+    budget_ratio: float = 0.05
+    min_delay_ms: float = 50.0
+    min_samples: int = 20
+    # Only these models (empty: all models of the provider)
+    models: List[str] = Field(default_factory=list)
+
+class CircuitBreakerCfg(BaseModel):
+    # Fail fast after this many consecutive retryable failures, for open_seconds
+    enabled: bool = True
+    failure_threshold: int = 5
+    open_seconds: float = 30.0
+    half_open_max_calls: int = 1
+
+class RetryCfg(BaseModel):
+    # Retries of retryable upstream errors (transport, timeouts, 408/429/5xx), full-jitter backoff
+    max_retries: int = 2
+    base_delay_ms: float = 100.0
+    max_delay_ms: float = 2000.0
+    # Retry budget: ~budget_ratio retries per request, plus min_per_sec when traffic is low
+    budget_ratio: float = 0.1
+    budget_min_per_sec: float = 1.0
+
+class AdmissionCfg(BaseModel):
+    # Bound concurrent upstream calls; excess waits in a priority queue (per API key priority)
+    enabled: bool = False
+    mode: Literal["fixed", "aimd", "gradient"] = "fixed"
+    limit: int = 64  # fixed limit, or starting point for adaptive modes
+    min_limit: int = 4
+    max_limit: int = 512
+    max_queue: int = 256
+    # Default queue deadline; clients may lower it per request with X-Queue-Deadline-Ms
+    queue_timeout_ms: float = 2000.0
+    # aimd: latency above this counts as overload (unset: only upstream overload errors do)
+    target_latency_ms: Optional[float] = None
+    backoff_ratio: float = 0.9
 
 class ProviderCfg(BaseModel):
     kind: str
     base_url: Optional[str] = None
     api_key_env: Optional[str] = None
+    # Several interchangeable upstreams instead of base_url, balanced per call
+    endpoints: List[EndpointCfg] = Field(default_factory=list)
+    balancer: Literal["least_outstanding", "ewma"] = "least_outstanding"
+    # Passive health: eject an endpoint after this many consecutive failures
+    eject_after_failures: int = 5
+    eject_cooldown_seconds: float = 30.0
+    ewma_decay_seconds: float = 10.0
+    hedge: HedgeCfg = HedgeCfg()
+    circuit_breaker: CircuitBreakerCfg = CircuitBreakerCfg()
+    retry: RetryCfg = RetryCfg()
+    admission: AdmissionCfg = AdmissionCfg()
+    # Upstream connection pool (one long-lived client per provider)
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry_seconds: float = 30.0
+    http2: bool = False
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 60.0
 
 class RoutingCfg(BaseModel):
     default_provider: str = "mock"
     allowed_models: List[str] = Field(default_factory=list)
     providers: Dict[str, ProviderCfg] = Field(default_factory=dict)
+    # Ordered alternatives per requested model, tried after retryable failures:
+    #   {"openai:gpt-4.1": ["other:equivalent"]}
+    fallbacks: Dict[str, List[str]] = Field(default_factory=dict)
+
+class DiskCacheCfg(BaseModel):
+    # Shared L2 tier (SQLite, WAL) used by every worker on the host; survives restarts
+    enabled: bool = False
+    path: str = "/tmp/llm-proxy-gateway/cache.sqlite3"
+    ttl_seconds: Optional[int] = None  # defaults to cache.ttl_seconds
+    max_bytes: int = 268_435_456
 
 class CacheCfg(BaseModel):
     enabled: bool = False
     ttl_seconds: int = 60
     max_items: int = 1024
+    # Optional budget on total cached payload bytes (0 = items cap only)
+    max_bytes: int = 0
+    sweep_interval_seconds: float = 5.0
+    disk: DiskCacheCfg = DiskCacheCfg()
+    # Concurrent identical requests wait for the one upstream call in flight
+    single_flight: bool = True
+
+class EmbeddingsCfg(BaseModel):
+    # With the cache enabled, cache embeddings per (model, input text) and only
+    # send the missing inputs upstream
+    per_item_cache: bool = True
+    # Micro-batching: merge concurrent small requests for the same model into
+    # one upstream call, waiting at most batch_window_ms
+    batch_enabled: bool = False
+    batch_window_ms: float = 5.0
+    batch_max_items: int = 256
 
 class PoliciesCfg(BaseModel):
     enabled: bool = True
     max_prompt_chars: int = 50_000
+    # Per-message digests/lengths memoized across turns (size check, cache key, token estimate)
+    message_digest_items: int = 65_536
+    message_digest_chars: int = 64_000_000
+
+class LoggingCfg(BaseModel):
+    # Records go through a bounded queue drained by a background thread
+    queue: bool = True
+    queue_size: int = 10_000
+    # drop: count and discard records when the queue is full; block: wait for room
+    overflow: Literal["drop", "block"] = "drop"
+    batch_max: int = 256
+    # Access-log sampling for successful (<400) requests; errors and slow requests are always logged
+    sample_rate: float = 1.0
+    route_sample_rates: Dict[str, float] = Field(default_factory=dict)
+    slow_request_ms: float = 1000.0
+
+class MetricsCfg(BaseModel):
+    enabled: bool = True
+    path: str = "/metrics"
+    # false: the scrape endpoint skips auth and rate limiting
+    require_auth: bool = True
+    buckets: List[float] = Field(default_factory=lambda: [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0])
+    # Upstream series are labelled per model for these names, routing.allowed_models and
+    # fallback targets; with no allowlist, up to max_model_labels names that upstreams
+    # actually served are added as seen. Anything else is labelled "other".
+    model_labels: List[str] = Field(default_factory=list)
+    max_model_labels: int = 100
+    # Per-worker snapshot files merged on scrape; the CLI sets one up when workers > 1
+    multiprocess_dir: Optional[str] = None
+    flush_interval_seconds: float = 1.0
+
+class BatchCfg(BaseModel):
+    # Offline batch API (/v1/files, /v1/batches); jobs live under dir and resume after restarts
+    enabled: bool = False
+    dir: str = "/tmp/llm-proxy-gateway/batches"
+    max_file_bytes: int = 209_715_200
+    # Concurrent batch calls per provider in each worker
+    concurrency: int = 4
+    # Admission priority of batch calls: they queue behind (and are shed before) interactive traffic
+    priority: int = -100
+    # Pause batch dispatch while this many interactive /v1 requests are in flight (0: never pause)
+    yield_above_in_flight: int = 0
+    poll_interval_seconds: float = 5.0
 
 class AppCfg(BaseModel):
     server: ServerCfg = ServerCfg()
@@ -56,12 +236,17 @@ class AppCfg(BaseModel):
     rate_limit: RateLimitCfg = RateLimitCfg()
     routing: RoutingCfg = RoutingCfg()
     cache: CacheCfg = CacheCfg()
+    embeddings: EmbeddingsCfg = EmbeddingsCfg()
     policies: PoliciesCfg = PoliciesCfg()
+    logging: LoggingCfg = LoggingCfg()
+    metrics: MetricsCfg = MetricsCfg()
+    batch: BatchCfg = BatchCfg()
 
 @dataclass(frozen=True)
 class LoadedConfig:
     cfg: AppCfg
     env: EnvSettings
+    path: Optional[str] = None
 
 def load_config(path: str) -> LoadedConfig:
     with open(path, "r", encoding="utf-8") as f:
@@ -72,4 +257,4 @@ def load_config(path: str) -> LoadedConfig:
     if cfg.auth.enabled and not cfg.auth.api_keys:
         keys = [k.strip() for k in env.llm_proxy_api_keys.split(",") if k.strip()]
         cfg.auth.api_keys = keys
-    return LoadedConfig(cfg=cfg, env=env)
+    return LoadedConfig(cfg=cfg, env=env, path=path)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from . import jsonutil
+from .middleware.rate_limit import _chars
+
+_KEY_VERSION = b"chat-v2\x00"
+
+class MessageDigest(NamedTuple):
+    digest: bytes      # sha256 of the canonical (sorted-key) JSON of the message
+    text: Optional[int]  # length of a plain-string content, None otherwise
+    chars: int         # text characters toward the token estimate (text parts included)
+
+def _compute(message: Any) -> MessageDigest:
+    digest = hashlib.sha256(jsonutil.dumps(message, sort_keys=True)).digest()
+    content = message.get("content") if isinstance(message, dict) else None
+    return MessageDigest(digest, len(content) if isinstance(content, str) else None, _chars(content))
+
+class MessageDigests:
+    """Per-message digests and lengths, memoized by message content.
+
+    Multi-turn chats resend the whole history every turn, so re-serializing and
+    hashing it for the cache key (and re-joining it for the size check) grows with
+    the conversation. Here each message is hashed once and later turns only look
+    the earlier ones up. Only messages whose fields are all strings are memoized
+    (keyed by their items); anything else (content parts, tool calls) is digested
+    fresh each time. Bounded by ``max_items`` and by ``max_chars`` of memoized text.
+    """
+
+    def __init__(self, max_items: int = 65_536, max_chars: int = 64_000_000):
+        self.max_items = int(max_items)
+        self.max_chars = int(max_chars)
+        self._data: "OrderedDict[Tuple[Tuple[str, str], ...], MessageDigest]" = OrderedDict()
+        self._sizes: Dict[Tuple[Tuple[str, str], ...], int] = {}
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, message: Any) -> MessageDigest:
+        if type(message) is dict and len(message) == 2 and type(message.get("content")) is str and type(message.get("role")) is str:
+            key: Tuple[Tuple[str, str], ...] = (("content", message["content"]), ("role", message["role"]))
+        elif isinstance(message, dict) and all(isinstance(v, str) for v in message.values()):
+            key = tuple(sorted(message.items()))
+        else:
+            self.uncacheable += 1
+            return _compute(message)
+        hit = self._data.get(key)
+        if hit is not None:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return hit
+        self.misses += 1
+        d = _compute(message)
+        size = sum(len(k) + len(v) for k, v in key)
+        if self.max_items <= 0 or size > self.max_chars:
+            return d
+        self._data[key] = d
+        self._sizes[key] = size
+        self._chars += size
+        while len(self._data) > self.max_items or self._chars > self.max_chars:
+            oldest, _ = self._data.popitem(last=False)
+            self._chars -= self._sizes.pop(oldest)
+            self.evictions += 1
+        return d
+
+    def prompt_chars(self, messages: List[Any]) -> int:
+        """Length of the string contents joined with newlines, without joining them."""
+        total = n = 0
+        for d in map(self.get, messages):
+            if d.text is not None:
+                total += d.text
+                n += 1
+        return total + max(0, n - 1)
+
+    def text_chars(self, messages: List[Any]) -> int:
+        return sum(self.get(m).chars for m in messages)
+
+    def chat_key(self, path: str, payload: Dict[str, Any]) -> str:
+        """Cache key over the request minus ``messages`` plus the per-message digests."""
+        h = hashlib.sha256(_KEY_VERSION)
+        h.update(path.encode("utf-8") + b"\x00")
+        h.update(jsonutil.dumps({k: v for k, v in payload.items() if k != "messages"}, sort_keys=True))
+        h.update(b"".join([self.get(m).digest for m in payload.get("messages") or []]))
+        return h.hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "items": len(self._data),
+            "chars": self._chars,
+            "max_items": self.max_items,
+            "max_chars": self.max_chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from . import jsonutil
+from .errors import http_error
+
+EmbedCall = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+def _split_tokens(total: int, texts: List[str]) -> List[int]:
+    # Upstream reports usage per batch only; attribute it by an estimated token
+    # count (~4 chars/token) with largest-remainder rounding, so the shares
+    # always add up to ``total`` and can be re-summed for any subset later.
+    weights = [max(1, len(t) // 4) for t in texts]
+    wsum = sum(weights)
+    shares = [total * w // wsum for w in weights]
+    left = total - sum(shares)
+    by_remainder = sorted(range(len(texts)), key=lambda i: (total * weights[i]) % wsum, reverse=True)
+    for i in by_remainder[:left]:
+        shares[i] += 1
+    return shares
+
+async def embed_with_item_cache(cache: Any, payload: Dict[str, Any], call: EmbedCall) -> Dict[str, Any]:
+    """Serve ``/v1/embeddings`` from a cache keyed on (params, single input text).
+
+    Only the inputs missing from the cache (deduplicated) go upstream, as one
+    smaller batch; the response is reassembled in the caller's original order
+    with ``usage`` summed over all items.
+    """
+    inp = payload.get("input", "")
+    texts = [str(x) for x in inp] if isinstance(inp, list) else [str(inp)]
+    params = {k: v for k, v in payload.items() if k != "input"}
+    prefix = jsonutil.dumps({"path": "/v1/embeddings#item", "params": params}, sort_keys=True) + b"\0"
+    keys = [hashlib.sha256(prefix + t.encode("utf-8")).hexdigest() for t in texts]
+
+    items: Dict[str, Dict[str, Any]] = {}
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts, strict=True):
+        if key in items or key in missing:
+            continue
+        hit = await cache.aget(key)
+        if hit is None:
+            missing[key] = text
+        else:
+            items[key] = hit
+
+    model = payload.get("model")
+    if missing:
+        miss_keys = list(missing)
+        miss_texts = [missing[k] for k in miss_keys]
+        out = await call({**params, "input": miss_texts})
+        model = out.get("model", model)
+        rows = sorted(out.get("data", []), key=lambda d: d.get("index", 0))
+        if len(rows) != len(miss_texts):
+            raise http_error(502, f"upstream returned {len(rows)} embeddings for {len(miss_texts)} inputs")
+        usage = out.get("usage") or {}
+        tokens = _split_tokens(int(usage.get("prompt_tokens", 0)), miss_texts)
+        for key, row, n in zip(miss_keys, rows, tokens, strict=True):
+            entry = {"embedding": row["embedding"], "tokens": n}
+            cache.set(key, entry)
+            items[key] = entry
+
+    data = [{"object": "embedding", "index": i, "embedding": items[k]["embedding"]} for i, k in enumerate(keys)]
+    prompt_tokens = sum(items[k]["tokens"] for k in keys)
+    return {
+        "object": "list",
+        "model": model,
+        "data": data,
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+class _Batch:
+    __slots__ = ("call", "params", "texts", "waiters", "timer")
+
+    def __init__(self, call: EmbedCall, params: Dict[str, Any]):
+        self.call = call
+        self.params = params
+        self.texts: List[str] = []
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class EmbeddingsBatcher:
+    """Merge concurrent small embeddings requests into one upstream call.
+
+    Requests with the same ``key`` (default: the upstream call itself) and the
+    same non-input params are collected for up to ``window_ms`` or until
+    ``max_batch_items`` inputs are queued, then sent as one batch. Each caller gets its own slice of ``data``
+    (re-indexed from 0) and its share of ``usage``. Upstream errors are raised
+    to every caller in the batch; a caller going away does not affect others.
+    """
+
+    def __init__(self, window_ms: float, max_batch_items: int):
+        self.window_seconds = max(0.0, float(window_ms) / 1000.0)
+        self.max_batch_items = max(1, int(max_batch_items))
+        self._open: Dict[Tuple[Any, bytes], _Batch] = {}
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+
+    async def embed(self, payload: Dict[str, Any], call: EmbedCall, key: Any = None) -> Dict[str, Any]:
+        inp = payload.get("input", "")
+        texts = [str(x) for x in inp] if isinstance(inp, list) else [str(inp)]
+        if len(texts) >= self.max_batch_items:
+            return await call(payload)
+
+        params = {k: v for k, v in payload.items() if k != "input"}
+        key = (call if key is None else key, jsonutil.dumps(params, sort_keys=True))
+        loop = asyncio.get_running_loop()
+        batch = self._open.get(key)
+        if batch is not None and len(batch.texts) + len(texts) > self.max_batch_items:
+            self._flush(key, batch)
+            batch = None
+        if batch is None:
+            batch = _Batch(call, params)
+            self._open[key] = batch
+            batch.timer = loop.call_later(self.window_seconds, self._flush, key, batch)
+
+        fut: asyncio.Future = loop.create_future()
+        batch.waiters.append((len(batch.texts), len(texts), fut))
+        batch.texts.extend(texts)
+        self.requests += 1
+        if len(batch.texts) >= self.max_batch_items:
+            self._flush(key, batch)
+        return await fut
+
+    def _flush(self, key: Tuple[Any, bytes], batch: _Batch) -> None:
+        if self._open.get(key) is batch:
+            del self._open[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: _Batch) -> None:
+        self.batches += 1
+        self.items += len(batch.texts)
+        try:
+            out = await batch.call({**batch.params, "input": batch.texts})
+            rows = sorted(out.get("data", []), key=lambda d: d.get("index", 0))
+            if len(rows) != len(batch.texts):
+                raise http_error(502, f"upstream returned {len(rows)} embeddings for {len(batch.texts)} inputs")
+        except BaseException as e:
+            for _start, _n, fut in batch.waiters:
+                if not fut.done():
+                    fut.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        usage = out.get("usage") or {}
+        tokens = _split_tokens(int(usage.get("prompt_tokens", 0)), batch.texts)
+        for start, n, fut in batch.waiters:
+            if fut.done():
+                continue
+            data = [{**row, "index": i} for i, row in enumerate(rows[start : start + n])]
+            n_tokens = sum(tokens[start : start + n])
+            fut.set_result({
+                "object": "list",
+                "model": out.get("model", batch.params.get("model")),
+                "data": data,
+                "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "items": self.items,
+            "avg_batch_items": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -1,6 +1,31 @@
 from __future__ import annotations
 
+from typing import Dict, Optional
+
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse
 
 def http_error(status_code: int, message: str) -> HTTPException:
     return HTTPException(status_code=status_code, detail={"error": {"message": message}})
+
+# Upstream statuses worth another attempt (here, on another endpoint, or on a fallback provider);
+# 529 is Anthropic's "overloaded".
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504, 529})
+
+class UpstreamError(HTTPException):
+    """An upstream call failed. Rendered like ``http_error`` (502 by default).
+
+    ``upstream_status`` is the upstream HTTP status (None for transport errors
+    and timeouts); ``retryable`` says whether trying again may succeed.
+    """
+
+    def __init__(self, message: str, upstream_status: Optional[int] = None, retryable: Optional[bool] = None, status_code: int = 502):
+        super().__init__(status_code=status_code, detail={"error": {"message": message}})
+        self.upstream_status = upstream_status
+        if retryable is None:
+            retryable = upstream_status is None or upstream_status in RETRYABLE_STATUSES
+        self.retryable = retryable
+
+def error_response(status_code: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """Same body as an ``http_error`` rendered by FastAPI, for use outside the router (ASGI middleware)."""
+    return JSONResponse({"detail": {"error": {"message": message}}}, status_code=status_code, headers=headers)
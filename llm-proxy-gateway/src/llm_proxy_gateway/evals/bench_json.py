@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import time
+from typing import Any, Callable, Dict
+
+from fastapi.responses import JSONResponse
+
+from .. import jsonutil
+from ..logging import JsonFormatter
+
+def embeddings_payload(inputs: int, dims: int, seed: int = 0) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    return {
+        "object": "list",
+        "model": "bench-embed",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": [rnd.uniform(-1.0, 1.0) for _ in range(dims)]}
+            for i in range(inputs)
+        ],
+        "usage": {"prompt_tokens": inputs * 8, "total_tokens": inputs * 8},
+    }
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000.0
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Compare stdlib and fast JSON encoding of responses and log lines")
+    p.add_argument("--inputs", type=int, default=256, help="Embedding vectors per response")
+    p.add_argument("--dims", type=int, default=1536)
+    p.add_argument("--repeat", type=int, default=20)
+    args = p.parse_args()
+
+    payload = embeddings_payload(args.inputs, args.dims)
+    std = JSONResponse(None)
+    fast = jsonutil.FastJSONResponse(None)
+    size = len(fast.render(payload))
+    std_ms = _time(lambda: std.render(payload), args.repeat)
+    fast_ms = _time(lambda: fast.render(payload), args.repeat)
+    print(f"backend: {jsonutil.backend()}")
+    print(f"embeddings response ({args.inputs}x{args.dims}, {size / 1e6:.1f} MB)")
+    print(f"  JSONResponse      {std_ms:9.2f} ms")
+    print(f"  FastJSONResponse  {fast_ms:9.2f} ms  ({std_ms / fast_ms:.1f}x)")
+
+    record = logging.LogRecord("llm-proxy.access", logging.INFO, __file__, 0, "request", None, None)
+    for k, v in {"request_id": "a" * 24, "path": "/v1/embeddings", "method": "POST", "status_code": 200, "latency_ms": 12.3}.items():
+        setattr(record, k, v)
+    fmt = JsonFormatter()
+    n = 10_000
+    log_us = _time(lambda: [fmt.format(record) for _ in range(n)], 3) * 1000.0 / n
+    print(f"access-log line     {log_us:9.2f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+KINDS = ("chat", "chat_stream", "completions", "completions_stream", "embeddings")
+
+_PATHS = {
+    "chat": "/v1/chat/completions",
+    "chat_stream": "/v1/chat/completions",
+    "completions": "/v1/completions",
+    "completions_stream": "/v1/completions",
+    "embeddings": "/v1/embeddings",
+}
+
+_WORDS = ("alpha", "bravo", "delta", "gamma", "kilo", "lima", "omega", "sierra", "tango", "zulu")
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """``"chat=6,chat_stream=3,embeddings=1"`` -> normalized ``[(kind, weight), ...]``."""
+    out = []
+    for part in spec.split(","):
+        kind, _, weight = part.strip().partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"unknown request kind '{kind}' (expected one of {', '.join(KINDS)})")
+        w = float(weight or 1)
+        if w < 0:
+            raise ValueError(f"negative weight for '{kind}'")
+        out.append((kind, w))
+    total = sum(w for _, w in out)
+    if total <= 0:
+        raise ValueError("request mix has no positive weight")
+    return [(k, w / total) for k, w in out]
+
+def parse_sizes(spec: str) -> List[int]:
+    sizes = [int(s) for s in spec.split(",") if s.strip()]
+    if not sizes or min(sizes) < 1:
+        raise ValueError(f"sizes must be positive integers: '{spec}'")
+    return sizes
+
+def percentile(ordered: Sequence[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+@dataclass
+class Workload:
+    mix: List[Tuple[str, float]]
+    prompt_tokens: List[int] = field(default_factory=lambda: [32])
+    embed_inputs: List[int] = field(default_factory=lambda: [1])
+    max_tokens: int = 64
+    chat_model: str = "mock:demo"
+    embed_model: str = "mock:embed"
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        self._rnd = random.Random(self.seed)
+
+    def _text(self, tokens: int) -> str:
+        # ~1 token per short word; a serial number keeps prompts distinct so the cache does not answer
+        return f"{self._rnd.getrandbits(48):x} " + " ".join(self._rnd.choice(_WORDS) for _ in range(tokens))
+
+    def next(self) -> Tuple[str, str, Dict[str, Any]]:
+        """Draw one request: ``(kind, path, payload)``."""
+        kinds, weights = zip(*self.mix, strict=True)
+        kind = self._rnd.choices(kinds, weights)[0]
+        if kind == "embeddings":
+            n = self._rnd.choice(self.embed_inputs)
+            size = self._rnd.choice(self.prompt_tokens)
+            return kind, _PATHS[kind], {"model": self.embed_model, "input": [self._text(size) for _ in range(n)]}
+        text = self._text(self._rnd.choice(self.prompt_tokens))
+        payload: Dict[str, Any] = {"model": self.chat_model, "max_tokens": self.max_tokens}
+        if kind.startswith("chat"):
+            payload["messages"] = [{"role": "user", "content": text}]
+        else:
+            payload["prompt"] = text
+        if kind.endswith("_stream"):
+            payload["stream"] = True
+        return kind, _PATHS[kind], payload
+
+@dataclass
+class Sample:
+    kind: str
+    start: float
+    latency: float
+    status: int
+    ttft: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 300
+
+def _has_token(line: str) -> bool:
+    # The first chat chunk is usually an empty role delta; TTFT waits for actual text.
+    if not line.startswith("data:") or line == "data: [DONE]":
+        return False
+    try:
+        chunk = json.loads(line[5:])
+    except ValueError:
+        return False
+    for choice in chunk.get("choices") or []:
+        if (choice.get("delta") or {}).get("content") or choice.get("text"):
+            return True
+    return False
+
+async def send(client: httpx.AsyncClient, kind: str, path: str, payload: Dict[str, Any], scheduled: float) -> Sample:
+    """One request; latency (and time to first token) counts from ``scheduled``, not from when it got sent."""
+    ttft: Optional[float] = None
+    try:
+        if payload.get("stream"):
+            async with client.stream("POST", path, json=payload) as r:
+                async for line in r.aiter_lines():
+                    if ttft is None and _has_token(line):
+                        ttft = time.perf_counter() - scheduled
+                status = r.status_code
+        else:
+            r = await client.post(path, json=payload)
+            status = r.status_code
+        return Sample(kind, scheduled, time.perf_counter() - scheduled, status, ttft)
+    except httpx.HTTPError as e:
+        return Sample(kind, scheduled, time.perf_counter() - scheduled, 0, error=type(e).__name__)
+
+async def closed_loop(
+    client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float, max_requests: Optional[int]
+) -> List[Sample]:
+    """``concurrency`` clients, each sending its next request as soon as the previous one finished."""
+    samples: List[Sample] = []
+    end = time.perf_counter() + duration
+    issued = 0
+
+    async def worker() -> None:
+        nonlocal issued
+        while time.perf_counter() < end and (max_requests is None or issued < max_requests):
+            issued += 1
+            kind, path, payload = workload.next()
+            samples.append(await send(client, kind, path, payload, time.perf_counter()))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    rps: float,
+    duration: float,
+    max_requests: Optional[int],
+    poisson: bool = False,
+    max_in_flight: int = 10_000,
+    seed: int = 0,
+) -> Tuple[List[Sample], int]:
+    """Send at ``rps`` regardless of how fast answers come back (constant or Poisson arrivals).
+
+    Latency counts from each request's scheduled send time, so a backed-up client
+    does not hide queueing. Arrivals beyond ``max_in_flight`` are dropped and counted.
+    """
+    rnd = random.Random(seed)
+    samples: List[Sample] = []
+    tasks: List[asyncio.Task] = []
+    in_flight = 0
+    dropped = 0
+    start = time.perf_counter()
+    t = start
+    n = 0
+
+    async def one(kind: str, path: str, payload: Dict[str, Any], scheduled: float) -> None:
+        nonlocal in_flight
+        try:
+            samples.append(await send(client, kind, path, payload, scheduled))
+        finally:
+            in_flight -= 1
+
+    while t < start + duration and (max_requests is None or n < max_requests):
+        delay = t - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        n += 1
+        if in_flight >= max_in_flight:
+            dropped += 1
+        else:
+            in_flight += 1
+            kind, path, payload = workload.next()
+            tasks.append(asyncio.ensure_future(one(kind, path, payload, t)))
+        t += rnd.expovariate(rps) if poisson else 1.0 / rps
+    await asyncio.gather(*tasks)
+    return samples, dropped
+
+def _ms(v: Optional[float]) -> Optional[float]:
+    return None if v is None else round(v * 1000.0, 3)
+
+def _summary(samples: Sequence[Sample], elapsed: float) -> Dict[str, Any]:
+    lat = sorted(s.latency for s in samples if s.ok)
+    ttft = sorted(s.ttft for s in samples if s.ok and s.ttft is not None)
+    errors = sum(1 for s in samples if not s.ok)
+    statuses: Dict[str, int] = {}
+    for s in samples:
+        key = s.error or str(s.status)
+        statuses[key] = statuses.get(key, 0) + 1
+    out: Dict[str, Any] = {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 6) if samples else 0.0,
+        "throughput_rps": round((len(samples) - errors) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": {f"p{p}": _ms(percentile(lat, p)) for p in (50, 90, 99)},
+        "statuses": statuses,
+    }
+    out["latency_ms"]["max"] = _ms(lat[-1]) if lat else None
+    if ttft:
+        out["ttft_ms"] = {**{f"p{p}": _ms(percentile(ttft, p)) for p in (50, 90, 99)}, "max": _ms(ttft[-1])}
+    return out
+
+def summarize(samples: Sequence[Sample], elapsed: float, warmup: float = 0.0) -> Dict[str, Any]:
+    """Overall and per-kind stats, leaving out requests scheduled during the first ``warmup`` seconds."""
+    if samples and warmup > 0:
+        t0 = min(s.start for s in samples)
+        samples = [s for s in samples if s.start - t0 >= warmup]
+        elapsed = max(0.0, elapsed - warmup)
+    kinds = sorted({s.kind for s in samples})
+    return {
+        **_summary(samples, elapsed),
+        "by_kind": {k: _summary([s for s in samples if s.kind == k], elapsed) for k in kinds},
+    }
+
+async def run(args: argparse.Namespace, transport: Optional[httpx.AsyncBaseTransport] = None) -> Dict[str, Any]:
+    workload = Workload(
+        mix=parse_mix(args.mix),
+        prompt_tokens=parse_sizes(args.prompt_tokens),
+        embed_inputs=parse_sizes(args.embed_inputs),
+        max_tokens=args.max_tokens,
+        chat_model=args.chat_model,
+        embed_model=args.embed_model,
+        seed=args.seed,
+    )
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.max_in_flight if args.rps else 0, 1), max_keepalive_connections=None)
+    headers = {"Authorization": f"Bearer {args.api_key}"}
+    async with httpx.AsyncClient(
+        base_url=args.base_url.rstrip("/"), headers=headers, timeout=args.timeout, limits=limits, transport=transport
+    ) as client:
+        start = time.perf_counter()
+        dropped = 0
+        if args.rps:
+            samples, dropped = await open_loop(
+                client, workload, args.rps, args.duration, args.requests, args.arrival == "poisson", args.max_in_flight, args.seed
+            )
+        else:
+            samples = await closed_loop(client, workload, args.concurrency, args.duration, args.requests)
+        elapsed = time.perf_counter() - start
+    report = summarize(samples, elapsed, args.warmup)
+    report["dropped"] = dropped
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["config"] = {
+        "base_url": args.base_url,
+        "mode": "open" if args.rps else "closed",
+        "rps": args.rps,
+        "arrival": args.arrival if args.rps else None,
+        "concurrency": None if args.rps else args.concurrency,
+        "duration": args.duration,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "mix": args.mix,
+        "prompt_tokens": args.prompt_tokens,
+        "embed_inputs": args.embed_inputs,
+        "label": args.label,
+    }
+    return report
+
+# Metrics compared between runs: (path into the report, whether higher is worse)
+_COMPARED: Tuple[Tuple[Tuple[str, ...], bool], ...] = (
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p90"), True),
+    (("latency_ms", "p99"), True),
+    (("ttft_ms", "p50"), True),
+    (("ttft_ms", "p99"), True),
+    (("throughput_rps",), False),
+)
+
+def _get(report: Dict[str, Any], path: Sequence[str]) -> Optional[float]:
+    v: Any = report
+    for key in path:
+        if not isinstance(v, dict) or key not in v:
+            return None
+        v = v[key]
+    return v
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float = 0.1, error_rate_delta: float = 0.01) -> Dict[str, Any]:
+    """Relative change of each metric from ``base`` to ``new``; a metric that got worse by
+    more than ``threshold`` (or an error rate up by more than ``error_rate_delta``) is a regression."""
+    rows = []
+    for path, higher_is_worse in _COMPARED:
+        a, b = _get(base, path), _get(new, path)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a if a else 0.0
+        worse = change if higher_is_worse else -change
+        rows.append({"metric": ".".join(path), "base": a, "new": b, "change": round(change, 4), "regression": worse > threshold})
+    ea, eb = base.get("error_rate", 0.0), new.get("error_rate", 0.0)
+    rows.append({"metric": "error_rate", "base": ea, "new": eb, "change": round(eb - ea, 6), "regression": eb - ea > error_rate_delta})
+    return {"threshold": threshold, "metrics": rows, "regressions": [r["metric"] for r in rows if r["regression"]]}
+
+def _fmt(v: Optional[float]) -> str:
+    return "-" if v is None else f"{v:.2f}"
+
+def print_report(report: Dict[str, Any]) -> None:
+    cfg = report["config"]
+    print(f"{cfg['mode']}-loop run against {cfg['base_url']}: {report['requests']} requests in {report['elapsed_seconds']}s"
+          + (f", {report['dropped']} dropped" if report["dropped"] else ""))
+    print(f"{'kind':<20}{'reqs':>7}{'err%':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'ttft50':>9}{'ttft99':>9}")
+    for name, s in [("all", report), *sorted(report["by_kind"].items())]:
+        lat, ttft = s["latency_ms"], s.get("ttft_ms", {})
+        print(f"{name:<20}{s['requests']:>7}{s['error_rate'] * 100:>8.2f}{s['throughput_rps']:>9.1f}"
+              f"{_fmt(lat['p50']):>9}{_fmt(lat['p90']):>9}{_fmt(lat['p99']):>9}{_fmt(lat['max']):>9}"
+              f"{_fmt(ttft.get('p50')):>9}{_fmt(ttft.get('p99')):>9}")
+    print("latencies in ms")
+
+def print_comparison(result: Dict[str, Any]) -> None:
+    for r in result["metrics"]:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['metric']:<20}{_fmt(r['base']):>12}{_fmt(r['new']):>12}{r['change'] * 100:>+9.1f}%{flag}")
+    print("regressions: " + (", ".join(result["regressions"]) or "none"))
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Load generator and regression check for the gateway")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    r = sub.add_parser("run", help="Drive load against a gateway and report latency, throughput and errors")
+    r.add_argument("--base-url", default="http://localhost:8080")
+    r.add_argument("--api-key", default="dev-key")
+    r.add_argument("--rps", type=float, default=None, help="Open loop at this request rate (default: closed loop)")
+    r.add_argument("--arrival", choices=("constant", "poisson"), default="constant", help="Open-loop arrival process")
+    r.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: drop arrivals beyond this many outstanding")
+    r.add_argument("--concurrency", type=int, default=8, help="Closed loop: number of concurrent clients")
+    r.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    r.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    r.add_argument("--warmup", type=float, default=0.0, help="Seconds at the start left out of the stats")
+    r.add_argument("--mix", default="chat=1", help=f"Weighted request kinds, e.g. chat=6,chat_stream=3,embeddings=1 ({', '.join(KINDS)})")
+    r.add_argument("--prompt-tokens", default="32", help="Prompt sizes in ~tokens to draw from, e.g. 16,256,2048")
+    r.add_argument("--embed-inputs", default="1", help="Inputs per embeddings request to draw from, e.g. 1,8,64")
+    r.add_argument("--max-tokens", type=int, default=64)
+    r.add_argument("--chat-model", default="mock:demo")
+    r.add_argument("--embed-model", default="mock:embed")
+    r.add_argument("--timeout", type=float, default=60.0)
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--label", default=None, help="Free-form label stored in the JSON report (version, config)")
+    r.add_argument("--json", dest="json_path", default=None, help="Write the report as JSON to this file ('-' for stdout)")
+
+    c = sub.add_parser("compare", help="Compare two JSON reports; exits 1 on regressions")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    c.add_argument("--error-rate-delta", type=float, default=0.01, help="Absolute error-rate increase counted as a regression")
+    c.add_argument("--json", dest="json_path", default=None, help="Write the comparison as JSON to this file ('-' for stdout)")
+    return p
+
+def _write(obj: Dict[str, Any], path: Optional[str]) -> bool:
+    if path is None:
+        return False
+    text = json.dumps(obj, indent=2)
+    if path == "-":
+        print(text)
+        return True
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+    return False
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        report = asyncio.run(run(args))
+        if not _write(report, args.json_path):
+            print_report(report)
+        return 0
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    result = compare(base, new, args.threshold, args.error_rate_delta)
+    if not _write(result, args.json_path):
+        print_comparison(result)
+    return 1 if result["regressions"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ..providers.sse import SSE_DONE, sse_data
+
+_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do")
+
+class Latency:
+    """A latency distribution in seconds, parsed from ``kind:params``.
+
+    ``fixed:S``, ``uniform:LO,HI``, ``normal:MEAN,SD``, ``lognormal:MEDIAN,SIGMA``
+    and ``exp:MEAN``; samples never go below zero.
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        try:
+            args = [float(x) for x in params.split(",") if x.strip()]
+        except ValueError:
+            raise ValueError(f"bad latency spec '{spec}'") from None
+        arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if kind not in arity or len(args) != arity[kind]:
+            raise ValueError(f"bad latency spec '{spec}' (expected e.g. fixed:0.2, uniform:0.1,0.5, normal:0.3,0.1, lognormal:0.3,0.5, exp:0.3)")
+        self.spec = spec
+        self.kind = kind
+        self.args = args
+
+    def sample(self, rnd: random.Random) -> float:
+        a = self.args
+        if self.kind == "fixed":
+            v = a[0]
+        elif self.kind == "uniform":
+            v = rnd.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            v = rnd.gauss(a[0], a[1])
+        elif self.kind == "lognormal":
+            v = a[0] * rnd.lognormvariate(0.0, a[1])
+        else:
+            v = rnd.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+        return max(0.0, v)
+
+@dataclass
+class MockUpstreamCfg:
+    latency: str = "fixed:0"            # before the response (first chunk for streams)
+    tokens_per_second: float = 0.0      # stream pacing; 0 sends all chunks at once
+    completion_tokens: int = 64         # answer length, capped by the request's max_tokens
+    error_rate: float = 0.0             # share of requests answered with 500
+    rate_limit_rate: float = 0.0        # share of requests answered with 429 + Retry-After
+    retry_after_seconds: int = 1
+    embedding_dims: int = 16
+    seed: Optional[int] = None
+
+def create_mock_upstream(
+    cfg: MockUpstreamCfg, sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep
+) -> FastAPI:
+    """An OpenAI-compatible upstream with injected latency, pacing and failures."""
+    latency = Latency(cfg.latency)
+    rnd = random.Random(cfg.seed)
+    app = FastAPI(title="mock-upstream")
+    counters: Dict[str, int] = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "errors": 0, "rate_limited": 0}
+
+    def _enter() -> None:
+        counters["requests"] += 1
+        counters["in_flight"] += 1
+        counters["peak_in_flight"] = max(counters["peak_in_flight"], counters["in_flight"])
+
+    def _fail() -> Optional[JSONResponse]:
+        roll = rnd.random()
+        if roll < cfg.rate_limit_rate:
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "rate limited (injected)", "type": "rate_limit_error"}},
+                status_code=429, headers={"Retry-After": str(cfg.retry_after_seconds)},
+            )
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            counters["errors"] += 1
+            return JSONResponse({"error": {"message": "server error (injected)", "type": "server_error"}}, status_code=500)
+        return None
+
+    def _tokens(payload: Dict[str, Any]) -> Tuple[List[str], str]:
+        n = cfg.completion_tokens
+        cap = payload.get("max_tokens") or payload.get("max_completion_tokens")
+        finish = "stop"
+        if cap and int(cap) < n:
+            n, finish = int(cap), "length"
+        return [(" " if i else "") + _WORDS[i % len(_WORDS)] for i in range(max(1, n))], finish
+
+    def _usage(prompt: Any, completion: int) -> Dict[str, int]:
+        p = max(1, len(str(prompt)) // 4)
+        return {"prompt_tokens": p, "completion_tokens": completion, "total_tokens": p + completion}
+
+    async def _released(frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            async for f in frames:
+                yield f
+        finally:
+            counters["in_flight"] -= 1
+
+    async def _stream(base: Dict[str, Any], tokens: List[str], finish: str, chat: bool, usage: Optional[Dict[str, int]]) -> AsyncIterator[bytes]:
+        gap = 1.0 / cfg.tokens_per_second if cfg.tokens_per_second > 0 else 0.0
+        if chat:
+            yield sse_data({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for i, tok in enumerate(tokens):
+            if gap and i:
+                await sleep(gap)
+            choice = {"index": 0, "delta": {"content": tok}} if chat else {"index": 0, "text": tok}
+            yield sse_data({**base, "choices": [{**choice, "finish_reason": None}]})
+        end = {"index": 0, "delta": {}} if chat else {"index": 0, "text": ""}
+        yield sse_data({**base, "choices": [{**end, "finish_reason": finish}]})
+        if usage is not None:
+            yield sse_data({**base, "choices": [], "usage": usage})
+        yield SSE_DONE
+
+    async def _generate(request: Request, chat: bool) -> Any:
+        payload = await request.json()
+        _enter()
+        streaming = False
+        try:
+            await sleep(latency.sample(rnd))
+            failed = _fail()
+            if failed is not None:
+                return failed
+            tokens, finish = _tokens(payload)
+            prompt = payload.get("messages") if chat else payload.get("prompt")
+            usage = _usage(prompt, len(tokens))
+            base = {
+                "id": f"{'chatcmpl' if chat else 'cmpl'}-mock-{counters['requests']}",
+                "object": "chat.completion.chunk" if chat else "text_completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "mock"),
+            }
+            if payload.get("stream"):
+                include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+                streaming = True
+                return StreamingResponse(
+                    _released(_stream(base, tokens, finish, chat, usage if include_usage else None)), media_type="text/event-stream"
+                )
+            text = "".join(tokens)
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}} if chat else {"index": 0, "text": text}
+            return {**base, "object": "chat.completion" if chat else "text_completion",
+                    "choices": [{**choice, "finish_reason": finish}], "usage": usage}
+        finally:
+            if not streaming:  # streams release in _released once the body is done
+                counters["in_flight"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await _generate(request, chat=True)
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        return await _generate(request, chat=False)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        _enter()
+        try:
+            await sleep(latency.sample(rnd))
+            failed = _fail()
+            if failed is not None:
+                return failed
+            inp = payload.get("input", "")
+            texts = [str(x) for x in inp] if isinstance(inp, list) else [str(inp)]
+            data = []
+            for i, t in enumerate(texts):
+                h = hashlib.sha256(t.encode("utf-8")).digest()
+                data.append({"object": "embedding", "index": i, "embedding": [h[k % len(h)] / 255.0 for k in range(cfg.embedding_dims)]})
+            tokens = sum(max(1, len(t) // 4) for t in texts)
+            return {"object": "list", "model": payload.get("model", "mock"), "data": data,
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+        finally:
+            counters["in_flight"] -= 1
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock-upstream"}]}
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"ok": True}
+
+    @app.get("/stats")
+    async def stats():
+        return {**counters, "latency": latency.spec, "tokens_per_second": cfg.tokens_per_second}
+
+    return app
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="OpenAI-compatible mock upstream with injected latency and failures")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--latency", default="fixed:0", help="Delay before answering: fixed:S | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA | exp:MEAN")
+    p.add_argument("--tokens-per-second", type=float, default=0.0, help="Stream pacing (0 = no pacing)")
+    p.add_argument("--completion-tokens", type=int, default=64, help="Answer length, capped by max_tokens")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    p.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    p.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    p.add_argument("--embedding-dims", type=int, default=16)
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--limit-concurrency", type=int, default=None, help="Answer 503 beyond this many connections/requests")
+    p.add_argument("--backlog", type=int, default=2048, help="Listen backlog (pending connections)")
+    p.add_argument("--timeout-keep-alive", type=int, default=5)
+    return p
+
+def main() -> None:
+    import uvicorn
+
+    args = build_parser().parse_args()
+    cfg = MockUpstreamCfg(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_seconds=args.retry_after,
+        embedding_dims=args.embedding_dims,
+        seed=args.seed,
+    )
+    uvicorn.run(
+        create_mock_upstream(cfg),
+        host=args.host,
+        port=args.port,
+        limit_concurrency=args.limit_concurrency,
+        backlog=args.backlog,
+        timeout_keep_alive=args.timeout_keep_alive,
+        access_log=False,
+    )
+
+if __name__ == "__main__":
+    main()
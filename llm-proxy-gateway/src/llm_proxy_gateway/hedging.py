@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import math
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+def is_idempotent(method: str, payload: Dict[str, Any]) -> bool:
+    """Calls whose duplicate is harmless: embeddings, and single-choice temperature-0 completions."""
+    if method == "embeddings":
+        return True
+    if method not in ("chat_completions", "completions") or payload.get("stream"):
+        return False
+    return payload.get("temperature") == 0 and payload.get("n") in (None, 1)
+
+class Hedger:
+    """Fire a backup attempt when the first one is slower than usual.
+
+    The hedge delay is the ``percentile`` of recent attempt latencies (recomputed
+    every ``recompute_every`` samples, never below ``min_delay_seconds``); until
+    ``min_samples`` are seen nothing is hedged. Each call earns ``budget_ratio``
+    of a hedge and each hedge spends one, so extra load stays under that ratio
+    (with at most ``budget_burst`` banked). The first successful attempt wins and
+    the other is cancelled; if the winner failed, the other attempt is awaited.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget_ratio: float = 0.05,
+        budget_burst: float = 10.0,
+        min_delay_seconds: float = 0.05,
+        min_samples: int = 20,
+        window: int = 1000,
+        recompute_every: int = 50,
+        models: Iterable[str] = (),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.percentile = float(percentile)
+        self.budget_ratio = float(budget_ratio)
+        self.budget_burst = float(budget_burst)
+        self.min_delay_seconds = float(min_delay_seconds)
+        self.min_samples = int(min_samples)
+        self.recompute_every = max(1, int(recompute_every))
+        self.models = frozenset(models)
+        self.clock = clock
+        self._samples: Deque[float] = collections.deque(maxlen=int(window))
+        self._since_recompute = 0
+        self._delay: Optional[float] = None
+        self._budget = 0.0
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def applies(self, method: str, payload: Dict[str, Any]) -> bool:
+        if self.models and payload.get("model") not in self.models:
+            return False
+        return is_idempotent(method, payload)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_recompute += 1
+        if len(self._samples) >= self.min_samples and (self._delay is None or self._since_recompute >= self.recompute_every):
+            ordered = sorted(self._samples)
+            idx = min(len(ordered) - 1, max(0, math.ceil(self.percentile / 100.0 * len(ordered)) - 1))
+            self._delay = max(self.min_delay_seconds, ordered[idx])
+            self._since_recompute = 0
+
+    @property
+    def delay(self) -> Optional[float]:
+        return self._delay
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        start = self.clock()
+        out = await fn()
+        self.observe(self.clock() - start)
+        return out
+
+    async def run(self, primary: Callable[[], Awaitable[T]], backup: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        self._budget = min(self.budget_burst, self._budget + self.budget_ratio)
+        start = self.clock()
+        first = asyncio.ensure_future(self._timed(primary))
+        if self._delay is None:
+            return await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self._delay)
+        except BaseException:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+        if self._budget < 1.0:
+            self.budget_exhausted += 1
+            return await first
+
+        self._budget -= 1.0
+        self.hedges += 1
+        second = asyncio.ensure_future(self._timed(backup))
+        pending = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if not t.exception()), None)
+                if winner is not None:
+                    if winner is second:
+                        self.hedge_wins += 1
+                        if not first.done():
+                            # The primary is cancelled below and never observes; keep its tail in the
+                            # window as a censored sample so the delay does not drift down.
+                            self.observe(max(self.clock() - start, self._delay))
+                    return winner.result()
+                if not pending:
+                    return first.result()  # both failed: surface the primary's error
+        finally:
+            for t in (first, second):
+                if not t.done():
+                    t.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "delay_ms": round(self._delay * 1000.0, 2) if self._delay is not None else None,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+            "win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+            "budget_exhausted": self.budget_exhausted,
+        }
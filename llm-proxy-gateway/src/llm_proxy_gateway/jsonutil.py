@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:  # optional fast path: pip install 'llm-proxy-gateway[fast]'
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None  # type: ignore[assignment]
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON; raises ``ValueError`` on malformed input with either backend."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Encode to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; stdlib handles them
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+def backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded with ``dumps`` (orjson when installed, compact stdlib otherwise)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
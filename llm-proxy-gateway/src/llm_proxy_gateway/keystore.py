@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+from .config import ApiKeyCfg, AuthCfg, load_config
+from .middleware.rate_limit import TokenLimits
+
+log = logging.getLogger("llm-proxy.auth")
+
+def key_digest(key: str) -> bytes:
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+def key_id(key: str) -> str:
+    """The id a key is known by in limiters, logs and batch ownership (a digest prefix)."""
+    return key_digest(key).hex()[:12]
+
+@dataclass(frozen=True)
+class ApiKey:
+    """A caller identity resolved from a bearer key, plus its per-key policy."""
+
+    key_id: str  # digest prefix: safe to log
+    tenant: str
+    digest: bytes = field(repr=False, default=b"")
+    allowed_models: FrozenSet[str] = frozenset()
+    refill_per_sec: Optional[float] = None
+    capacity: Optional[int] = None
+    token_limits: Optional[TokenLimits] = None
+    priority: int = 0
+
+ANONYMOUS = ApiKey(key_id="anonymous", tenant="anonymous")
+
+def _entry(item: Union[str, ApiKeyCfg]) -> ApiKey:
+    c = item if isinstance(item, ApiKeyCfg) else ApiKeyCfg(key=item)
+    d = key_digest(c.key)
+    kid = d.hex()[:12]
+    return ApiKey(
+        key_id=kid,
+        tenant=c.tenant or kid,
+        digest=d,
+        allowed_models=frozenset(c.allowed_models),
+        refill_per_sec=c.rate_limit.refill_per_sec if c.rate_limit else None,
+        capacity=c.rate_limit.capacity if c.rate_limit else None,
+        token_limits=TokenLimits(**c.token_limits.model_dump()) if c.token_limits else None,
+        priority=c.priority,
+    )
+
+class KeyStore:
+    """API keys indexed by SHA-256 digest, built once and swapped atomically.
+
+    Lookups hash the presented key and hit a dict, so cost does not depend on
+    the number of keys. Hashing first is also what keeps the lookup from leaking
+    timing about stored keys: the dict only ever compares digests of the caller's
+    own input. Only digests are kept, and requests carry the resolved ``ApiKey``
+    (limiters and batch ownership use its ``key_id``). ``replace`` rebinds the
+    whole index in one assignment: requests that already resolved their
+    ``ApiKey`` keep it, new requests see the new set.
+    """
+
+    def __init__(self, keys: Iterable[Union[str, ApiKeyCfg]] = ()):
+        self._index: Dict[bytes, ApiKey] = self._build(keys)
+
+    @staticmethod
+    def _build(keys: Iterable[Union[str, ApiKeyCfg]]) -> Dict[bytes, ApiKey]:
+        index: Dict[bytes, ApiKey] = {}
+        for item in keys:
+            e = _entry(item)
+            index[e.digest] = e
+        return index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, key: str) -> Optional[ApiKey]:
+        return self._index.get(key_digest(key))
+
+    def replace(self, keys: Iterable[Union[str, ApiKeyCfg]]) -> None:
+        self._index = self._build(keys)
+
+    @classmethod
+    def from_cfg(cls, auth: AuthCfg) -> "KeyStore":
+        return cls(auth.api_keys)
+
+async def watch_config(store: KeyStore, path: str, interval_seconds: float) -> None:
+    """Reload keys whenever the config file changes (mtime/size), keeping the old set on errors.
+
+    ``load_config`` merges ``LLM_PROXY_API_KEYS`` the same way as at startup.
+    """
+    def fingerprint() -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    seen = fingerprint()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        current = fingerprint()
+        if current is None or current == seen:
+            continue
+        seen = current
+        try:
+            auth = load_config(path).cfg.auth
+        except Exception as e:  # bad edit: keep serving with the previous keys
+            log.warning("api key reload failed: %s", e)
+            continue
+        store.replace(auth.api_keys)
+        log.info("api keys reloaded (%d keys)", len(store))
@@ -1,32 +1,155 @@
 from __future__ import annotations
 
-import json
+import atexit
+import copy
 import logging
+import queue
 import sys
-import time
-from typing import Any, Dict
+import threading
+from typing import IO, Any, Dict, List, Optional
+
+from . import jsonutil
+from .config import LoggingCfg
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         payload: Dict[str, Any] = {
-            "ts": time.time(),
+            "ts": record.created,
             "level": record.levelname,
             "logger": record.name,
             "msg": record.getMessage(),
         }
         # Attach structured extras if present
-        for k in ("request_id", "path", "method", "status_code", "latency_ms", "client", "provider", "model"):
+        for k in (
+            "request_id", "path", "method", "status_code", "latency_ms", "client",
+            "tenant", "provider", "model", "sample_rate",
+        ):
             if hasattr(record, k):
                 payload[k] = getattr(record, k)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return jsonutil.dumps(payload).decode("utf-8")
+
+_STOP = object()
+
+class QueueingHandler(logging.Handler):
+    """Hand records to a background thread that formats and writes them in batches.
+
+    ``emit`` renders the message and exception text into a copy of the record (so
+    the copy no longer references mutable args or tracebacks) and enqueues it; the event loop never
+    waits on the stream. The queue is bounded: with ``overflow="drop"`` records
+    that do not fit are counted in ``dropped``, with ``"block"`` the caller waits.
+    """
+
+    def __init__(self, stream: IO[str], queue_size: int = 10_000, overflow: str = "drop", batch_max: int = 256):
+        super().__init__()
+        self.stream = stream
+        self.overflow = overflow
+        self.batch_max = max(1, int(batch_max))
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._drain, name="llm-proxy-log", daemon=True)
+        self._thread.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A copy: other handlers on the logger still see the original args and traceback.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
         if record.exc_info:
-            payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+            record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            record = self.prepare(record)
+            if self.overflow == "block":
+                self._queue.put(record)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _drain(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: List[logging.LogRecord] = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_max:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
 
-def setup_logging(level: str = "INFO") -> None:
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            return
+        self.written += len(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            # The stop marker always gets in: block until the drain thread makes room.
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5.0)
+        super().close()
+
+_handler: Optional[QueueingHandler] = None
+
+def setup_logging(level: str = "INFO", cfg: Optional[LoggingCfg] = None) -> None:
+    global _handler
+    cfg = cfg or LoggingCfg()
     root = logging.getLogger()
-    root.handlers.clear()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        if isinstance(h, QueueingHandler):
+            h.close()
     root.setLevel(level.upper())
 
-    handler = logging.StreamHandler(sys.stdout)
+    handler: logging.Handler
+    if cfg.queue:
+        handler = _handler = QueueingHandler(sys.stdout, cfg.queue_size, cfg.overflow, cfg.batch_max)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        _handler = None
     handler.setFormatter(JsonFormatter())
     root.addHandler(handler)
+
+def logging_stats() -> Dict[str, Any]:
+    return _handler.stats() if _handler is not None else {}
+
+def _shutdown() -> None:
+    if _handler is not None:
+        _handler.close()
+
+atexit.register(_shutdown)
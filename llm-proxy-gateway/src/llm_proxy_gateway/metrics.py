@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import glob
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Exported by the CLI so every worker writes its snapshot into the same directory.
+METRICS_DIR_ENV = "LLM_PROXY_METRICS_DIR"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def set(self, *labels: str, value: float) -> None:
+        # For totals owned by another component (cache counters), copied in at collect time.
+        self.values[labels] = float(value)
+
+    def dump(self) -> List[Any]:
+        return [[list(k), v] for k, v in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+class Histogram:
+    """Fixed-bucket histogram: per label set, non-cumulative bucket counts plus sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # [bucket counts..., +Inf count, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def dump(self) -> List[Any]:
+        return [[list(k), list(v)] for k, v in self.values.items()]
+
+Metric = Any  # Counter | Gauge | Histogram
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(int(v)) if float(v).is_integer() else repr(v)
+
+class MetricsRegistry:
+    """In-process metrics with Prometheus text rendering.
+
+    Updates are plain dict operations on the event loop thread. With several
+    workers, each one writes ``snapshot()`` to ``<dir>/<pid>.json`` (every
+    ``flush_interval_seconds`` and on scrape) and ``/metrics`` merges all files:
+    counters and histograms are summed across every file, gauges only across
+    live processes.
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str] = None):
+        self.multiprocess_dir = multiprocess_dir
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _add(self, m: Metric) -> Metric:
+        self._metrics[m.name] = m
+        return m
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def on_collect(self, fn: Callable[[], None]) -> None:
+        self._collectors.append(fn)
+
+    def snapshot(self) -> Dict[str, Any]:
+        for fn in self._collectors:
+            fn()
+        return {
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "metrics": {
+                m.name: {
+                    "kind": m.kind,
+                    "help": m.help,
+                    "labelnames": list(m.labelnames),
+                    "buckets": list(getattr(m, "buckets", ())),
+                    "values": m.dump(),
+                }
+                for m in self._metrics.values()
+            },
+        }
+
+    def write_snapshot(self, snap: Optional[Dict[str, Any]] = None) -> None:
+        if not self.multiprocess_dir:
+            return
+        if snap is None:
+            snap = self.snapshot()
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        path = os.path.join(self.multiprocess_dir, f"{os.getpid()}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _snapshots(self, own: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        if own is None:
+            own = self.snapshot()
+        if not self.multiprocess_dir:
+            return [own]
+        self.write_snapshot(own)
+        out = []
+        for path in sorted(glob.glob(os.path.join(self.multiprocess_dir, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # a worker is mid-replace or the file is corrupt: skip this scrape
+        return out
+
+    def render(self) -> str:
+        return render(merge(self._snapshots()))
+
+    # The async variants collect on the loop (collectors and metric values are only
+    # touched there) and do the file I/O, merge and formatting in a worker thread.
+    async def awrite_snapshot(self) -> None:
+        if self.multiprocess_dir:
+            await asyncio.to_thread(self.write_snapshot, self.snapshot())
+
+    async def arender(self) -> str:
+        if not self.multiprocess_dir:
+            return self.render()
+        own = self.snapshot()
+        return await asyncio.to_thread(lambda: render(merge(self._snapshots(own))))
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snap in snapshots:
+        alive = _alive(int(snap.get("pid", 0)))
+        for name, m in snap["metrics"].items():
+            if m["kind"] == "gauge" and not alive:
+                continue
+            into = merged.setdefault(name, {**m, "values": {}})
+            for labels, value in m["values"]:
+                key = tuple(labels)
+                if m["kind"] == "histogram":
+                    row = into["values"].get(key)
+                    into["values"][key] = value if row is None else [a + b for a, b in zip(row, value, strict=True)]
+                else:
+                    into["values"][key] = into["values"].get(key, 0.0) + value
+    return merged
+
+def render(merged: Dict[str, Dict[str, Any]]) -> str:
+    lines: List[str] = []
+    for name, m in merged.items():
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        names = m["labelnames"]
+        for labels, value in sorted(m["values"].items()):
+            if m["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_num(value)}")
+                continue
+            cumulative = 0.0
+            for bound, n in zip([*m["buckets"], float("inf")], value[:-1], strict=True):
+                cumulative += n
+                le = f'le="{_num(bound)}"'
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {_num(cumulative)}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_num(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {_num(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+class GatewayMetrics:
+    """The gateway's metric set (one per app)."""
+
+    def __init__(self, multiprocess_dir: Optional[str] = None, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        r = self.registry = MetricsRegistry(multiprocess_dir)
+        self.requests = r.counter("llm_proxy_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+        self.request_seconds = r.histogram(
+            "llm_proxy_request_duration_seconds", "End-to-end request latency", ("route",), buckets
+        )
+        self.in_flight = r.gauge("llm_proxy_requests_in_flight", "Requests currently being served")
+        self.upstream = r.counter(
+            "llm_proxy_upstream_requests_total", "Upstream calls by provider, model and outcome", ("provider", "model", "outcome")
+        )
+        self.upstream_seconds = r.histogram(
+            "llm_proxy_upstream_duration_seconds", "Upstream call latency (full stream for streaming calls)",
+            ("provider", "model"), buckets,
+        )
+        self.cache_hits = r.counter("llm_proxy_cache_hits_total", "Response cache hits", ("tier",))
+        self.cache_misses = r.counter("llm_proxy_cache_misses_total", "Response cache misses", ("tier",))
+        self.cache_evictions = r.counter("llm_proxy_cache_evictions_total", "Response cache evictions", ("tier",))
+        self.rate_limited = r.counter("llm_proxy_rate_limit_rejects_total", "Requests rejected by rate limits", ("limit",))
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    async def arender(self) -> str:
+        return await self.registry.arender()
@@ -1,26 +1,76 @@
 from __future__ import annotations
 
 import logging
+import random
 import time
-from typing import Callable
+from typing import Callable, Dict, Optional
 
-from fastapi import Request, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 log = logging.getLogger("llm-proxy.access")
 
-async def access_log_middleware(request: Request, call_next: Callable) -> Response:
-    start = time.perf_counter()
-    response: Response = await call_next(request)
-    latency_ms = (time.perf_counter() - start) * 1000.0
-
-    record = log.info  # type: ignore
-    extra = {
-        "request_id": getattr(request.state, "request_id", None),
-        "path": request.url.path,
-        "method": request.method,
-        "status_code": response.status_code,
-        "latency_ms": round(latency_ms, 2),
-        "client": request.client.host if request.client else None,
-    }
-    log.info("request", extra=extra)
-    return response
+class AccessLogMiddleware:
+    """One log line per request, written once the response body is complete
+    (so streamed responses report their full duration).
+
+    Successful responses are sampled at ``route_sample_rates[path]`` (falling
+    back to ``sample_rate``); kept lines carry ``sample_rate`` when it is below 1
+    so counts can be re-weighted. Errors (status >= 400) and requests slower
+    than ``slow_request_ms`` are always logged.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = 1.0,
+        route_sample_rates: Optional[Dict[str, float]] = None,
+        slow_request_ms: float = 1000.0,
+        rand: Callable[[], float] = random.random,
+    ):
+        self.app = app
+        self.sample_rate = float(sample_rate)
+        self.route_sample_rates = dict(route_sample_rates or {})
+        self.slow_request_ms = float(slow_request_ms)
+        self.rand = rand
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_capture(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_capture)
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000.0
+            rate = 1.0
+            if status_code < 400 and latency_ms < self.slow_request_ms:
+                rate = self.route_sample_rates.get(scope["path"], self.sample_rate)
+            if rate >= 1.0 or self.rand() < rate:
+                self._log(scope, status_code, latency_ms, rate)
+
+    @staticmethod
+    def _log(scope: Scope, status_code: int, latency_ms: float, rate: float) -> None:
+        state = scope.get("state", {})
+        client = scope.get("client")
+        extra = {
+            "request_id": state.get("request_id"),
+            "path": scope["path"],
+            "method": scope["method"],
+            "status_code": status_code,
+            "latency_ms": round(latency_ms, 2),
+            "client": client[0] if client else None,
+        }
+        principal = state.get("principal")
+        if principal is not None:
+            extra["tenant"] = principal.tenant
+        if rate < 1.0:
+            extra["sample_rate"] = rate
+        log.info("request", extra=extra)
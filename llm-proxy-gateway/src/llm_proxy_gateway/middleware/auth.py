@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from typing import Callable, Iterable, Optional
+from typing import Iterable, Optional
 
-from fastapi import Request, Response
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from ..errors import http_error
+from ..errors import error_response
+from ..keystore import ANONYMOUS, KeyStore
 
 def _extract_bearer(auth_header: Optional[str]) -> Optional[str]:
     if not auth_header:
@@ -14,13 +16,25 @@ def _extract_bearer(auth_header: Optional[str]) -> Optional[str]:
         return parts[1].strip()
     return None
 
-async def auth_middleware(enabled: bool, api_keys: Iterable[str], request: Request, call_next: Callable) -> Response:
-    if not enabled:
-        request.state.api_key = "anonymous"
-        return await call_next(request)
+class AuthMiddleware:
+    def __init__(self, app: ASGIApp, enabled: bool, keys: KeyStore, public_paths: Iterable[str] = ()):
+        self.app = app
+        self.enabled = enabled
+        self.keys = keys
+        self.public_paths = frozenset(public_paths)
 
-    key = _extract_bearer(request.headers.get("authorization"))
-    if not key or key not in set(api_keys):
-        raise http_error(401, "unauthorized")
-    request.state.api_key = key
-    return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        state = scope.setdefault("state", {})
+        if not self.enabled or scope["path"] in self.public_paths:
+            state["principal"] = ANONYMOUS
+            return await self.app(scope, receive, send)
+
+        key = _extract_bearer(Headers(scope=scope).get("authorization"))
+        principal = self.keys.lookup(key) if key else None
+        if principal is None:
+            return await error_response(401, "unauthorized")(scope, receive, send)
+        state["principal"] = principal
+        await self.app(scope, receive, send)
@@ -1,22 +1,64 @@
 from __future__ import annotations
 
-from typing import Callable
+from typing import Dict, Optional
 
-from fastapi import Request, Response
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from ..errors import http_error
+from ..errors import error_response, http_error
+
+class BodyLimitMiddleware:
+    """Reject bodies over ``max_bytes`` without buffering them.
+
+    A too-large ``Content-Length`` is answered with 413 before the app runs.
+    Otherwise ``receive`` is wrapped and counts bytes as chunks arrive, raising
+    413 as soon as the limit is crossed (this covers chunked uploads).
+    ``path_limits`` overrides the limit for exact paths (e.g. file uploads).
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = int(max_bytes)
+        self.path_limits = {p: int(n) for p, n in (path_limits or {}).items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        message = f"request body too large (>{max_bytes} bytes)"
+        cl = Headers(scope=scope).get("content-length")
+        if cl is not None:
+            try:
+                too_large = int(cl) > max_bytes
+            except ValueError:
+                too_large = False
+            if too_large:
+                return await error_response(413, message)(scope, receive, send)
+
+        received = 0
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            msg = await receive()
+            if msg["type"] == "http.request":
+                received += len(msg.get("body", b""))
+                if received > max_bytes:
+                    raise http_error(413, message)
+            return msg
+
+        async def tracking_send(msg: Message) -> None:
+            nonlocal started
+            if msg["type"] == "http.response.start":
+                started = True
+            await send(msg)
 
-async def body_limit_middleware(max_bytes: int, request: Request, call_next: Callable) -> Response:
-    cl = request.headers.get("content-length")
-    if cl is not None:
         try:
-            if int(cl) > max_bytes:
-                raise http_error(413, f"request body too large (>{max_bytes} bytes)")
-        except ValueError:
-            pass
-    # For safety: read body once and store for downstream if needed
-    body = await request.body()
-    if len(body) > max_bytes:
-        raise http_error(413, f"request body too large (>{max_bytes} bytes)")
-    request.state.raw_body = body
-    return await call_next(request)
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            # Normally the router turns this into a 413; this covers reads outside it.
+            if started or e.status_code != 413:
+                raise
+            await error_response(413, message)(scope, receive, send)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+class InFlightCounter:
+    """Requests currently being served; read by background work that yields to live traffic."""
+
+    def __init__(self) -> None:
+        self.value = 0
+
+class InFlightMiddleware:
+    """Counts requests to ``paths`` into ``counter`` until their response body ends."""
+
+    def __init__(self, app: ASGIApp, counter: InFlightCounter, paths: Iterable[str]):
+        self.app = app
+        self.counter = counter
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        self.counter.value += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.counter.value -= 1
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..metrics import GatewayMetrics
+
+class MetricsMiddleware:
+    """Request count, status, latency and in-flight gauge for every HTTP request.
+
+    Routes are labelled with the matched route template (``other`` for
+    unmatched paths and requests rejected before routing) to keep cardinality fixed.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: GatewayMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        m = self.metrics
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_capture(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        m.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_capture)
+        finally:
+            m.in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "other"
+            m.requests.inc(scope["method"], route, str(status_code))
+            m.request_seconds.observe(time.perf_counter() - start, route)
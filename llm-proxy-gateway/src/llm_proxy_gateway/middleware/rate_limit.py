@@ -1,45 +1,264 @@
 from __future__ import annotations
 
+import math
 import time
 from dataclasses import dataclass
-from typing import Callable, Dict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
 
-from fastapi import Request, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from ..errors import http_error
+from ..config import RateLimitCfg
+from ..errors import error_response, http_error
+
+def refilled(tokens: Optional[float], last_ts: float, now: float, refill_per_sec: float, capacity: float) -> float:
+    if tokens is None:
+        return capacity
+    return min(capacity, tokens + max(0.0, now - last_ts) * refill_per_sec)
+
+def idle_at(tokens: float, now: float, refill_per_sec: float, capacity: float) -> float:
+    """When the bucket is full again, i.e. indistinguishable from a new one and safe to drop."""
+    if tokens >= capacity:
+        return now
+    if refill_per_sec <= 0:
+        return math.inf
+    return now + (capacity - tokens) / refill_per_sec
 
 @dataclass
 class Bucket:
     tokens: float
     last_ts: float
+    idle_at: float = math.inf
 
 class TokenBucketLimiter:
+    """Single-process token buckets (the fast default backend)."""
+
     def __init__(self, refill_per_sec: float, capacity: int):
         self.refill_per_sec = float(refill_per_sec)
         self.capacity = int(capacity)
         self._buckets: Dict[str, Bucket] = {}
 
-    def allow(self, key: str, cost: float = 1.0) -> bool:
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: str, refill_per_sec: float, capacity: float) -> Bucket:
         now = time.monotonic()
         b = self._buckets.get(key)
         if b is None:
-            b = Bucket(tokens=float(self.capacity), last_ts=now)
+            b = Bucket(tokens=capacity, last_ts=now)
             self._buckets[key] = b
 
-        elapsed = max(0.0, now - b.last_ts)
-        b.tokens = min(float(self.capacity), b.tokens + elapsed * self.refill_per_sec)
+        b.tokens = refilled(b.tokens, b.last_ts, now, refill_per_sec, capacity)
         b.last_ts = now
+        return b
 
-        if b.tokens >= cost:
+    def gc(self) -> int:
+        now = time.monotonic()
+        idle = [k for k, b in self._buckets.items() if b.idle_at <= now]
+        for k in idle:
+            del self._buckets[k]
+        return len(idle)
+
+    def allow(
+        self,
+        key: str,
+        cost: float = 1.0,
+        refill_per_sec: Optional[float] = None,
+        capacity: Optional[int] = None,
+    ) -> bool:
+        cap = float(self.capacity if capacity is None else capacity)
+        rate = self.refill_per_sec if refill_per_sec is None else float(refill_per_sec)
+        b = self._refill(key, rate, cap)
+        ok = b.tokens >= cost
+        if ok:
             b.tokens -= cost
-            return True
-        return False
+        b.idle_at = idle_at(b.tokens, b.last_ts, rate, cap)
+        return ok
+
+    def adjust(
+        self,
+        key: str,
+        delta: float,
+        refill_per_sec: Optional[float] = None,
+        capacity: Optional[int] = None,
+    ) -> None:
+        """Credit (delta > 0) or debit (delta < 0) a bucket after the fact.
+
+        Debits may push the bucket below zero (down to -capacity): the key then
+        has to wait for the debt to refill before its next request passes.
+        """
+        cap = float(self.capacity if capacity is None else capacity)
+        rate = self.refill_per_sec if refill_per_sec is None else float(refill_per_sec)
+        b = self._refill(key, rate, cap)
+        b.tokens = max(-cap, min(cap, b.tokens + delta))
+        b.idle_at = idle_at(b.tokens, b.last_ts, rate, cap)
+
+class BucketLimiter(Protocol):
+    refill_per_sec: float
+    capacity: int
+
+    def allow(self, key: str, cost: float = 1.0, refill_per_sec: Optional[float] = None, capacity: Optional[int] = None) -> bool: ...
+
+    def adjust(self, key: str, delta: float, refill_per_sec: Optional[float] = None, capacity: Optional[int] = None) -> None: ...
+
+    def gc(self) -> int: ...
+
+# One table per file per process; limiters sharing it are separated by namespace.
+_shared_tables: Dict[str, Any] = {}
+
+def build_limiter(cfg: RateLimitCfg, namespace: str, refill_per_sec: float, capacity: int) -> BucketLimiter:
+    """In-process buckets by default; ``backend: shared`` shares state across workers on the host."""
+    if cfg.backend == "shared":
+        from .shared_buckets import SharedBucketTable, SharedTokenBucketLimiter
+
+        table = _shared_tables.get(cfg.shared_path)
+        if table is None:
+            table = _shared_tables[cfg.shared_path] = SharedBucketTable(cfg.shared_path, cfg.shared_slots)
+        return SharedTokenBucketLimiter(table, namespace, refill_per_sec, capacity)
+    return TokenBucketLimiter(refill_per_sec=refill_per_sec, capacity=capacity)
+
+def _chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, list):
+        return sum(_chars(v) for v in value)
+    if isinstance(value, dict):
+        # multimodal content parts: only text parts count toward the prompt
+        return len(value["text"]) if isinstance(value.get("text"), str) else 0
+    return 0
+
+def estimate_tokens(
+    path: str,
+    payload: Dict[str, Any],
+    chars_per_token: float,
+    default_max_tokens: int,
+    message_chars: Optional[Callable[[List[Any]], int]] = None,
+) -> Tuple[int, int]:
+    """Rough (prompt, completion) token estimate used to reserve budget up front."""
+    if path.endswith("/chat/completions"):
+        messages = payload.get("messages", [])
+        chars = message_chars(messages) if message_chars is not None else sum(_chars(m.get("content")) for m in messages)
+    elif path.endswith("/embeddings"):
+        return max(1, int(_chars(payload.get("input")) / chars_per_token)), 0
+    else:
+        chars = _chars(payload.get("prompt"))
+    completion = payload.get("max_tokens") or payload.get("max_completion_tokens") or default_max_tokens
+    return max(1, int(chars / chars_per_token)), int(completion)
+
+@dataclass
+class TokenLimits:
+    prompt_tokens_per_sec: float
+    prompt_capacity: int
+    completion_tokens_per_sec: float
+    completion_capacity: int
+
+@dataclass
+class TokenReservation:
+    key: str
+    limits: TokenLimits
+    prompt: float
+    completion: float
+    upstream: bool = False
+    used_prompt: float = 0.0
+    used_completion: float = 0.0
+
+    def record(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Account for one upstream response (a request may make several, e.g. embeddings fan-out)."""
+        self.upstream = True
+        if not usage:
+            # No usage reported: keep the estimate for this call.
+            self.used_prompt += self.prompt
+            self.used_completion += self.completion
+            return
+        self.used_prompt += float(usage.get("prompt_tokens") or 0)
+        self.used_completion += float(usage.get("completion_tokens") or 0)
+
+class TokenUsageLimiter:
+    """Token-weighted limiting on top of two token buckets (prompt, completion).
+
+    ``reserve`` debits an estimate before the upstream call (429 if either bucket
+    is short); ``settle`` replaces the estimate with real ``usage``, or refunds it
+    entirely when the request never reached the upstream (cache hit, coalesced
+    duplicate, error). Estimates are capped at bucket capacity so one large
+    request can still pass a full bucket; the real cost is then charged as debt.
+    """
+
+    def __init__(
+        self,
+        prompt: BucketLimiter,
+        completion: BucketLimiter,
+        chars_per_token: float = 4.0,
+        default_max_tokens: int = 256,
+        overrides: Optional[Dict[str, TokenLimits]] = None,
+        message_chars: Optional[Callable[[List[Any]], int]] = None,
+    ):
+        self.prompt = prompt
+        self.completion = completion
+        self.chars_per_token = float(chars_per_token)
+        self.default_max_tokens = int(default_max_tokens)
+        self.overrides: Dict[str, TokenLimits] = dict(overrides or {})
+        self.message_chars = message_chars
+        self.defaults = TokenLimits(
+            prompt_tokens_per_sec=prompt.refill_per_sec,
+            prompt_capacity=prompt.capacity,
+            completion_tokens_per_sec=completion.refill_per_sec,
+            completion_capacity=completion.capacity,
+        )
+
+    def limits_for(self, key: str) -> TokenLimits:
+        return self.overrides.get(key, self.defaults)
+
+    def reserve(self, key: str, path: str, payload: Dict[str, Any], limits: Optional[TokenLimits] = None) -> TokenReservation:
+        lim = limits or self.limits_for(key)
+        est_prompt, est_completion = estimate_tokens(path, payload, self.chars_per_token, self.default_max_tokens, self.message_chars)
+        res = TokenReservation(
+            key=key,
+            limits=lim,
+            prompt=float(min(est_prompt, lim.prompt_capacity)),
+            completion=float(min(est_completion, lim.completion_capacity)),
+        )
+        if not self.prompt.allow(key, res.prompt, lim.prompt_tokens_per_sec, lim.prompt_capacity):
+            raise http_error(429, "token rate limit exceeded (prompt tokens)")
+        if not self.completion.allow(key, res.completion, lim.completion_tokens_per_sec, lim.completion_capacity):
+            self.prompt.adjust(key, res.prompt, lim.prompt_tokens_per_sec, lim.prompt_capacity)
+            raise http_error(429, "token rate limit exceeded (completion tokens)")
+        return res
+
+    def settle(self, res: TokenReservation, refund: bool = False) -> None:
+        charged = res.upstream and not refund
+        used_prompt = res.used_prompt if charged else 0.0
+        used_completion = res.used_completion if charged else 0.0
+        lim = res.limits
+        self.prompt.adjust(res.key, res.prompt - used_prompt, lim.prompt_tokens_per_sec, lim.prompt_capacity)
+        self.completion.adjust(res.key, res.completion - used_completion, lim.completion_tokens_per_sec, lim.completion_capacity)
+
+class RateLimitMiddleware:
+    """Request-count limit per API key (runs after auth, which sets the key and its limits)."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        enabled: bool,
+        limiter: BucketLimiter,
+        public_paths: Iterable[str] = (),
+        on_reject: Optional[Callable[[], None]] = None,
+    ):
+        self.app = app
+        self.enabled = enabled
+        self.limiter = limiter
+        self.public_paths = frozenset(public_paths)
+        self.on_reject = on_reject
 
-async def rate_limit_middleware(enabled: bool, limiter: TokenBucketLimiter, request: Request, call_next: Callable) -> Response:
-    if not enabled:
-        return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled or scope["path"] in self.public_paths:
+            return await self.app(scope, receive, send)
 
-    api_key = getattr(request.state, "api_key", "anonymous")
-    if not limiter.allow(api_key, cost=1.0):
-        raise http_error(429, "rate limit exceeded")
-    return await call_next(request)
+        principal = scope.get("state", {}).get("principal")
+        if principal is None:
+            key, refill, capacity = "anonymous", None, None
+        else:
+            key, refill, capacity = principal.key_id, principal.refill_per_sec, principal.capacity
+        if not self.limiter.allow(key, 1.0, refill, capacity):
+            if self.on_reject is not None:
+                self.on_reject()
+            return await error_response(429, "rate limit exceeded")(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -1,15 +1,26 @@
 from __future__ import annotations
 
 import secrets
-from typing import Callable
 
-from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 HEADER = "X-Request-Id"
 
-async def request_id_middleware(request: Request, call_next: Callable) -> Response:
-    rid = request.headers.get(HEADER) or secrets.token_hex(12)
-    request.state.request_id = rid
-    response: Response = await call_next(request)
-    response.headers[HEADER] = rid
-    return response
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = Headers(scope=scope).get(HEADER) or secrets.token_hex(12)
+        scope.setdefault("state", {})["request_id"] = rid
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[HEADER] = rid
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple
+
+from .rate_limit import idle_at, refilled
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None  # type: ignore[assignment]
+
+_MAGIC = b"LPGB"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII4x")  # magic, version, slots
+_SLOT = struct.Struct("<16sddd")  # key digest, tokens, last_ts, idle_at
+_EMPTY = bytes(16)
+
+# current (refilled) tokens -> (new tokens, result)
+BucketOp = Callable[[float], Tuple[float, bool]]
+
+class SharedBucketTable:
+    """Fixed-slot token-bucket table in an mmap'd file, shared by all workers on a host.
+
+    Slots are addressed by a 16-byte digest of the bucket key with linear
+    probing. Every read-modify-write holds an exclusive ``flock`` on the file,
+    which makes updates atomic across processes. A slot whose bucket has refilled
+    completely is idle: it is reused by inserts and dropped by ``gc()``. The sweep
+    runs in slices of ``gc_slice_slots``, each under its own short lock, and removes
+    slots by backward-shift deletion so probe chains stay intact and short. The
+    file and mapping are (re)opened per process, so the table can be created
+    before workers fork.
+    """
+
+    def __init__(self, path: str, slots: int = 65_536, gc_slice_slots: int = 1024):
+        if fcntl is None:
+            raise ValueError("shared rate-limit backend requires a POSIX host (fcntl)")
+        self.path = path
+        self.slots = int(slots)
+        self.gc_slice_slots = max(1, int(gc_slice_slots))
+        self._fd: Optional[int] = None
+        self._mm: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+        self.table_full = 0
+
+    def _open(self) -> mmap.mmap:
+        if self._mm is not None and self._pid == os.getpid():
+            return self._mm
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size == 0:
+                os.ftruncate(fd, _HEADER.size + self.slots * _SLOT.size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, _VERSION, self.slots), 0)
+            magic, version, slots = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{self.path} is not a rate-limit table (v{_VERSION})")
+            self.slots = slots  # the file wins over config so all workers agree
+            mm = mmap.mmap(fd, _HEADER.size + slots * _SLOT.size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._mm, self._pid = fd, mm, os.getpid()
+        return mm
+
+    @contextmanager
+    def _locked(self) -> Iterator[mmap.mmap]:
+        mm = self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield mm
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def digest(namespace: str, key: str) -> bytes:
+        d = hashlib.blake2b(f"{namespace}\0{key}".encode("utf-8"), digest_size=16).digest()
+        return d if d != _EMPTY else b"\x01" + d[1:]
+
+    def _find(self, mm: mmap.mmap, digest: bytes, now: float) -> Tuple[Optional[int], bool]:
+        """Return (slot index, found). Index is None only when the table is full."""
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        reusable: Optional[int] = None
+        for i in range(self.slots):
+            idx = (start + i) % self.slots
+            d, _tokens, _last, idle = _SLOT.unpack_from(mm, _HEADER.size + idx * _SLOT.size)
+            if d == digest:
+                return idx, True
+            if d == _EMPTY:
+                return (idx if reusable is None else reusable), False
+            if reusable is None and idle <= now:
+                reusable = idx
+        return reusable, False
+
+    def apply(self, digest: bytes, refill_per_sec: float, capacity: float, op: BucketOp) -> bool:
+        now = time.time()  # wall clock: comparable across processes
+        with self._locked() as mm:
+            idx, found = self._find(mm, digest, now)
+            if idx is None:
+                # Every slot holds a non-idle bucket: fail open rather than reject everyone.
+                self.table_full += 1
+                return True
+            off = _HEADER.size + idx * _SLOT.size
+            tokens = capacity
+            if found:
+                _d, t, last, _idle = _SLOT.unpack_from(mm, off)
+                tokens = refilled(t, last, now, refill_per_sec, capacity)
+            new_tokens, result = op(tokens)
+            _SLOT.pack_into(mm, off, digest, new_tokens, now, idle_at(new_tokens, now, refill_per_sec, capacity))
+            return result
+
+    def _home(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.slots
+
+    def _delete(self, mm: mmap.mmap, idx: int) -> None:
+        """Empty slot ``idx``, shifting later entries of its cluster back (no tombstones)."""
+        n = self.slots
+        hole = j = idx
+        for _ in range(n - 1):
+            j = (j + 1) % n
+            entry = _SLOT.unpack_from(mm, _HEADER.size + j * _SLOT.size)
+            if entry[0] == _EMPTY:
+                break
+            home = self._home(entry[0])
+            # The entry may fill the hole unless its home lies cyclically in (hole, j].
+            if (home <= hole or home > j) if hole <= j else (home <= hole and home > j):
+                _SLOT.pack_into(mm, _HEADER.size + hole * _SLOT.size, *entry)
+                hole = j
+        mm[_HEADER.size + hole * _SLOT.size : _HEADER.size + (hole + 1) * _SLOT.size] = bytes(_SLOT.size)
+
+    def gc_slice(self, start: int) -> Tuple[int, int]:
+        """Drop idle buckets in ``[start, start + gc_slice_slots)``; returns (dropped, next start, 0 when done)."""
+        dropped = 0
+        with self._locked() as mm:
+            now = time.time()
+            end = min(self.slots, start + self.gc_slice_slots)
+            idx = start
+            while idx < end:
+                d, _t, _l, idle = _SLOT.unpack_from(mm, _HEADER.size + idx * _SLOT.size)
+                if d != _EMPTY and idle <= now:
+                    self._delete(mm, idx)
+                    dropped += 1
+                    continue  # a shifted entry may now sit at idx
+                idx += 1
+        return dropped, end % self.slots
+
+    def gc_slices(self) -> Iterator[int]:
+        """One full sweep, yielding the number dropped after each slice (the lock is free in between)."""
+        start = 0
+        while True:
+            dropped, start = self.gc_slice(start)
+            yield dropped
+            if start == 0:
+                return
+
+    def gc(self) -> int:
+        return sum(self.gc_slices())
+
+    def live(self) -> int:
+        mm = self._open()
+        now = time.time()
+        n = 0
+        for idx in range(self.slots):
+            d, _t, _l, idle = _SLOT.unpack_from(mm, _HEADER.size + idx * _SLOT.size)
+            if d != _EMPTY and idle > now:
+                n += 1
+        return n
+
+class SharedTokenBucketLimiter:
+    """``TokenBucketLimiter`` interface backed by a ``SharedBucketTable``.
+
+    ``namespace`` separates limiters that share one table (requests, prompt
+    tokens, completion tokens).
+    """
+
+    def __init__(self, table: SharedBucketTable, namespace: str, refill_per_sec: float, capacity: int):
+        self.table = table
+        self.namespace = namespace
+        self.refill_per_sec = float(refill_per_sec)
+        self.capacity = int(capacity)
+
+    def allow(
+        self,
+        key: str,
+        cost: float = 1.0,
+        refill_per_sec: Optional[float] = None,
+        capacity: Optional[int] = None,
+    ) -> bool:
+        def take(tokens: float) -> Tuple[float, bool]:
+            if tokens >= cost:
+                return tokens - cost, True
+            return tokens, False
+
+        return self.table.apply(
+            self.table.digest(self.namespace, key),
+            self.refill_per_sec if refill_per_sec is None else float(refill_per_sec),
+            float(self.capacity if capacity is None else capacity),
+            take,
+        )
+
+    def adjust(
+        self,
+        key: str,
+        delta: float,
+        refill_per_sec: Optional[float] = None,
+        capacity: Optional[int] = None,
+    ) -> None:
+        cap = float(self.capacity if capacity is None else capacity)
+        self.table.apply(
+            self.table.digest(self.namespace, key),
+            self.refill_per_sec if refill_per_sec is None else float(refill_per_sec),
+            cap,
+            lambda tokens: (max(-cap, min(cap, tokens + delta)), True),
+        )
+
+    def gc(self) -> int:
+        return self.table.gc()
@@ -10,8 +10,11 @@ def enforce_model_allowlist(model: str, allowed: Iterable[str]) -> None:
         raise http_error(400, f"model '{model}' is not allowed")
 
 def enforce_prompt_size(text: str, max_chars: int) -> None:
-    if max_chars > 0 and len(text) > max_chars:
-        raise http_error(400, f"prompt too large ({len(text)} chars > {max_chars})")
+    enforce_prompt_length(len(text), max_chars)
+
+def enforce_prompt_length(chars: int, max_chars: int) -> None:
+    if max_chars > 0 and chars > max_chars:
+        raise http_error(400, f"prompt too large ({chars} chars > {max_chars})")
 
 def extract_prompt_from_chat(messages: list[dict]) -> str:
     # Rough: concatenate content
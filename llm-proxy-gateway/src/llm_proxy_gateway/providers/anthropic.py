@@ -1,19 +1,257 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import Any, Dict
-
-import httpx
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from .base import BaseProvider
-from ..errors import http_error
+from .http import UpstreamClient
+from .sse import SSE_DONE, iter_events, sse_data
+from .. import jsonutil
+from ..errors import UpstreamError, http_error
+
+ANTHROPIC_VERSION = "2023-06-01"
+# Anthropic requires max_tokens; used when the OpenAI request leaves it out.
+DEFAULT_MAX_TOKENS = 4096
+
+_FINISH_REASONS = {"end_turn": "stop", "stop_sequence": "stop", "max_tokens": "length", "tool_use": "tool_calls"}
+
+def _upstream_model(model: str) -> str:
+    # "anthropic:claude-..." -> "claude-..." (the prefix only picks the provider)
+    return model.split(":", 1)[1] if ":" in model else model
+
+def _text(content: Any) -> str:
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text")
+
+def _image(url: str) -> Dict[str, Any]:
+    if url.startswith("data:") and ";base64," in url:
+        media_type, data = url[5:].split(";base64,", 1)
+        return {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}}
+    return {"type": "image", "source": {"type": "url", "url": url}}
+
+def _blocks(content: Any) -> List[Dict[str, Any]]:
+    if content is None:
+        return []
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}] if content else []
+    out = []
+    for part in content:
+        kind = part.get("type")
+        if kind == "text":
+            out.append({"type": "text", "text": part.get("text", "")})
+        elif kind == "image_url":
+            img = part.get("image_url")
+            out.append(_image(img.get("url", "") if isinstance(img, dict) else str(img)))
+        else:
+            raise http_error(400, f"unsupported content part type for anthropic: {kind}")
+    return out
+
+def _arguments(raw: Any) -> Any:
+    if not isinstance(raw, str):
+        return raw or {}
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        raise http_error(400, "tool call arguments must be a JSON object") from None
+
+def _tool_choice(choice: Any) -> Optional[Dict[str, Any]]:
+    if choice in (None, "auto"):
+        return {"type": "auto"} if choice else None
+    if choice == "required":
+        return {"type": "any"}
+    if choice == "none":
+        return {"type": "none"}
+    if isinstance(choice, dict) and choice.get("type") == "function":
+        return {"type": "tool", "name": choice["function"]["name"]}
+    raise http_error(400, f"unsupported tool_choice for anthropic: {choice!r}")
+
+def to_messages_request(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an OpenAI chat completions request onto an Anthropic Messages request."""
+    system: List[str] = []
+    messages: List[Dict[str, Any]] = []
+    for m in payload.get("messages") or []:
+        role = m.get("role")
+        if role in ("system", "developer"):
+            system.append(_text(m.get("content")))
+            continue
+        if role == "tool":
+            role, blocks = "user", [{"type": "tool_result", "tool_use_id": m.get("tool_call_id"), "content": _text(m.get("content"))}]
+        elif role == "assistant":
+            blocks = _blocks(m.get("content"))
+            for call in m.get("tool_calls") or []:
+                fn = call.get("function") or {}
+                blocks.append({"type": "tool_use", "id": call.get("id"), "name": fn.get("name"), "input": _arguments(fn.get("arguments"))})
+        elif role == "user":
+            blocks = _blocks(m.get("content"))
+        else:
+            raise http_error(400, f"unsupported message role for anthropic: {role}")
+        # Anthropic wants alternating turns: fold consecutive same-role messages (e.g. several tool results).
+        if messages and messages[-1]["role"] == role:
+            messages[-1]["content"].extend(blocks)
+        else:
+            messages.append({"role": role, "content": blocks})
+
+    body: Dict[str, Any] = {
+        "model": _upstream_model(str(payload.get("model", ""))),
+        "messages": messages,
+        "max_tokens": payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_MAX_TOKENS,
+    }
+    if system:
+        body["system"] = "\n\n".join(system)
+    for key in ("temperature", "top_p"):
+        if payload.get(key) is not None:
+            body[key] = payload[key]
+    stop = payload.get("stop")
+    if stop:
+        body["stop_sequences"] = [stop] if isinstance(stop, str) else list(stop)
+    if payload.get("user"):
+        body["metadata"] = {"user_id": str(payload["user"])}
+    tools = payload.get("tools")
+    if tools:
+        body["tools"] = [
+            {"name": t["function"]["name"], "description": t["function"].get("description", ""),
+             "input_schema": t["function"].get("parameters") or {"type": "object", "properties": {}}}
+            for t in tools if t.get("type") == "function"
+        ]
+    choice = _tool_choice(payload.get("tool_choice"))
+    if choice is not None:
+        body["tool_choice"] = choice
+    if payload.get("stream"):
+        body["stream"] = True
+    return body
+
+def _usage(u: Dict[str, Any]) -> Dict[str, int]:
+    prompt = int(u.get("input_tokens") or 0) + int(u.get("cache_read_input_tokens") or 0) + int(u.get("cache_creation_input_tokens") or 0)
+    completion = int(u.get("output_tokens") or 0)
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+def from_messages_response(resp: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Map an Anthropic Messages response onto an OpenAI ``chat.completion``."""
+    text: List[str] = []
+    tool_calls: List[Dict[str, Any]] = []
+    for block in resp.get("content") or []:
+        if block.get("type") == "text":
+            text.append(block.get("text", ""))
+        elif block.get("type") == "tool_use":
+            tool_calls.append({
+                "id": block.get("id"),
+                "type": "function",
+                "function": {"name": block.get("name"), "arguments": json.dumps(block.get("input") or {}, ensure_ascii=False)},
+            })
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(text) if text or not tool_calls else None}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": resp.get("id", ""),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": _FINISH_REASONS.get(resp.get("stop_reason") or "", "stop")}],
+        "usage": _usage(resp.get("usage") or {}),
+    }
+
+class StreamTranslator:
+    """Turns Anthropic streaming events into OpenAI chunk frames, one event at a time.
+
+    ``chat`` selects ``chat.completion.chunk`` deltas; otherwise legacy
+    ``text_completion`` chunks (text only). With ``include_usage`` a final chunk
+    with empty ``choices`` carries the token usage, as OpenAI does.
+    """
+
+    def __init__(self, model: str, chat: bool = True, include_usage: bool = False):
+        self.model = model
+        self.chat = chat
+        self.include_usage = include_usage
+        self.id = ""
+        self.created = int(time.time())
+        self.usage: Dict[str, Any] = {}
+        self._tool_index: Dict[int, int] = {}  # Anthropic content block index -> OpenAI tool_calls index
+        self.done = False
+
+    def _chunk(self, delta: Optional[Dict[str, Any]] = None, text: str = "", finish_reason: Optional[str] = None) -> bytes:
+        if self.chat:
+            choice: Dict[str, Any] = {"index": 0, "delta": delta or {}, "finish_reason": finish_reason}
+            obj = "chat.completion.chunk"
+        else:
+            choice = {"index": 0, "text": text, "finish_reason": finish_reason}
+            obj = "text_completion"
+        return sse_data({"id": self.id, "object": obj, "created": self.created, "model": self.model, "choices": [choice]})
+
+    def feed(self, event: str, data: Dict[str, Any]) -> List[bytes]:
+        kind = data.get("type", event)
+        if kind == "message_start":
+            msg = data.get("message") or {}
+            self.id = msg.get("id", "")
+            self.usage.update(msg.get("usage") or {})
+            return [self._chunk({"role": "assistant", "content": ""})] if self.chat else []
+        if kind == "content_block_start":
+            block = data.get("content_block") or {}
+            if block.get("type") == "tool_use" and self.chat:
+                i = self._tool_index[data.get("index", 0)] = len(self._tool_index)
+                call = {"index": i, "id": block.get("id"), "type": "function", "function": {"name": block.get("name"), "arguments": ""}}
+                return [self._chunk({"tool_calls": [call]})]
+            if block.get("type") == "text" and block.get("text"):
+                return [self._chunk({"content": block["text"]}, text=block["text"])]
+            return []
+        if kind == "content_block_delta":
+            delta = data.get("delta") or {}
+            if delta.get("type") == "text_delta":
+                return [self._chunk({"content": delta.get("text", "")}, text=delta.get("text", ""))]
+            if delta.get("type") == "input_json_delta" and self.chat:
+                i = self._tool_index.get(data.get("index", 0))
+                if i is None:
+                    return []
+                return [self._chunk({"tool_calls": [{"index": i, "function": {"arguments": delta.get("partial_json", "")}}]})]
+            return []  # thinking / signature deltas have no OpenAI counterpart
+        if kind == "message_delta":
+            self.usage.update(data.get("usage") or {})
+            reason = (data.get("delta") or {}).get("stop_reason")
+            if reason is None:
+                return []
+            return [self._chunk(finish_reason=_FINISH_REASONS.get(reason, "stop"))]
+        if kind == "message_stop":
+            self.done = True
+            out = []
+            if self.include_usage:
+                out.append(sse_data({
+                    "id": self.id, "object": "chat.completion.chunk" if self.chat else "text_completion",
+                    "created": self.created, "model": self.model, "choices": [], "usage": _usage(self.usage),
+                }))
+            out.append(SSE_DONE)
+            return out
+        if kind == "error":
+            err = data.get("error") or {}
+            status = 529 if err.get("type") == "overloaded_error" else None
+            raise UpstreamError(f"upstream stream error: {err.get('message', err.get('type', 'unknown'))}", upstream_status=status)
+        return []  # ping, content_block_stop, unknown future events
 
 class AnthropicProvider(BaseProvider):
+    """OpenAI-compatible front for the Anthropic Messages API.
+
+    Chat and legacy completions are translated both ways; streams are
+    translated event by event as they arrive. Anthropic has no embeddings API.
+    """
+
     name = "anthropic"
 
-    def __init__(self, base_url: str, api_key_env: str):
+    def __init__(self, base_url: str, api_key_env: str, client: Optional[UpstreamClient] = None):
         self.base_url = base_url.rstrip("/")
         self.api_key_env = api_key_env
+        self.client = client or UpstreamClient()
+
+    async def startup(self) -> None:
+        await self.client.open()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pool": self.client.stats()}
 
     def _api_key(self) -> str:
         key = os.getenv(self.api_key_env, "")
@@ -21,14 +259,64 @@ class AnthropicProvider(BaseProvider):
             raise http_error(500, f"missing upstream api key in env {self.api_key_env}")
         return key
 
+    def _url(self) -> str:
+        # Accept base_url with or without the /v1 suffix.
+        return self.base_url + ("/messages" if self.base_url.endswith("/v1") else "/v1/messages")
+
+    def _headers(self) -> Dict[str, str]:
+        return {"x-api-key": self._api_key(), "anthropic-version": ANTHROPIC_VERSION, "Content-Type": "application/json"}
+
+    @staticmethod
+    def _error(status: int, body: bytes) -> UpstreamError:
+        return UpstreamError(f"upstream error ({status}): {body[:200].decode('utf-8', 'replace')}", upstream_status=status)
+
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body = to_messages_request({**payload, "stream": False})
+        r = await self.client.post(self._url(), headers=self._headers(), content=jsonutil.dumps(body))
+        if r.status_code >= 400:
+            raise self._error(r.status_code, r.content)
+        return from_messages_response(jsonutil.loads(r.content), str(payload.get("model", "")))
+
+    async def _stream(self, payload: Dict[str, Any], chat: bool) -> AsyncIterator[bytes]:
+        body = to_messages_request({**payload, "stream": True})
+        opts = payload.get("stream_options") or {}
+        tr = StreamTranslator(str(payload.get("model", "")), chat=chat, include_usage=bool(opts.get("include_usage")))
+        headers = {**self._headers(), "Accept": "text/event-stream"}
+        async with self.client.stream("POST", self._url(), headers=headers, content=jsonutil.dumps(body)) as r:
+            if r.status_code >= 400:
+                raise self._error(r.status_code, await r.aread())
+            async for event, data in iter_events(r.aiter_lines()):
+                for frame in tr.feed(event, jsonutil.loads(data)):
+                    yield frame
+        if not tr.done:
+            raise UpstreamError("upstream stream ended before message_stop")
+
+    @staticmethod
+    def _as_chat(payload: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = payload.get("prompt", "")
+        text = "\n".join(str(p) for p in prompt) if isinstance(prompt, list) else str(prompt)
+        chat = {k: v for k, v in payload.items() if k not in ("prompt", "suffix", "echo", "logprobs", "best_of")}
+        return {**chat, "messages": [{"role": "user", "content": text}]}
+
     async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        # NOTE: This is a compatibility bridge. Anthropic's native API is different.
-        # Here we intentionally provide a simple error to avoid giving a false sense
-        # of full compatibility without explicit mapping.
-        raise http_error(501, "anthropic provider stub: implement mapping for your use-case")
+        return await self._post(payload)
 
     async def completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        raise http_error(501, "anthropic provider stub: implement mapping for your use-case")
+        out = await self._post(self._as_chat(payload))
+        choice = out["choices"][0]
+        return {
+            **out,
+            "object": "text_completion",
+            "choices": [{"index": 0, "text": choice["message"]["content"] or "", "finish_reason": choice["finish_reason"]}],
+        }
 
     async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        raise http_error(501, "anthropic provider stub: implement mapping for your use-case")
+        raise http_error(501, "anthropic has no embeddings API; route embeddings to another provider")
+
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for frame in self._stream(payload, chat=True):
+            yield frame
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for frame in self._stream(self._as_chat(payload), chat=False):
+            yield frame
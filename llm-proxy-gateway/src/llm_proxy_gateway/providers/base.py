@@ -1,11 +1,24 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..errors import http_error
 
 class BaseProvider(ABC):
     name: str
 
+    async def startup(self) -> None:
+        """Open long-lived resources (connection pools). Called from the app lifespan."""
+        return None
+
+    async def aclose(self) -> None:
+        """Release resources opened by ``startup``. Called from the app lifespan."""
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
     @abstractmethod
     async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         raise NotImplementedError
@@ -17,3 +30,11 @@ class BaseProvider(ABC):
     @abstractmethod
     async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         raise NotImplementedError
+
+    # Streaming: implementations are async generators yielding raw SSE bytes
+    # ("data: {...}\n\n" frames, ending with "data: [DONE]\n\n") as they arrive.
+    def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        raise http_error(501, f"provider '{self.name}' does not support streaming")
+
+    def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        raise http_error(501, f"provider '{self.name}' does not support streaming")
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from ..errors import UpstreamError
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _transport_error(e: httpx.TransportError) -> UpstreamError:
+    if isinstance(e, httpx.TimeoutException):
+        return UpstreamError(f"upstream timeout ({type(e).__name__})", status_code=504)
+    return UpstreamError(f"upstream connection error ({type(e).__name__})")
+
+class UpstreamClient:
+    """Long-lived, pooled HTTP client shared by every call to one upstream.
+
+    The underlying ``httpx.AsyncClient`` is opened by the app lifespan (or lazily
+    on first use) and kept until shutdown, so connections and TLS sessions are
+    reused across requests instead of being re-established per call.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_connections = int(max_connections)
+        self.max_keepalive_connections = int(max_keepalive_connections)
+        self.keepalive_expiry = float(keepalive_expiry)
+        self.http2 = bool(http2)
+        self.connect_timeout = float(connect_timeout)
+        self.read_timeout = float(read_timeout)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    def _build(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.read_timeout,
+            pool=self.connect_timeout,
+        )
+        transport = self._transport
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=limits, http2=self.http2)
+        return httpx.AsyncClient(transport=transport, timeout=timeout, limits=limits)
+
+    async def open(self) -> None:
+        _ = self.client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _track(self) -> AsyncIterator[None]:
+        self._in_flight += 1
+        self._requests += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._track():
+            try:
+                return await self.client.post(url, **kwargs)
+            except httpx.TransportError as e:
+                raise _transport_error(e) from e
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        async with self._track():
+            try:
+                async with self.client.stream(method, url, **kwargs) as r:
+                    yield r
+            except httpx.TransportError as e:
+                raise _transport_error(e) from e
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "http2": self.http2,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "requests": self._requests,
+            "occupancy": round(self._in_flight / self.max_connections, 4) if self.max_connections else 0.0,
+        }
+        # httpcore exposes the live connection list; httpx keeps the pool private,
+        # so this is best-effort and simply omitted for custom transports.
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        conns = getattr(pool, "connections", None)
+        if conns is not None:
+            out["connections"] = len(conns)
+            out["idle_connections"] = sum(1 for c in conns if c.is_idle())
+        return out
@@ -1,24 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import re
 import time
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from .base import BaseProvider
+from .sse import SSE_DONE, sse_data
 
 def _stable_hash(text: str) -> int:
     h = hashlib.sha256(text.encode("utf-8")).hexdigest()
     return int(h[:8], 16)
 
+def _pieces(text: str) -> List[str]:
+    # Word-sized deltas (whitespace kept attached) so joined deltas == full text
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
 class MockProvider(BaseProvider):
     name = "mock"
 
     async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        model = payload.get("model", "mock:demo")
-        messages = payload.get("messages", [])
-        prompt = " ".join([m.get("content","") for m in messages if isinstance(m.get("content"), str)])
-        seed = _stable_hash(prompt + model)
-        content = f"[mock] model={model} seed={seed} :: {self._respond(prompt)}"
+        model, prompt, seed, content = self._chat(payload)
         now = int(time.time())
         return {
             "id": f"chatcmpl-mock-{seed}",
@@ -30,10 +33,7 @@ class MockProvider(BaseProvider):
         }
 
     async def completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        model = payload.get("model", "mock:demo")
-        prompt = payload.get("prompt", "")
-        seed = _stable_hash(str(prompt) + model)
-        text = f"[mock] model={model} seed={seed} :: {self._respond(str(prompt))}"
+        model, prompt, seed, text = self._completion(payload)
         now = int(time.time())
         return {
             "id": f"cmpl-mock-{seed}",
@@ -59,6 +59,39 @@ class MockProvider(BaseProvider):
             data.append({"object": "embedding", "index": i, "embedding": vec})
         return {"object": "list", "model": model, "data": data, "usage": {"prompt_tokens": sum(max(1, len(t)//4) for t in texts), "total_tokens": sum(max(1, len(t)//4) for t in texts)}}
 
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        model, _prompt, seed, content = self._chat(payload)
+        base = {"id": f"chatcmpl-mock-{seed}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        yield sse_data({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for piece in _pieces(content):
+            # Yield to the loop between frames so chunks really go out one by one
+            await asyncio.sleep(0)
+            yield sse_data({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+        yield sse_data({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        yield SSE_DONE
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        model, _prompt, seed, text = self._completion(payload)
+        base = {"id": f"cmpl-mock-{seed}", "object": "text_completion", "created": int(time.time()), "model": model}
+        for piece in _pieces(text):
+            await asyncio.sleep(0)
+            yield sse_data({**base, "choices": [{"index": 0, "text": piece, "finish_reason": None}]})
+        yield sse_data({**base, "choices": [{"index": 0, "text": "", "finish_reason": "stop"}]})
+        yield SSE_DONE
+
+    def _chat(self, payload: Dict[str, Any]) -> Tuple[str, str, int, str]:
+        model = payload.get("model", "mock:demo")
+        messages = payload.get("messages", [])
+        prompt = " ".join([m.get("content","") for m in messages if isinstance(m.get("content"), str)])
+        seed = _stable_hash(prompt + model)
+        return model, prompt, seed, f"[mock] model={model} seed={seed} :: {self._respond(prompt)}"
+
+    def _completion(self, payload: Dict[str, Any]) -> Tuple[str, Any, int, str]:
+        model = payload.get("model", "mock:demo")
+        prompt = payload.get("prompt", "")
+        seed = _stable_hash(str(prompt) + model)
+        return model, prompt, seed, f"[mock] model={model} seed={seed} :: {self._respond(str(prompt))}"
+
     def _respond(self, prompt: str) -> str:
         p = prompt.strip()
         if not p:
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, Optional
-
-import httpx
+from typing import Any, AsyncIterator, Dict, Optional
 
 from .base import BaseProvider
-from ..errors import http_error
+from .http import UpstreamClient
+from .. import jsonutil
+from ..errors import UpstreamError, http_error
 
 class OpenAIProvider(BaseProvider):
     name = "openai"
 
-    def __init__(self, base_url: str, api_key_env: str):
+    def __init__(self, base_url: str, api_key_env: str, client: Optional[UpstreamClient] = None):
         self.base_url = base_url.rstrip("/")
         self.api_key_env = api_key_env
+        self.client = client or UpstreamClient()
+
+    async def startup(self) -> None:
+        await self.client.open()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pool": self.client.stats()}
 
     def _api_key(self) -> str:
         key = os.getenv(self.api_key_env, "")
@@ -30,10 +40,33 @@ class OpenAIProvider(BaseProvider):
     async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         return await self._post("/embeddings", payload)
 
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("/chat/completions", payload):
+            yield chunk
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async for chunk in self._stream("/completions", payload):
+            yield chunk
+
     async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        headers = {"Authorization": f"Bearer {self._api_key()}"}
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            r = await client.post(self.base_url + path, headers=headers, json=payload)
+        headers = {"Authorization": f"Bearer {self._api_key()}", "Content-Type": "application/json"}
+        r = await self.client.post(self.base_url + path, headers=headers, content=jsonutil.dumps(payload))
+        if r.status_code >= 400:
+            raise UpstreamError(f"upstream error ({r.status_code}): {r.text[:200]}", upstream_status=r.status_code)
+        return jsonutil.loads(r.content)
+
+    async def _stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        headers = {
+            "Authorization": f"Bearer {self._api_key()}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        }
+        async with self.client.stream("POST", self.base_url + path, headers=headers, content=jsonutil.dumps(payload)) as r:
             if r.status_code >= 400:
-                raise http_error(502, f"upstream error ({r.status_code}): {r.text[:200]}")
-            return r.json()
+                body = await r.aread()
+                raise UpstreamError(
+                    f"upstream error ({r.status_code}): {body[:200].decode('utf-8', 'replace')}", upstream_status=r.status_code
+                )
+            # Relay upstream SSE bytes untouched, chunk by chunk.
+            async for chunk in r.aiter_bytes():
+                yield chunk
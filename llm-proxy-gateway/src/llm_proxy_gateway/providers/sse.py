@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+def sse_data(obj: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event carrying a JSON object (OpenAI streaming framing)."""
+    return b"data: " + json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n\n"
+
+async def iter_events(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[str, str]]:
+    """Parse an SSE line stream into ``(event, data)`` pairs, each yielded as soon as its blank line arrives."""
+    event, data = "", []
+    async for line in lines:
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = "", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data:
+        yield event or "message", "\n".join(data)
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from .errors import UpstreamError
+from .providers.base import BaseProvider
+
+log = logging.getLogger("llm-proxy.upstream")
+
+def is_retryable(e: BaseException) -> bool:
+    return isinstance(e, UpstreamError) and e.retryable
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; open fails
+    fast for ``open_seconds``; then half-open lets ``half_open_max_calls`` probes
+    through at a time. A probe success closes the circuit, a failure re-opens it."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = float(open_seconds)
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+        self.clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def acquire(self) -> Optional[bool]:
+        """Admit a call: None when rejected, otherwise whether it is a half-open probe."""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return None
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release(self, success: Optional[bool], probe: bool = False) -> None:
+        """Report the outcome of an admitted call (None: it says nothing about upstream health).
+
+        ``probe`` is what ``acquire`` returned; only probes give back a half-open slot,
+        so calls admitted before the circuit opened cannot over-admit probes.
+        """
+        half_open = self._opened_at is not None
+        if probe:
+            self._probes = max(0, self._probes - 1)
+        if success is None:
+            return
+        if success:
+            self._failures = 0
+            self._opened_at = None
+            return
+        self._failures += 1
+        if half_open or self._failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+            self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures, "opened": self.opened, "rejected": self.rejected}
+
+class RetryBudget:
+    """Token bucket for retries: every call deposits ``ratio`` tokens and every
+    retry spends one, so retries stay near ``ratio`` of traffic; ``min_per_sec``
+    keeps a trickle available when traffic is low."""
+
+    def __init__(self, ratio: float = 0.1, min_per_sec: float = 1.0, burst: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        self.ratio = float(ratio)
+        self.min_per_sec = float(min_per_sec)
+        self.burst = float(burst)
+        self.clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+        self.exhausted = 0
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.min_per_sec)
+        self._last = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+def backoff_seconds(attempt: int, base: float, cap: float, rand: Callable[[], float] = random.random) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return rand() * min(cap, base * (2 ** attempt))
+
+class ResilientProvider(BaseProvider):
+    """Circuit breaker plus budgeted, jittered retries around one provider.
+
+    Retryable ``UpstreamError``s (transport errors, timeouts, 408/429/5xx) count
+    against the breaker and are retried up to ``max_retries`` times while the
+    retry budget allows. Other errors pass through untouched and do not count
+    against the breaker. With the circuit open, calls fail at once with a
+    retryable 503, which lets a fallback chain move on. Streams are retried only
+    before their first chunk.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        inner: BaseProvider,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        max_retries: int = 2,
+        base_delay_seconds: float = 0.1,
+        max_delay_seconds: float = 2.0,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+        rand: Callable[[], float] = random.random,
+    ):
+        self.name = name
+        self.inner = inner
+        self.breaker = breaker
+        self.budget = budget
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay_seconds = float(base_delay_seconds)
+        self.max_delay_seconds = float(max_delay_seconds)
+        self.sleep = sleep
+        self.rand = rand
+        self.retries = 0
+
+    async def startup(self) -> None:
+        await self.inner.startup()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def _enter(self) -> bool:
+        if self.breaker is None:
+            return False
+        probe = self.breaker.acquire()
+        if probe is None:
+            raise UpstreamError(f"provider '{self.name}' circuit open", status_code=503)
+        return probe
+
+    def _exit(self, e: Optional[BaseException], probe: bool) -> None:
+        # Only retryable errors count as failures; cancellation and client disconnects
+        # (GeneratorExit) are no verdict either way.
+        if self.breaker is not None:
+            self.breaker.release(True if e is None else (False if is_retryable(e) else None), probe)
+
+    async def _should_retry(self, attempt: int, e: BaseException) -> bool:
+        if not is_retryable(e) or attempt >= self.max_retries:
+            return False
+        if self.budget is not None and not self.budget.try_spend():
+            return False
+        self.retries += 1
+        log.info("retrying upstream call", extra={"provider": self.name})
+        await self.sleep(backoff_seconds(attempt, self.base_delay_seconds, self.max_delay_seconds, self.rand))
+        return True
+
+    async def _call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            probe = self._enter()
+            try:
+                out = await getattr(self.inner, method)(payload)
+            except Exception as e:
+                self._exit(e, probe)
+                if await self._should_retry(attempt, e):
+                    attempt += 1
+                    continue
+                raise
+            except BaseException as e:  # cancelled: frees a half-open probe slot, no verdict
+                self._exit(e, probe)
+                raise
+            self._exit(None, probe)
+            return out
+
+    async def _stream(self, method: str, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            probe = self._enter()
+            try:
+                chunks = getattr(self.inner, method)(payload)
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self._exit(None, probe)
+                return
+            except Exception as e:
+                self._exit(e, probe)
+                if await self._should_retry(attempt, e):
+                    attempt += 1
+                    continue
+                raise
+            except BaseException as e:  # cancelled: frees a half-open probe slot, no verdict
+                self._exit(e, probe)
+                raise
+            break
+        failure: Optional[BaseException] = None
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except BaseException as e:  # includes GeneratorExit when the client goes away
+            failure = e
+            raise
+        finally:
+            self._exit(failure, probe)
+
+    async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("chat_completions", payload)
+
+    async def completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("completions", payload)
+
+    async def embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._call("embeddings", payload)
+
+    async def chat_completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async with contextlib.aclosing(self._stream("chat_completions_stream", payload)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def completions_stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        async with contextlib.aclosing(self._stream("completions_stream", payload)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        out = dict(self.inner.stats())
+        out["retries"] = self.retries
+        if self.budget is not None:
+            out["retry_budget_exhausted"] = self.budget.exhausted
+        if self.breaker is not None:
+            out["circuit"] = self.breaker.stats()
+        return out
+
+Target = Tuple[str, Callable[[Dict[str, Any]], Any]]
+
+async def call_with_fallback(targets: Sequence[Target], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Try ``(model, call)`` targets in order, moving on only after retryable errors."""
+    for i, (model, call) in enumerate(targets):
+        p = payload if payload.get("model") == model else {**payload, "model": model}
+        try:
+            return await call(p)
+        except Exception as e:
+            if i == len(targets) - 1 or not is_retryable(e):
+                raise
+            log.warning("falling back from %s to %s: %s", model, targets[i + 1][0], getattr(e, "detail", e))
+    raise AssertionError("empty fallback chain")
+
+async def stream_with_fallback(targets: Sequence[Target], payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """Streaming variant: falls back only while no chunk has been sent."""
+    for i, (model, open_stream) in enumerate(targets):
+        p = payload if payload.get("model") == model else {**payload, "model": model}
+        chunks = open_stream(p)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            return
+        except Exception as e:
+            if i == len(targets) - 1 or not is_retryable(e):
+                raise
+            log.warning("falling back from %s to %s: %s", model, targets[i + 1][0], getattr(e, "detail", e))
+            continue
+        yield first
+        async for chunk in chunks:
+            yield chunk
+        return
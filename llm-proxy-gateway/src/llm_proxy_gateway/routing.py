@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Type
 
-from .config import ProviderCfg
+from .admission import AdmissionController, AdmittedProvider
+from .balancer import BalancedProvider, Endpoint
+from .config import EndpointCfg, HedgeCfg, ProviderCfg, RoutingCfg
 from .errors import http_error
+from .hedging import Hedger
+from .resilience import CircuitBreaker, ResilientProvider, RetryBudget
 from .providers.base import BaseProvider
+from .providers.http import UpstreamClient, http2_available
 from .providers.mock import MockProvider
 from .providers.openai import OpenAIProvider
 from .providers.anthropic import AnthropicProvider
@@ -20,24 +25,126 @@ class ProviderRegistry:
             raise http_error(400, f"unknown provider '{name}'")
         return p
 
+    async def startup(self) -> None:
+        for p in self.providers.values():
+            await p.startup()
+
+    async def aclose(self) -> None:
+        for p in self.providers.values():
+            await p.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: p.stats() for name, p in self.providers.items()}
+
+def _upstream_client(name: str, cfg: ProviderCfg) -> UpstreamClient:
+    if cfg.http2 and not http2_available():
+        raise ValueError(f"provider '{name}' has http2 enabled but 'h2' is not installed (pip install 'httpx[http2]')")
+    return UpstreamClient(
+        max_connections=cfg.max_connections,
+        max_keepalive_connections=cfg.max_keepalive_connections,
+        keepalive_expiry=cfg.keepalive_expiry_seconds,
+        http2=cfg.http2,
+        connect_timeout=cfg.connect_timeout_seconds,
+        read_timeout=cfg.read_timeout_seconds,
+    )
+
+_HTTP_PROVIDERS: Dict[str, Type[BaseProvider]] = {"openai": OpenAIProvider, "anthropic": AnthropicProvider}
+
+def _hedger(cfg: HedgeCfg) -> Optional[Hedger]:
+    if not cfg.enabled:
+        return None
+    return Hedger(
+        percentile=cfg.percentile,
+        budget_ratio=cfg.budget_ratio,
+        min_delay_seconds=cfg.min_delay_ms / 1000.0,
+        min_samples=cfg.min_samples,
+        models=cfg.models,
+    )
+
+def _http_provider(name: str, cfg: ProviderCfg) -> BaseProvider:
+    kind = cfg.kind.lower()
+    cls = _HTTP_PROVIDERS[kind]
+    if cfg.base_url and cfg.endpoints:
+        raise ValueError(f"provider '{name}': set either base_url or endpoints, not both")
+    endpoint_cfgs = cfg.endpoints
+    if not endpoint_cfgs:
+        if not cfg.base_url or not cfg.api_key_env:
+            raise ValueError(f"{kind} provider requires base_url and api_key_env")
+        if not cfg.hedge.enabled:
+            return cls(base_url=cfg.base_url, api_key_env=cfg.api_key_env, client=_upstream_client(name, cfg))
+        # Hedging goes through the balancer; with one endpoint the backup attempt reuses it.
+        endpoint_cfgs = [EndpointCfg(base_url=cfg.base_url)]
+
+    endpoints = []
+    for ep in endpoint_cfgs:
+        key_env = ep.api_key_env or cfg.api_key_env
+        if not key_env:
+            raise ValueError(f"provider '{name}': endpoint {ep.base_url} has no api_key_env")
+        # One pool per endpoint, so pool limits apply to each upstream separately.
+        provider = cls(base_url=ep.base_url, api_key_env=key_env, client=_upstream_client(name, cfg))
+        endpoints.append(Endpoint(ep.base_url, provider, ep.weight))
+    return BalancedProvider(
+        name,
+        endpoints,
+        strategy=cfg.balancer,
+        eject_after=cfg.eject_after_failures,
+        cooldown_seconds=cfg.eject_cooldown_seconds,
+        ewma_decay_seconds=cfg.ewma_decay_seconds,
+        hedger=_hedger(cfg.hedge),
+    )
+
+def _resilient(name: str, cfg: ProviderCfg, inner: BaseProvider) -> BaseProvider:
+    cb, rt = cfg.circuit_breaker, cfg.retry
+    breaker = None
+    if cb.enabled:
+        breaker = CircuitBreaker(cb.failure_threshold, cb.open_seconds, cb.half_open_max_calls)
+    return ResilientProvider(
+        name,
+        inner,
+        breaker=breaker,
+        budget=RetryBudget(rt.budget_ratio, rt.budget_min_per_sec),
+        max_retries=rt.max_retries,
+        base_delay_seconds=rt.base_delay_ms / 1000.0,
+        max_delay_seconds=rt.max_delay_ms / 1000.0,
+    )
+
+def _admitted(name: str, cfg: ProviderCfg, inner: BaseProvider) -> BaseProvider:
+    a = cfg.admission
+    if not a.enabled:
+        return inner
+    controller = AdmissionController(
+        limit=a.limit,
+        mode=a.mode,
+        min_limit=a.min_limit,
+        max_limit=a.max_limit,
+        max_queue=a.max_queue,
+        queue_timeout_seconds=a.queue_timeout_ms / 1000.0,
+        target_latency_seconds=a.target_latency_ms / 1000.0 if a.target_latency_ms is not None else None,
+        backoff_ratio=a.backoff_ratio,
+    )
+    return AdmittedProvider(name, inner, controller)
+
 def build_registry(provider_cfgs: Dict[str, ProviderCfg]) -> ProviderRegistry:
     built: Dict[str, BaseProvider] = {}
     for name, cfg in provider_cfgs.items():
         kind = cfg.kind.lower()
         if kind == "mock":
-            built[name] = MockProvider()
-        elif kind == "openai":
-            if not cfg.base_url or not cfg.api_key_env:
-                raise ValueError("openai provider requires base_url and api_key_env")
-            built[name] = OpenAIProvider(base_url=cfg.base_url, api_key_env=cfg.api_key_env)
-        elif kind == "anthropic":
-            if not cfg.base_url or not cfg.api_key_env:
-                raise ValueError("anthropic provider requires base_url and api_key_env")
-            built[name] = AnthropicProvider(base_url=cfg.base_url, api_key_env=cfg.api_key_env)
+            built[name] = _admitted(name, cfg, MockProvider())
+        elif kind in _HTTP_PROVIDERS:
+            # Breaker/retries outermost: an open circuit fails before queueing, retries queue again.
+            built[name] = _resilient(name, cfg, _admitted(name, cfg, _http_provider(name, cfg)))
         else:
             raise ValueError(f"unknown provider kind '{cfg.kind}' for provider '{name}'")
     return ProviderRegistry(providers=built)
 
+def route_chain(model: str, cfg: RoutingCfg) -> List[Tuple[str, str]]:
+    """``(provider name, model)`` targets for a requested model: itself, then its fallbacks."""
+    out = []
+    for target in [model, *cfg.fallbacks.get(model, [])]:
+        name, _upstream = provider_from_model(target)
+        out.append((name or cfg.default_provider, target))
+    return out
+
 def provider_from_model(model: str) -> Tuple[Optional[str], str]:
     # model format: "<provider>:<upstream_model>"
     if ":" not in model:
@@ -4,11 +4,17 @@ from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
-Role = Literal["system", "user", "assistant", "tool"]
+Role = Literal["system", "developer", "user", "assistant", "tool"]
+
+# Optional parameters below default to None and are only forwarded upstream when the
+# client sent them; undeclared keys are dropped.
 
 class ChatMessage(BaseModel):
     role: Role
-    content: Union[str, List[Dict[str, Any]]] = ""
+    content: Optional[Union[str, List[Dict[str, Any]]]] = ""
+    name: Optional[str] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+    tool_call_id: Optional[str] = None
 
 class ChatCompletionsRequest(BaseModel):
     model: str
@@ -16,6 +22,22 @@ class ChatCompletionsRequest(BaseModel):
     temperature: Optional[float] = 0.2
     max_tokens: Optional[int] = None
     stream: Optional[bool] = False
+    max_completion_tokens: Optional[int] = None
+    top_p: Optional[float] = None
+    n: Optional[int] = None
+    stop: Optional[Union[str, List[str]]] = None
+    presence_penalty: Optional[float] = None
+    frequency_penalty: Optional[float] = None
+    logit_bias: Optional[Dict[str, float]] = None
+    logprobs: Optional[bool] = None
+    top_logprobs: Optional[int] = None
+    seed: Optional[int] = None
+    user: Optional[str] = None
+    tools: Optional[List[Dict[str, Any]]] = None
+    tool_choice: Optional[Union[str, Dict[str, Any]]] = None
+    parallel_tool_calls: Optional[bool] = None
+    response_format: Optional[Dict[str, Any]] = None
+    stream_options: Optional[Dict[str, Any]] = None
 
 class CompletionsRequest(BaseModel):
     model: str
@@ -23,7 +45,19 @@ class CompletionsRequest(BaseModel):
     temperature: Optional[float] = 0.2
     max_tokens: Optional[int] = None
     stream: Optional[bool] = False
+    top_p: Optional[float] = None
+    n: Optional[int] = None
+    stop: Optional[Union[str, List[str]]] = None
+    presence_penalty: Optional[float] = None
+    frequency_penalty: Optional[float] = None
+    logit_bias: Optional[Dict[str, float]] = None
+    seed: Optional[int] = None
+    user: Optional[str] = None
+    stream_options: Optional[Dict[str, Any]] = None
 
 class EmbeddingsRequest(BaseModel):
     model: str
     input: Union[str, List[str]]
+    encoding_format: Optional[str] = None
+    dimensions: Optional[int] = None
+    user: Optional[str] = None
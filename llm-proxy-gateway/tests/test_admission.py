@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.admission import AdmissionController
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.errors import UpstreamError
+
+async def _hold(ac: AdmissionController, priority: int, gate: asyncio.Event, order: list, name: str, deadline=None):
+    async with ac.slot(priority, deadline):
+        order.append(name)
+        await gate.wait()
+
+async def test_queue_serves_higher_priority_first():
+    ac = AdmissionController(limit=1, max_queue=10, queue_timeout_seconds=5)
+    gate, order = asyncio.Event(), []
+    first = asyncio.create_task(_hold(ac, 0, gate, order, "first"))
+    await asyncio.sleep(0)
+    low = asyncio.create_task(_hold(ac, 0, gate, order, "low"))
+    high = asyncio.create_task(_hold(ac, 5, gate, order, "high"))
+    await asyncio.sleep(0)
+    assert ac.stats()["queued"] == 2
+    gate.set()
+    await asyncio.gather(first, low, high)
+    assert order == ["first", "high", "low"]
+    assert ac.in_flight == 0
+
+async def test_full_queue_rejects_or_sheds_lower_priority():
+    ac = AdmissionController(limit=1, max_queue=1, queue_timeout_seconds=5)
+    gate, order = asyncio.Event(), []
+    running = asyncio.create_task(_hold(ac, 0, gate, order, "running"))
+    await asyncio.sleep(0)
+    low = asyncio.create_task(_hold(ac, 0, gate, order, "low"))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as e:
+        async with ac.slot(0):
+            pass
+    assert e.value.status_code == 503 and ac.rejected_full == 1
+    high = asyncio.create_task(_hold(ac, 9, gate, order, "high"))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException):
+        await low
+    gate.set()
+    await asyncio.gather(running, high)
+    assert order == ["running", "high"] and ac.shed == 1
+
+async def test_queue_deadline_and_wait_estimate():
+    ac = AdmissionController(limit=1, max_queue=10, queue_timeout_seconds=5)
+    gate = asyncio.Event()
+    running = asyncio.create_task(_hold(ac, 0, gate, [], "running"))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException):
+        async with ac.slot(0, deadline_seconds=0.01):
+            pass
+    assert ac.timed_out == 1 and ac.stats()["queued"] == 0
+    ac._service_seconds = 1.0  # observed average: a queued call would wait ~1s
+    with pytest.raises(HTTPException):
+        async with ac.slot(0, deadline_seconds=0.2):
+            pass
+    assert ac.rejected_deadline == 1
+    gate.set()
+    await running
+
+async def test_aimd_grows_on_success_and_backs_off_on_overload():
+    ac = AdmissionController(limit=10, mode="aimd", min_limit=2, max_limit=100)
+    for _ in range(20):
+        async with ac.slot():
+            pass
+    assert ac.limit >= 11
+    before = ac._limit
+    with pytest.raises(UpstreamError):
+        async with ac.slot():
+            raise UpstreamError("throttled", upstream_status=429)
+    assert ac._limit == pytest.approx(before * 0.9)
+
+def test_provider_admission_stats_and_deadline_header():
+    y = """auth:
+  enabled: false
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+      admission:
+        enabled: true
+        limit: 2
+"""
+    with tempfile.TemporaryDirectory() as d:
+        p = Path(d) / "c.yaml"
+        p.write_text(y, encoding="utf-8")
+        c = TestClient(create_app(load_config(str(p))))
+        body = {"model": "mock:demo", "messages": [{"role": "user", "content": "hi"}]}
+        assert c.post("/v1/chat/completions", json=body, headers={"X-Queue-Deadline-Ms": "500"}).status_code == 200
+        assert c.post("/v1/chat/completions", json=body, headers={"X-Queue-Deadline-Ms": "soon"}).status_code == 400
+        adm = c.get("/stats").json()["providers"]["mock"]["admission"]
+        assert adm["admitted"] == 1 and adm["limit"] == 2
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway import routing
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.errors import UpstreamError
+from llm_proxy_gateway.providers.anthropic import AnthropicProvider, to_messages_request
+from llm_proxy_gateway.providers.http import UpstreamClient
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+class StandIn:
+    """Local stand-in for the Anthropic Messages API (via httpx.MockTransport)."""
+
+    def __init__(self, gate: asyncio.Event = None, status: int = 200):
+        self.gate = gate
+        self.status = status
+        self.requests = []
+
+    def events(self):
+        yield _sse("message_start", {"type": "message_start", "message": {"id": "msg_1", "usage": {"input_tokens": 7, "output_tokens": 1}}})
+        yield _sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        yield _sse("ping", {"type": "ping"})
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Hel"}})
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "lo"}})
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield _sse("content_block_start", {"type": "content_block_start", "index": 1,
+                                           "content_block": {"type": "tool_use", "id": "toolu_1", "name": "lookup", "input": {}}})
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": "{\"q\":"}})
+        yield _sse("content_block_delta", {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": " 1}"}})
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": 1})
+        yield _sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 12}})
+        yield _sse("message_stop", {"type": "message_stop"})
+
+    async def stream(self):
+        for i, frame in enumerate(self.events()):
+            if i == 1 and self.gate is not None:
+                await self.gate.wait()  # nothing more is sent until the client saw the first frame
+            # Split frames across network chunks to exercise the line parser.
+            yield frame[:5]
+            yield frame[5:]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append((request, body))
+        if self.status != 200:
+            return httpx.Response(self.status, json={"type": "error", "error": {"type": "overloaded_error", "message": "busy"}})
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=self.stream())
+        return httpx.Response(200, json={
+            "id": "msg_1", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": "Hi there"}, {"type": "tool_use", "id": "toolu_1", "name": "lookup", "input": {"q": 1}}],
+            "stop_reason": "tool_use", "usage": {"input_tokens": 10, "output_tokens": 5},
+        })
+
+def _provider(monkeypatch, standin: StandIn, base_url: str = "http://anthropic.test") -> AnthropicProvider:
+    monkeypatch.setenv("ANTHROPIC_TEST_KEY", "sk-ant")
+    client = UpstreamClient(transport=httpx.MockTransport(standin))
+    return AnthropicProvider(base_url=base_url, api_key_env="ANTHROPIC_TEST_KEY", client=client)
+
+def test_request_mapping():
+    body = to_messages_request({
+        "model": "anthropic:claude-x",
+        "messages": [
+            {"role": "system", "content": "Be brief."},
+            {"role": "user", "content": [{"type": "text", "text": "look"}, {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAA"}}]},
+            {"role": "assistant", "content": None, "tool_calls": [{"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{\"a\":1}"}}]},
+            {"role": "tool", "tool_call_id": "c1", "content": "r1"},
+            {"role": "user", "content": "and?"},
+        ],
+        "stop": "END",
+        "temperature": 0.2,
+        "tools": [{"type": "function", "function": {"name": "f", "parameters": {"type": "object"}}}],
+        "tool_choice": "required",
+    })
+    assert body["model"] == "claude-x"
+    assert body["system"] == "Be brief."
+    assert body["max_tokens"] > 0 and body["stop_sequences"] == ["END"] and body["temperature"] == 0.2
+    assert [m["role"] for m in body["messages"]] == ["user", "assistant", "user"]
+    assert body["messages"][0]["content"][1]["source"] == {"type": "base64", "media_type": "image/png", "data": "AAA"}
+    assert body["messages"][1]["content"] == [{"type": "tool_use", "id": "c1", "name": "f", "input": {"a": 1}}]
+    # The tool result and the next user turn share one user message.
+    assert [b["type"] for b in body["messages"][2]["content"]] == ["tool_result", "text"]
+    assert body["tools"][0]["input_schema"] == {"type": "object"} and body["tool_choice"] == {"type": "any"}
+
+async def test_chat_completion_round_trip(monkeypatch):
+    standin = StandIn()
+    p = _provider(monkeypatch, standin)
+    out = await p.chat_completions({"model": "anthropic:claude-x", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 20})
+    req, body = standin.requests[0]
+    assert req.url.path == "/v1/messages"
+    assert req.headers["x-api-key"] == "sk-ant" and req.headers["anthropic-version"]
+    assert body["max_tokens"] == 20 and "stream" not in body
+    assert out["object"] == "chat.completion" and out["model"] == "anthropic:claude-x"
+    choice = out["choices"][0]
+    assert choice["message"]["content"] == "Hi there" and choice["finish_reason"] == "tool_calls"
+    assert json.loads(choice["message"]["tool_calls"][0]["function"]["arguments"]) == {"q": 1}
+    assert out["usage"] == {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+    text = await p.completions({"model": "claude-x", "prompt": "hi"})
+    assert text["object"] == "text_completion" and text["choices"][0]["text"] == "Hi there"
+    assert standin.requests[1][1]["messages"] == [{"role": "user", "content": [{"type": "text", "text": "hi"}]}]
+    await p.aclose()
+
+async def test_stream_is_translated_event_by_event(monkeypatch):
+    gate = asyncio.Event()
+    p = _provider(monkeypatch, StandIn(gate=gate), base_url="http://anthropic.test/v1")
+    payload = {"model": "claude-x", "messages": [{"role": "user", "content": "hi"}], "stream": True, "stream_options": {"include_usage": True}}
+    frames = p.chat_completions_stream(payload)
+    # The first frame arrives while the upstream is still holding back the rest.
+    first = await asyncio.wait_for(frames.__anext__(), timeout=1.0)
+    assert json.loads(first[6:])["choices"][0]["delta"] == {"role": "assistant", "content": ""}
+    gate.set()
+    rest = [f async for f in frames]
+    assert rest[-1] == b"data: [DONE]\n\n"
+    chunks = [json.loads(f[6:]) for f in rest[:-1]]
+    deltas = [c["choices"][0]["delta"] for c in chunks if c["choices"]]
+    assert "".join(d.get("content", "") for d in deltas) == "Hello"
+    calls = [d["tool_calls"][0] for d in deltas if "tool_calls" in d]
+    assert calls[0]["id"] == "toolu_1" and calls[0]["function"]["name"] == "lookup"
+    assert "".join(c["function"]["arguments"] for c in calls) == "{\"q\": 1}"
+    assert [c["choices"][0]["finish_reason"] for c in chunks if c["choices"]][-1] == "tool_calls"
+    assert chunks[-1]["choices"] == [] and chunks[-1]["usage"]["completion_tokens"] == 12
+    assert all(c["id"] == "msg_1" and c["object"] == "chat.completion.chunk" for c in chunks)
+
+async def test_errors_map_to_upstream_error(monkeypatch):
+    p = _provider(monkeypatch, StandIn(status=529))
+    with pytest.raises(UpstreamError) as e:
+        await p.chat_completions({"model": "claude-x", "messages": [{"role": "user", "content": "hi"}]})
+    assert e.value.upstream_status == 529 and e.value.retryable
+    with pytest.raises(UpstreamError):
+        async for _ in p.chat_completions_stream({"model": "claude-x", "messages": [{"role": "user", "content": "hi"}], "stream": True}):
+            pass
+    with pytest.raises(HTTPException) as e:
+        await p.embeddings({"model": "claude-x", "input": "x"})
+    assert e.value.status_code == 501
+
+def test_gateway_forwards_tools_and_stream_usage(monkeypatch, tmp_path: Path):
+    standin = StandIn()
+    monkeypatch.setenv("ANTHROPIC_TEST_KEY", "sk-ant")
+    monkeypatch.setattr(routing, "_upstream_client", lambda name, cfg: UpstreamClient(transport=httpx.MockTransport(standin)))
+    p = tmp_path / "c.yaml"
+    p.write_text("""auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: anthropic
+  providers:
+    anthropic:
+      kind: anthropic
+      base_url: "http://anthropic.test"
+      api_key_env: "ANTHROPIC_TEST_KEY"
+""", encoding="utf-8")
+    h = {"Authorization": "Bearer k1"}
+    payload = {
+        "model": "anthropic:claude-x",
+        "messages": [{"role": "developer", "content": "Be brief."}, {"role": "user", "content": "hi"}],
+        "tools": [{"type": "function", "function": {"name": "lookup", "parameters": {"type": "object"}}}],
+        "tool_choice": {"type": "function", "function": {"name": "lookup"}},
+        "stop": ["END"],
+        "top_p": 0.9,
+    }
+    with TestClient(create_app(load_config(str(p)))) as c:
+        r = c.post("/v1/chat/completions", headers=h, json=payload)
+        assert r.status_code == 200, r.text
+        assert r.json()["choices"][0]["message"]["tool_calls"][0]["function"]["name"] == "lookup"
+        body = standin.requests[-1][1]
+        assert body["system"] == "Be brief." and body["stop_sequences"] == ["END"] and body["top_p"] == 0.9
+        assert body["tools"][0]["name"] == "lookup" and body["tool_choice"] == {"type": "tool", "name": "lookup"}
+
+        r = c.post("/v1/chat/completions", headers=h, json={**payload, "stream": True, "stream_options": {"include_usage": True}})
+        assert r.status_code == 200
+        chunks = [json.loads(line[6:]) for line in r.text.splitlines() if line.startswith("data: {")]
+        assert standin.requests[-1][1]["stream"] is True
+        assert chunks[-1]["choices"] == [] and chunks[-1]["usage"]["completion_tokens"] == 12
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict
+
+import pytest
+from fastapi import HTTPException
+
+from llm_proxy_gateway.balancer import BalancedProvider, Endpoint
+from llm_proxy_gateway.config import ProviderCfg
+from llm_proxy_gateway.errors import http_error
+from llm_proxy_gateway.providers.base import BaseProvider
+from llm_proxy_gateway.routing import build_registry
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class Backend(BaseProvider):
+    def __init__(self, name: str, clock: FakeClock, latency: float = 0.0):
+        self.name = name
+        self.clock = clock
+        self.latency = latency
+        self.fail = False
+        self.gate: asyncio.Event | None = None
+        self.calls = 0
+
+    async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        self.clock.now += self.latency
+        if self.fail:
+            raise http_error(502, "upstream error (503)")
+        return {"served_by": self.name}
+
+    async def completions(self, payload):
+        raise NotImplementedError
+
+    async def embeddings(self, payload):
+        raise NotImplementedError
+
+def _balanced(strategy="least_outstanding", weights=(1.0, 1.0), latencies=(0.0, 0.0), **kw):
+    clock = FakeClock()
+    a, b = Backend("a", clock, latencies[0]), Backend("b", clock, latencies[1])
+    p = BalancedProvider("p", [Endpoint("a", a, weights[0]), Endpoint("b", b, weights[1])], strategy=strategy, clock=clock, **kw)
+    return p, a, b, clock
+
+async def test_least_outstanding_respects_weights():
+    p, a, b, _ = _balanced(weights=(3.0, 1.0))
+    a.gate = asyncio.Event()
+    b.gate = a.gate
+    tasks = [asyncio.create_task(p.chat_completions({})) for _ in range(4)]
+    await asyncio.sleep(0)
+    assert (a.calls, b.calls) == (3, 1)
+    a.gate.set()
+    await asyncio.gather(*tasks)
+
+async def test_ewma_prefers_the_faster_endpoint():
+    p, a, b, _ = _balanced(strategy="ewma", latencies=(0.5, 0.05))
+    for _ in range(20):
+        await p.chat_completions({})
+    assert b.calls > 15
+    assert p.stats()["endpoints"][0]["ewma_ms"] == 500.0
+
+async def test_failing_endpoint_is_ejected_then_readmitted_on_probation():
+    p, a, b, clock = _balanced(eject_after=2, cooldown_seconds=30, rand=lambda: 0.0)
+    a.fail = True
+    for _ in range(2):  # ties keep the first endpoint
+        with pytest.raises(HTTPException) as e:
+            await p.chat_completions({})
+        assert e.value.status_code == 502
+    assert p.stats()["endpoints"][0]["ejected"]
+    for _ in range(3):
+        assert (await p.chat_completions({}))["served_by"] == "b"
+    clock.now += 31
+    with pytest.raises(HTTPException) as e:
+        await p.chat_completions({})  # back in rotation, one strike re-ejects
+    assert e.value.status_code == 502
+    assert p.stats()["endpoints"][0]["ejections"] == 2
+    a.fail = False
+    clock.now += 31
+    assert (await p.chat_completions({}))["served_by"] == "a"
+    assert not p.stats()["endpoints"][0]["ejected"]
+
+async def test_all_ejected_still_serves():
+    p, a, b, _ = _balanced(eject_after=1)
+    a.fail = b.fail = True
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            await p.chat_completions({})
+        assert e.value.status_code == 502
+    a.fail = False
+    b.fail = False
+    assert (await p.chat_completions({}))["served_by"] in ("a", "b")
+
+def test_registry_builds_balanced_provider_from_endpoints():
+    cfg = ProviderCfg(
+        kind="openai",
+        api_key_env="K",
+        endpoints=[{"base_url": "http://a/v1", "weight": 2}, {"base_url": "http://b/v1", "api_key_env": "K2"}],
+        balancer="ewma",
+    )
+    p = build_registry({"oa": cfg}).get("oa").inner
+    assert isinstance(p, BalancedProvider)
+    assert [ep.provider.base_url for ep in p.endpoints] == ["http://a/v1", "http://b/v1"]
+    assert p.endpoints[1].provider.api_key_env == "K2"
+    with pytest.raises(ValueError):
+        build_registry({"oa": ProviderCfg(kind="openai", api_key_env="K", base_url="http://x", endpoints=cfg.endpoints)})
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway import batch as batch_mod
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.batch import BatchRunner, BatchStore
+from llm_proxy_gateway.config import load_config
+
+def _cfg(tmp: Path) -> Path:
+    y = f"""auth:
+  enabled: true
+  api_keys:
+    - key: k1
+    - key: k2
+      allowed_models: ["mock:other"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+batch:
+  enabled: true
+  dir: "{tmp / 'batches'}"
+  poll_interval_seconds: 0.05
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+def _line(cid: str, url: str = "/v1/chat/completions", **body) -> str:
+    body = body or {"model": "mock:demo", "messages": [{"role": "user", "content": f"hello {cid}"}]}
+    return json.dumps({"custom_id": cid, "method": "POST", "url": url, "body": body})
+
+def _wait(c: TestClient, batch_id: str, headers: dict, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        b = c.get(f"/v1/batches/{batch_id}", headers=headers).json()
+        if b["status"] in ("completed", "failed", "cancelled", "expired") or time.monotonic() > deadline:
+            return b
+        time.sleep(0.02)
+
+def test_batch_end_to_end(tmp_path):
+    h = {"Authorization": "Bearer k1"}
+    with TestClient(create_app(load_config(str(_cfg(tmp_path))))) as c:
+        jsonl = "\n".join([
+            _line("a"),
+            _line("b"),
+            _line("too-big", model="mock:demo", messages=[{"role": "user", "content": "x" * 60_000}]),
+            _line("bad", model="mock:demo"),
+        ]) + "\n"
+        f = c.post("/v1/files?purpose=batch", headers=h, content=jsonl.encode()).json()
+        assert f["object"] == "file" and f["bytes"] == len(jsonl.encode())
+
+        created = c.post("/v1/batches", headers=h, json={"input_file_id": f["id"], "endpoint": "/v1/chat/completions"})
+        assert created.status_code == 200 and "owner" not in created.json()
+        b = _wait(c, created.json()["id"], h)
+        assert b["status"] == "completed", b
+        assert b["request_counts"] == {"total": 4, "completed": 2, "failed": 2}
+
+        out = [json.loads(x) for x in c.get(f"/v1/files/{b['output_file_id']}/content", headers=h).text.splitlines()]
+        assert sorted(r["custom_id"] for r in out) == ["a", "b"]
+        assert all(r["response"]["status_code"] == 200 and r["response"]["body"]["object"] == "chat.completion" for r in out)
+        errs = {json.loads(x)["custom_id"]: json.loads(x)["response"] for x in c.get(f"/v1/files/{b['error_file_id']}/content", headers=h).text.splitlines()}
+        assert errs["too-big"]["status_code"] == 400 and "prompt too large" in errs["too-big"]["body"]["error"]["message"]
+        assert errs["bad"]["status_code"] == 400 and "messages" in errs["bad"]["body"]["error"]["message"]
+
+        # Other keys cannot see the job or its files.
+        other = {"Authorization": "Bearer k2"}
+        assert c.get(f"/v1/batches/{b['id']}", headers=other).status_code == 404
+        assert c.get(f"/v1/files/{b['output_file_id']}/content", headers=other).status_code == 404
+        assert [x["id"] for x in c.get("/v1/batches", headers=h).json()["data"]] == [b["id"]]
+
+        # A key's model allowlist applies to its batch lines too.
+        f2 = c.post("/v1/files", headers=other, content=(_line("x") + "\n").encode()).json()
+        b2 = c.post("/v1/batches", headers=other, json={"input_file_id": f2["id"], "endpoint": "/v1/chat/completions"}).json()
+        assert _wait(c, b2["id"], other)["request_counts"]["failed"] == 1
+
+def test_invalid_input_fails_validation(tmp_path):
+    h = {"Authorization": "Bearer k1"}
+    with TestClient(create_app(load_config(str(_cfg(tmp_path))))) as c:
+        jsonl = _line("a") + "\n" + _line("a") + "\n" + _line("e", url="/v1/embeddings", model="mock:e", input="x") + "\nnot json\n"
+        f = c.post("/v1/files", headers=h, content=jsonl.encode()).json()
+        b = c.post("/v1/batches", headers=h, json={"input_file_id": f["id"], "endpoint": "/v1/chat/completions"}).json()
+        b = _wait(c, b["id"], h)
+        assert b["status"] == "failed" and b["output_file_id"] is None
+        assert [e["code"] for e in b["errors"]["data"]] == ["duplicate_custom_id", "invalid_url", "invalid_json_line"]
+        assert c.post("/v1/batches", headers=h, json={"input_file_id": f["id"], "endpoint": "/v1/moderations"}).status_code == 400
+        assert c.post("/v1/batches", headers=h, content=b"{not json").status_code == 400
+        bad_meta = {"input_file_id": f["id"], "endpoint": "/v1/chat/completions", "metadata": ["x"]}
+        assert c.post("/v1/batches", headers=h, json=bad_meta).status_code == 400
+
+def _store(tmp_path: Path, n: int) -> tuple:
+    store = BatchStore(str(tmp_path))
+    path = Path(store.files_dir) / "file-in.jsonl"
+    path.write_text("".join(_line(f"r{i}") + "\n" for i in range(n)))
+    store.register_file("file-in", "owner", "batch", "in.jsonl")
+    return store, store.create("owner", "file-in", "/v1/chat/completions", "24h", None, [])
+
+async def test_resume_skips_finished_requests_and_torn_lines(tmp_path):
+    store, meta = _store(tmp_path, 5)
+    meta["status"] = "in_progress"
+    meta["request_counts"]["total"] = 5
+    store.save(meta)
+    out = Path(store.file_path(f"file-{meta['id']}-output"))
+    out.write_text(json.dumps({"custom_id": "r0", "response": {"status_code": 200, "body": {}}}) + "\n" + '{"custom_id": "r1", "resp')
+
+    seen = []
+
+    async def execute(job, url, body):
+        seen.append(body["messages"][0]["content"])
+        if seen.count("hello r2") == 1 and seen[-1] == "hello r2":
+            return 503, {"error": {"message": "upstream overloaded (shed for higher priority)"}}
+        return 200, {"ok": True}
+
+    runner = BatchRunner(store, execute, provider_of=lambda body: "mock", poll_interval_seconds=0.01, retry_delay_seconds=0.0)
+    runner.start()
+    for _ in range(200):
+        if store.load(meta["id"])["status"] == "completed":
+            break
+        await asyncio.sleep(0.01)
+    await runner.aclose()
+    final = store.load(meta["id"])
+    assert final["status"] == "completed" and final["request_counts"] == {"total": 5, "completed": 5, "failed": 0}
+    assert sorted(seen) == ["hello r1", "hello r2", "hello r2", "hello r3", "hello r4"]  # r2 shed once, retried
+    assert runner.stats()["retries"] == 1
+    assert sorted(json.loads(x)["custom_id"] for x in out.read_text().splitlines()) == ["r0", "r1", "r2", "r3", "r4"]
+
+async def test_concurrency_bound_idle_gate_and_cancel(tmp_path):
+    store, meta = _store(tmp_path, 20)
+    gate = asyncio.Event()
+    active = peak = 0
+    busy = True
+
+    async def execute(job, url, body):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await gate.wait()
+        active -= 1
+        return 200, {}
+
+    runner = BatchRunner(
+        store, execute, provider_of=lambda body: "mock", concurrency=3, poll_interval_seconds=0.01, busy=lambda: busy,
+        progress_interval_seconds=0.02,
+    )
+    runner.start()
+    await asyncio.sleep(0.1)
+    assert active == 0  # interactive traffic holds batch work back
+    busy = False
+    await asyncio.sleep(0.1)
+    assert active == 3 and runner.stats()["in_flight"] == {"mock": 3}
+
+    assert store.cancel(meta["id"], "owner")["status"] == "cancelling"
+    await asyncio.sleep(0.1)  # the marker is checked every progress interval, not per line
+    gate.set()
+    for _ in range(200):
+        if store.load(meta["id"])["status"] == "cancelled":
+            break
+        await asyncio.sleep(0.01)
+    await runner.aclose()
+    final = store.load(meta["id"])
+    assert final["status"] == "cancelled" and final["cancelled_at"] and peak == 3
+    assert final["request_counts"]["completed"] == 3
+
+async def test_batch_file_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store, meta = _store(tmp_path, 3)
+    loop_thread = threading.current_thread()
+    threads = []
+
+    def recording(fn):
+        def wrapper(*args):
+            threads.append((fn.__name__, threading.current_thread()))
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(batch_mod, "_completed_ids", recording(batch_mod._completed_ids))
+    monkeypatch.setattr(batch_mod, "_read_pending", recording(batch_mod._read_pending))
+    store.cancel_requested = recording(store.cancel_requested)
+
+    async def execute(job, url, body):
+        return 200, {}
+
+    runner = BatchRunner(store, execute, provider_of=lambda body: "mock", poll_interval_seconds=0.01)
+    for name in ("_validate", "_active", "_persist", "_complete"):
+        setattr(runner, name, recording(getattr(runner, name)))
+    runner.start()
+    for _ in range(200):
+        if store.load(meta["id"])["status"] == "completed":
+            break
+        await asyncio.sleep(0.01)
+    await runner.aclose()
+    assert store.load(meta["id"])["status"] == "completed"
+    assert {name for name, _ in threads} == {
+        "_active", "_validate", "_completed_ids", "_read_pending", "cancel_requested", "_persist", "_complete",
+    }
+    assert all(t is not loop_thread for _, t in threads)
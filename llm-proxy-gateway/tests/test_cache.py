@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from llm_proxy_gateway.cache import LRUCache, approx_size
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_lru_order_and_item_cap():
+    c = LRUCache(ttl_seconds=60, max_items=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # a is now most recent
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+def test_byte_budget_evicts_least_recent():
+    big = {"data": "x" * 100}
+    c = LRUCache(ttl_seconds=60, max_items=100, max_bytes=approx_size(big) * 2)
+    c.set("a", big)
+    c.set("b", big)
+    c.set("c", big)
+    assert len(c) == 2 and c.get("a") is None
+    assert c.stats()["bytes"] <= c.max_bytes
+    c.set("huge", {"data": "x" * 10_000})
+    assert c.get("huge") is None and len(c) == 2
+
+def test_sweep_drops_expired_without_reads():
+    clock = FakeClock()
+    c = LRUCache(ttl_seconds=10, max_items=100, clock=clock)
+    c.set("a", 1)
+    clock.now = 5
+    c.set("b", 2)
+    clock.now = 11
+    assert c.sweep() == 1
+    assert len(c) == 1 and c.get("b") == 2
+    clock.now = 16
+    assert c.get("b") is None
+    st = c.stats()
+    assert st["expirations"] == 2 and st["hits"] == 1 and st["misses"] == 1
+
+async def test_disk_tier_is_shared_and_survives_restart(tmp_path):
+    from llm_proxy_gateway.cache import SQLiteCache, TieredCache
+
+    path = str(tmp_path / "l2.sqlite3")
+    a = TieredCache(LRUCache(ttl_seconds=60, max_items=10), SQLiteCache(path, ttl_seconds=60, max_bytes=0))
+    a.set("k", {"v": 1})
+    await a.aclose()  # flushes the background write
+
+    b = TieredCache(LRUCache(ttl_seconds=60, max_items=10), SQLiteCache(path, ttl_seconds=60, max_bytes=0))
+    assert b.l1.get("k") is None
+    assert await b.aget("k") == {"v": 1}
+    assert b.l1.get("k") == {"v": 1}  # promoted into L1
+    conns = list(b.l2._conns)
+    assert conns and not any(c is getattr(b.l2._local, "conn", None) for c in conns)  # read off the event loop thread
+    await b.aclose()
+    # Reader- and writer-thread connections are closed too.
+    for c in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            c.execute("SELECT 1")
+
+def test_disk_tier_prune_enforces_byte_budget(tmp_path):
+    from llm_proxy_gateway.cache import SQLiteCache
+
+    l2 = SQLiteCache(str(tmp_path / "l2.sqlite3"), ttl_seconds=60, max_bytes=250)
+    for i in range(5):
+        l2.set(f"k{i}", {"data": "x" * 90})
+    l2.prune()
+    st = l2.stats()
+    assert st["bytes"] <= 250 and st["items"] == 2
+    assert l2.get("k4") is not None and l2.get("k0") is None
+    l2.close()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import glob
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway import cli
+from llm_proxy_gateway.app import CONFIG_ENV, app_from_env
+from llm_proxy_gateway.cli import build_parser, uvicorn_options
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.metrics import METRICS_DIR_ENV
+
+def _cfg(tmp: Path) -> Path:
+    y = """server:
+  port: 9000
+  workers: 4
+  loop: asyncio
+  limit_concurrency: 500
+auth:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+def test_cli_overrides_server_config():
+    with tempfile.TemporaryDirectory() as d:
+        p = _cfg(Path(d))
+        cfg = load_config(str(p)).cfg
+        args = build_parser().parse_args(["--config", str(p), "--workers", "2", "--timeout-keep-alive", "30"])
+        opts = uvicorn_options(cfg, args)
+        assert opts["port"] == 9000
+        assert opts["workers"] == 2
+        assert opts["loop"] == "asyncio"
+        assert opts["http"] == "auto"
+        assert opts["timeout_keep_alive"] == 30
+        assert opts["limit_concurrency"] == 500
+
+def test_app_factory_reads_config_from_env(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setenv(CONFIG_ENV, str(_cfg(Path(d))))
+        c = TestClient(app_from_env())
+        assert c.get("/healthz").json() == {"ok": True}
+
+def test_cli_removes_its_temp_metrics_dir(monkeypatch):
+    seen = []
+
+    def run(*args, **kwargs):
+        seen.append(os.environ[METRICS_DIR_ENV])
+        assert os.path.isdir(seen[0])
+
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.setattr(cli.uvicorn, "run", run)
+        monkeypatch.setattr(sys, "argv", ["llm-proxy", "--config", str(_cfg(Path(d)))])
+        # main() writes both straight into os.environ; setenv first so teardown restores them.
+        monkeypatch.setenv(METRICS_DIR_ENV, "")
+        monkeypatch.setenv(CONFIG_ENV, "")
+        before = set(glob.glob(os.path.join(tempfile.gettempdir(), "llm-proxy-metrics-*")))
+        cli.main()
+    assert seen and not os.path.exists(seen[0])
+    assert set(glob.glob(os.path.join(tempfile.gettempdir(), "llm-proxy-metrics-*"))) == before
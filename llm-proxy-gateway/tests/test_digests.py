@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.digests import MessageDigests
+from llm_proxy_gateway.middleware.rate_limit import estimate_tokens
+from llm_proxy_gateway.policies.basic import extract_prompt_from_chat
+
+def _turns(n: int) -> list:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "x" * i} for i in range(n)]
+
+def test_lengths_match_joined_prompt_and_token_estimate():
+    d = MessageDigests()
+    msgs = _turns(5) + [
+        {"role": "user", "content": [{"type": "text", "text": "abc"}, {"type": "image_url", "image_url": {"url": "u"}}]},
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "t"}]},
+    ]
+    assert d.prompt_chars(msgs) == len(extract_prompt_from_chat(msgs))
+    assert d.prompt_chars([]) == 0
+    payload = {"messages": msgs}
+    assert estimate_tokens("/v1/chat/completions", payload, 4.0, 16, d.text_chars) == estimate_tokens("/v1/chat/completions", payload, 4.0, 16)
+
+def test_later_turns_reuse_earlier_digests():
+    d = MessageDigests()
+    key = d.chat_key("/v1/chat/completions", {"model": "m", "messages": _turns(10)})
+    assert d.stats()["misses"] == 10 and d.stats()["hits"] == 0
+    d.chat_key("/v1/chat/completions", {"model": "m", "messages": _turns(11)})
+    assert d.stats()["misses"] == 11 and d.stats()["hits"] == 10
+
+    # Same request -> same key; any change to a message or a parameter -> a different key.
+    assert d.chat_key("/v1/chat/completions", {"messages": _turns(10), "model": "m"}) == key
+    changed = _turns(10)
+    changed[3]["content"] += "!"
+    assert d.chat_key("/v1/chat/completions", {"model": "m", "messages": changed}) != key
+    assert d.chat_key("/v1/chat/completions", {"model": "m", "messages": _turns(10), "temperature": 0}) != key
+    swapped = _turns(10)
+    swapped[0], swapped[1] = swapped[1], swapped[0]
+    assert d.chat_key("/v1/chat/completions", {"model": "m", "messages": swapped}) != key
+
+def test_memo_is_bounded():
+    d = MessageDigests(max_items=3)
+    d.text_chars(_turns(5))
+    assert len(d) == 3 and d.stats()["evictions"] == 2
+    d = MessageDigests(max_chars=40)
+    d.text_chars(_turns(6) + [{"role": "user", "content": "y" * 100}])
+    assert d.stats()["chars"] <= 40
+
+def test_gateway_uses_digests_for_size_check_and_cache(tmp_path: Path):
+    p = tmp_path / "c.yaml"
+    p.write_text("""auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+policies:
+  max_prompt_chars: 30
+""", encoding="utf-8")
+    h = {"Authorization": "Bearer k1"}
+    with TestClient(create_app(load_config(str(p)))) as c:
+        msgs = [{"role": "user", "content": "a" * 10}, {"role": "assistant", "content": "b" * 10}]
+        first = c.post("/v1/chat/completions", headers=h, json={"model": "mock:demo", "messages": msgs})
+        assert first.status_code == 200
+        again = c.post("/v1/chat/completions", headers=h, json={"model": "mock:demo", "messages": msgs})
+        assert again.json() == first.json()
+        # 10 + 1 + 10 + 1 + 9 = 31 chars once joined
+        r = c.post("/v1/chat/completions", headers=h, json={"model": "mock:demo", "messages": msgs + [{"role": "user", "content": "c" * 9}]})
+        assert r.status_code == 400 and "31 chars" in r.text
+        stats = c.get("/stats", headers=h).json()["message_digests"]
+        assert stats["items"] == 3 and stats["hits"] >= 2
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.cache import LRUCache
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.embeddings import embed_with_item_cache
+from llm_proxy_gateway.providers.mock import MockProvider
+
+async def test_partial_miss_sends_only_new_items():
+    mock = MockProvider()
+    sent = []
+
+    async def call(payload):
+        sent.append(payload["input"])
+        return await mock.embeddings(payload)
+
+    cache = LRUCache(ttl_seconds=60, max_items=100)
+    first = await embed_with_item_cache(cache, {"model": "mock:embed", "input": ["a", "b"]}, call)
+    out = await embed_with_item_cache(cache, {"model": "mock:embed", "input": ["b", "new", "a", "new"]}, call)
+    assert sent == [["a", "b"], ["new"]]
+
+    direct = await mock.embeddings({"model": "mock:embed", "input": ["b", "new", "a", "new"]})
+    assert [d["index"] for d in out["data"]] == [0, 1, 2, 3]
+    assert [d["embedding"] for d in out["data"]] == [d["embedding"] for d in direct["data"]]
+    assert out["data"][0]["embedding"] == first["data"][1]["embedding"]
+    assert out["usage"]["prompt_tokens"] == 4  # one token per input in the mock
+
+async def test_string_input_fully_cached():
+    calls = 0
+
+    async def call(payload):
+        nonlocal calls
+        calls += 1
+        return await MockProvider().embeddings(payload)
+
+    cache = LRUCache(ttl_seconds=60, max_items=100)
+    a = await embed_with_item_cache(cache, {"model": "mock:embed", "input": "hello"}, call)
+    b = await embed_with_item_cache(cache, {"model": "mock:embed", "input": "hello"}, call)
+    assert calls == 1 and a == b and len(b["data"]) == 1
+
+async def test_batcher_merges_concurrent_requests():
+    import asyncio
+
+    from llm_proxy_gateway.embeddings import EmbeddingsBatcher
+
+    mock = MockProvider()
+    sent = []
+
+    async def call(payload):
+        sent.append(list(payload["input"]))
+        return await mock.embeddings(payload)
+
+    b = EmbeddingsBatcher(window_ms=20, max_batch_items=100)
+    reqs = [{"model": "mock:embed", "input": t} for t in ("x", "yy", "zzzzzzzz")] + [{"model": "mock:embed", "input": ["p", "q"]}]
+    outs = await asyncio.gather(*[b.embed(r, call) for r in reqs])
+    assert sent == [["x", "yy", "zzzzzzzz", "p", "q"]]
+    for r, out in zip(reqs, outs, strict=True):
+        direct = await mock.embeddings(r)
+        assert out["data"] == direct["data"]
+        assert out["usage"] == direct["usage"]
+
+async def test_batcher_flushes_at_max_items_and_propagates_errors():
+    import asyncio
+
+    import pytest
+
+    from llm_proxy_gateway.embeddings import EmbeddingsBatcher
+
+    async def boom(payload):
+        raise RuntimeError("down")
+
+    b = EmbeddingsBatcher(window_ms=10_000, max_batch_items=2)
+    res = await asyncio.wait_for(
+        asyncio.gather(b.embed({"model": "m", "input": "a"}, boom), b.embed({"model": "m", "input": "b"}, boom), return_exceptions=True),
+        1,
+    )
+    assert all(isinstance(r, RuntimeError) for r in res)
+    with pytest.raises(RuntimeError):
+        await b.embed({"model": "m", "input": ["a", "b"]}, boom)  # full-size request bypasses batching
+
+async def test_gateway_merges_concurrent_requests(tmp_path):
+    p = tmp_path / "c.yaml"
+    p.write_text("""auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+cache:
+  enabled: false
+embeddings:
+  batch_enabled: true
+  batch_window_ms: 50
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+""", encoding="utf-8")
+    app = create_app(load_config(str(p)))
+    h = {"Authorization": "Bearer k1"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gw") as c:
+        rs = await asyncio.gather(*[c.post("/v1/embeddings", headers=h, json={"model": "mock:e", "input": f"t{i}"}) for i in range(5)])
+        assert all(r.status_code == 200 and len(r.json()["data"]) == 1 for r in rs)
+        stats = (await c.get("/stats", headers=h)).json()["embeddings_batcher"]
+    assert stats["batches"] == 1 and stats["avg_batch_items"] == 5.0
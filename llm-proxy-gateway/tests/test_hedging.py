@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+
+from llm_proxy_gateway.balancer import BalancedProvider, Endpoint
+from llm_proxy_gateway.hedging import Hedger, is_idempotent
+from llm_proxy_gateway.providers.base import BaseProvider
+
+def _warm(h: Hedger, seconds: float = 0.01, n: int = 5) -> None:
+    for _ in range(n):
+        h.observe(seconds)
+
+async def test_backup_wins_and_slow_primary_is_cancelled():
+    h = Hedger(min_samples=5, min_delay_seconds=0.01, budget_ratio=1.0)
+    _warm(h)
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "primary"
+
+    async def fast():
+        return "backup"
+
+    assert await h.run(slow, fast) == "backup"
+    await asyncio.wait_for(cancelled.wait(), 1)
+    s = h.stats()
+    assert (s["hedges"], s["hedge_wins"], s["win_rate"]) == (1, 1, 1.0)
+    # The cancelled primary still counts, at no less than the hedge delay.
+    assert len(h._samples) == 7 and sum(x >= 0.01 for x in h._samples) == 6
+
+async def test_budget_caps_extra_requests():
+    h = Hedger(min_samples=5, min_delay_seconds=0.001, budget_ratio=0.25)
+    _warm(h, 0.001)
+    backups = 0
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return "primary"
+
+    async def backup():
+        nonlocal backups
+        backups += 1
+        await asyncio.sleep(1)
+        return "backup"
+
+    for _ in range(8):
+        assert await h.run(slow, backup) == "primary"
+    assert backups == 2
+    assert h.stats()["budget_exhausted"] == 6
+
+async def test_failed_primary_falls_back_to_backup_result():
+    h = Hedger(min_samples=5, min_delay_seconds=0.001, budget_ratio=1.0)
+    _warm(h, 0.001)
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def backup():
+        await asyncio.sleep(0.02)
+        return "backup"
+
+    assert await h.run(failing, backup) == "backup"
+
+def test_only_idempotent_calls_are_hedged():
+    assert is_idempotent("embeddings", {"input": "x"})
+    assert is_idempotent("chat_completions", {"temperature": 0})
+    assert not is_idempotent("chat_completions", {"temperature": 0.7})
+    assert not is_idempotent("chat_completions", {"temperature": 0, "n": 2})
+    assert not is_idempotent("chat_completions", {"temperature": 0, "stream": True})
+
+class _Backend(BaseProvider):
+    def __init__(self, name: str, delay: float):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+    async def chat_completions(self, payload):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"served_by": self.name}
+
+    async def completions(self, payload):
+        raise NotImplementedError
+
+    async def embeddings(self, payload):
+        raise NotImplementedError
+
+async def test_balanced_provider_hedges_to_another_endpoint():
+    slow, fast = _Backend("slow", 5), _Backend("fast", 0)
+    h = Hedger(min_samples=5, min_delay_seconds=0.01, budget_ratio=1.0)
+    _warm(h)
+    p = BalancedProvider("p", [Endpoint("slow", slow), Endpoint("fast", fast)], hedger=h, rand=lambda: 0.0)
+    assert (await p.chat_completions({"temperature": 0}))["served_by"] == "fast"
+    assert p.stats()["hedging"]["hedges"] == 1
+    await asyncio.sleep(0.01)  # the losing attempt unwinds after its cancellation is delivered
+    assert p.endpoints[0].outstanding == 0
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import json
+import logging
+
+from llm_proxy_gateway import jsonutil
+from llm_proxy_gateway.logging import JsonFormatter
+
+def test_fast_response_matches_stdlib_with_and_without_orjson(monkeypatch):
+    payload = {"data": [{"embedding": [0.5, -1.25, 3e-8]}], "text": "héllo", "n": 2**70}
+    body = jsonutil.FastJSONResponse(payload).body
+    assert json.loads(body) == payload
+    monkeypatch.setattr(jsonutil, "orjson", None)
+    assert jsonutil.backend() == "json"
+    assert json.loads(jsonutil.FastJSONResponse(payload).body) == payload
+
+def test_log_formatter_emits_json():
+    record = logging.LogRecord("x", logging.INFO, __file__, 0, "request", None, None)
+    record.status_code = 200
+    out = json.loads(JsonFormatter().format(record))
+    assert out["msg"] == "request" and out["status_code"] == 200
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+
+import httpx
+import pytest
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.evals import loadgen
+
+def _app(tmp_path):
+    p = tmp_path / "c.yaml"
+    p.write_text("""auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+""", encoding="utf-8")
+    return create_app(load_config(str(p)))
+
+def test_mix_and_percentiles():
+    assert loadgen.parse_mix("chat=3,embeddings=1") == [("chat", 0.75), ("embeddings", 0.25)]
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("chat=1,bogus=1")
+    ordered = [float(i) for i in range(1, 101)]
+    assert loadgen.percentile(ordered, 50) == 50.0
+    assert loadgen.percentile(ordered, 99) == 99.0
+    assert loadgen.percentile([], 50) is None
+
+    w = loadgen.Workload(mix=loadgen.parse_mix("chat_stream=1"), prompt_tokens=[5])
+    kind, path, payload = w.next()
+    assert kind == "chat_stream" and path == "/v1/chat/completions" and payload["stream"] is True
+    assert len(payload["messages"][0]["content"].split()) == 6  # serial + 5 words
+
+def test_ttft_waits_for_the_first_text():
+    role = {"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]}
+    assert not loadgen._has_token("data: " + json.dumps(role))
+    assert not loadgen._has_token("data: [DONE]") and not loadgen._has_token(": keep-alive")
+    assert loadgen._has_token("data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": "Hi"}}]}))
+    assert loadgen._has_token("data: " + json.dumps({"choices": [{"index": 0, "text": "Hi"}]}))
+
+async def test_closed_loop_run_against_app(tmp_path):
+    args = loadgen.build_parser().parse_args([
+        "run", "--base-url", "http://gw", "--api-key", "k1", "--concurrency", "4", "--requests", "20",
+        "--mix", "chat=1,chat_stream=1,embeddings=1", "--embed-inputs", "1,3",
+    ])
+    report = await loadgen.run(args, transport=httpx.ASGITransport(app=_app(tmp_path)))
+    assert report["requests"] == 20 and report["errors"] == 0
+    assert report["throughput_rps"] > 0 and report["latency_ms"]["p99"] >= report["latency_ms"]["p50"]
+    assert set(report["by_kind"]) <= {"chat", "chat_stream", "embeddings"}
+    assert "ttft_ms" in report["by_kind"]["chat_stream"] and "ttft_ms" not in report["by_kind"]["chat"]
+    json.dumps(report)  # machine-readable as is
+
+async def test_open_loop_counts_errors(tmp_path):
+    args = loadgen.build_parser().parse_args([
+        "run", "--base-url", "http://gw", "--api-key", "wrong", "--rps", "200", "--requests", "10",
+    ])
+    report = await loadgen.run(args, transport=httpx.ASGITransport(app=_app(tmp_path)))
+    assert report["config"]["mode"] == "open"
+    assert report["requests"] == 10 and report["error_rate"] == 1.0
+    assert report["statuses"] == {"401": 10}
+
+def test_compare_flags_regressions(tmp_path):
+    base = {"latency_ms": {"p50": 10.0, "p90": 20.0, "p99": 40.0}, "throughput_rps": 100.0, "error_rate": 0.0}
+    same = loadgen.compare(base, {**base, "latency_ms": {"p50": 10.5, "p90": 20.0, "p99": 41.0}})
+    assert same["regressions"] == []
+    worse = loadgen.compare(base, {**base, "latency_ms": {"p50": 10.0, "p90": 20.0, "p99": 60.0}, "throughput_rps": 80.0})
+    assert worse["regressions"] == ["latency_ms.p99", "throughput_rps"]
+
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    a.write_text(json.dumps(base))
+    b.write_text(json.dumps({**base, "error_rate": 0.05}))
+    assert loadgen.main(["compare", str(a), str(a)]) == 0
+    assert loadgen.main(["compare", str(a), str(b)]) == 1
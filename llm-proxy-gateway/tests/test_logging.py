@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import sys
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.logging import JsonFormatter, QueueingHandler
+from llm_proxy_gateway.middleware.access_log import AccessLogMiddleware
+
+class _GatedStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def write(self, s):
+        self.gate.wait(5)
+        return super().write(s)
+
+def _record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord("t", logging.INFO, __file__, 0, msg, None, None)
+
+def test_queue_handler_counts_drops_when_full():
+    stream = _GatedStream()
+    h = QueueingHandler(stream, queue_size=2, overflow="drop", batch_max=1)
+    h.setFormatter(JsonFormatter())
+    for i in range(10):  # at most one record is stuck in the writer and two wait in the queue
+        h.emit(_record(f"m{i}"))
+    assert h.dropped >= 7
+    stream.gate.set()
+    h.close()
+    lines = [json.loads(x)["msg"] for x in stream.getvalue().splitlines()]
+    assert len(lines) == h.written == 10 - h.dropped
+    assert lines[0] == "m0"
+
+def test_queue_handler_renders_args_and_exceptions_at_emit():
+    stream = io.StringIO()
+    h = QueueingHandler(stream)
+    h.setFormatter(JsonFormatter())
+    args = {"n": 1}
+    rec = logging.LogRecord("t", logging.ERROR, __file__, 0, "n=%(n)s", (args,), None)
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        rec.exc_info = sys.exc_info()
+    h.emit(rec)
+    args["n"] = 2
+    h.close()
+    out = json.loads(stream.getvalue())
+    assert out["msg"] == "n=1"
+    assert "RuntimeError: boom" in out["exc_info"]
+    # The caller's record is untouched for any other handler on the logger.
+    assert rec.msg == "n=%(n)s" and rec.args == args and rec.exc_info is not None
+
+def test_access_log_sampling_keeps_errors_and_slow_requests():
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return PlainTextResponse("ok")
+
+    @app.get("/slow")
+    async def slow():
+        time.sleep(0.02)
+        return PlainTextResponse("ok")
+
+    @app.get("/fail")
+    async def fail():
+        return PlainTextResponse("no", status_code=503)
+
+    app.add_middleware(
+        AccessLogMiddleware, sample_rate=1.0, route_sample_rates={"/ok": 0.0, "/slow": 0.0, "/fail": 0.0},
+        slow_request_ms=10, rand=lambda: 0.5,
+    )
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    log = logging.getLogger("llm-proxy.access")
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    try:
+        c = TestClient(app)
+        for path in ("/ok", "/slow", "/fail"):
+            c.get(path)
+    finally:
+        log.removeHandler(handler)
+    assert [r.path for r in records] == ["/slow", "/fail"]
+    assert not hasattr(records[0], "sample_rate")
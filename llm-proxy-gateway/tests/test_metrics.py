@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.metrics import GatewayMetrics, MetricsRegistry, merge, render
+
+def _cfg(tmp: Path, extra: str = "") -> Path:
+    y = f"""auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: true
+  per_key:
+    capacity: 2
+    refill_per_sec: 0.0001
+cache:
+  enabled: true
+routing:
+  default_provider: mock
+  fallbacks:
+    "mock:demo": ["mock:backup"]
+  providers:
+    mock:
+      kind: mock
+{extra}"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+HEADERS = {"Authorization": "Bearer k1"}
+PUBLIC = "metrics:\n  require_auth: false\n"
+
+def _value(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not in metrics")
+
+def test_metrics_endpoint_covers_requests_upstream_cache_and_rejects():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d), PUBLIC)))))
+        body = {"model": "mock:demo", "messages": [{"role": "user", "content": "hi"}]}
+        assert c.post("/v1/chat/completions", headers=HEADERS, json=body).status_code == 200
+        assert c.post("/v1/chat/completions", headers=HEADERS, json=body).status_code == 200
+        assert c.post("/v1/chat/completions", headers=HEADERS, json=body).status_code == 429
+
+        r = c.get("/metrics")  # opted out of auth: not rate limited either
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+        t = r.text
+        assert _value(t, 'llm_proxy_requests_total{method="POST",route="/v1/chat/completions",status="200"}') == 2
+        assert _value(t, 'llm_proxy_requests_total{method="POST",route="other",status="429"}') == 1
+        assert _value(t, 'llm_proxy_rate_limit_rejects_total{limit="requests"}') == 1
+        assert _value(t, 'llm_proxy_upstream_requests_total{provider="mock",model="mock:demo",outcome="ok"}') == 1
+        assert _value(t, 'llm_proxy_upstream_duration_seconds_count{provider="mock",model="mock:demo"}') == 1
+        assert _value(t, 'llm_proxy_upstream_duration_seconds_bucket{provider="mock",model="mock:demo",le="+Inf"}') == 1
+        assert _value(t, 'llm_proxy_cache_hits_total{tier="memory"}') == 1
+        assert _value(t, "llm_proxy_requests_in_flight") == 1  # the scrape itself
+
+def test_model_labels_are_bounded():
+    with tempfile.TemporaryDirectory() as d:
+        # No allowlist: served models are labelled, up to max_model_labels (the two fallback names count).
+        c = TestClient(create_app(load_config(str(_cfg(Path(d), PUBLIC + "  max_model_labels: 3\n")))))
+        for model in ("mock:new-1", "mock:new-2"):  # the per-key limit allows two requests
+            body = {"model": model, "messages": [{"role": "user", "content": "hi"}]}
+            assert c.post("/v1/chat/completions", headers=HEADERS, json=body).status_code == 200
+        t = c.get("/metrics").text
+        assert _value(t, 'llm_proxy_upstream_requests_total{provider="mock",model="mock:new-1",outcome="ok"}') == 1
+        assert _value(t, 'llm_proxy_upstream_requests_total{provider="mock",model="other",outcome="ok"}') == 1
+        assert "new-2" not in t
+
+def test_metrics_require_auth_by_default():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        assert c.get("/metrics").status_code == 401
+        assert c.get("/metrics", headers=HEADERS).status_code == 200
+        c = TestClient(create_app(load_config(str(_cfg(Path(d), PUBLIC)))))
+        assert c.get("/metrics").status_code == 200
+
+def test_multiprocess_snapshots_sum_counters_and_histograms():
+    with tempfile.TemporaryDirectory() as d:
+        a = GatewayMetrics(d, buckets=[0.1, 1.0])
+        a.requests.inc("GET", "/x", "200")
+        a.request_seconds.observe(0.05, "/x")
+        a.in_flight.inc()
+        a.registry.write_snapshot()
+        snap = a.registry.snapshot()
+        # A second worker that has exited: its counters stay, its gauges do not.
+        snap["pid"] = 2**22 + 12345
+        (Path(d) / "dead.json").write_text(json.dumps(snap))
+        t = a.render()
+        assert _value(t, 'llm_proxy_requests_total{method="GET",route="/x",status="200"}') == 2
+        assert _value(t, 'llm_proxy_request_duration_seconds_bucket{route="/x",le="0.1"}') == 2
+        assert _value(t, 'llm_proxy_request_duration_seconds_sum{route="/x"}') == 0.1
+        assert _value(t, "llm_proxy_requests_in_flight") == 1
+        assert os.path.exists(Path(d) / f"{os.getpid()}.json")
+
+async def test_async_snapshot_io_runs_off_the_event_loop(tmp_path: Path, monkeypatch):
+    m = GatewayMetrics(str(tmp_path))
+    m.requests.inc("GET", "/x", "200")
+    loop_thread = threading.get_ident()
+    io_threads = []
+    real_dump = json.dump
+    monkeypatch.setattr(json, "dump", lambda *a, **k: (io_threads.append(threading.get_ident()), real_dump(*a, **k)))
+    await m.registry.awrite_snapshot()
+    t = await m.arender()
+    assert _value(t, 'llm_proxy_requests_total{method="GET",route="/x",status="200"}') == 1
+    assert len(io_threads) == 2 and loop_thread not in io_threads
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
+
+def test_render_escapes_labels_and_cumulates_buckets():
+    r = MetricsRegistry()
+    h = r.histogram("h", "help", ("k",), buckets=[1, 2])
+    for v in (0.5, 1.5, 3):
+        h.observe(v, 'a"b')
+    t = render(merge([r.snapshot()]))
+    assert 'h_bucket{k="a\\"b",le="1"} 1' in t
+    assert 'h_bucket{k="a\\"b",le="2"} 2' in t
+    assert 'h_bucket{k="a\\"b",le="+Inf"} 3' in t
+    assert 'h_count{k="a\\"b"} 3' in t
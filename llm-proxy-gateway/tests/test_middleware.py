@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+
+def _cfg(tmp: Path, rate_limit: str = "enabled: false") -> Path:
+    y = f"""server:
+  request_body_max_bytes: 64
+auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  {rate_limit}
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+HEADERS = {"Authorization": "Bearer k1", "Content-Type": "application/json"}
+
+def test_rejections_carry_request_id():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        r = c.get("/healthz", headers={"X-Request-Id": "abc"})
+        assert r.status_code == 401
+        assert r.headers["X-Request-Id"] == "abc"
+        assert r.json()["detail"]["error"]["message"] == "unauthorized"
+
+def test_body_limit_content_length_and_chunked():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        big = b'{"model": "mock-1", "messages": [{"role": "user", "content": "' + b"x" * 100 + b'"}]}'
+        r = c.post("/v1/chat/completions", headers=HEADERS, content=big)
+        assert r.status_code == 413
+        assert "X-Request-Id" in r.headers
+
+        def chunks():
+            yield big[:40]
+            yield big[40:]
+
+        r = c.post("/v1/chat/completions", headers=HEADERS, content=chunks())
+        assert r.status_code == 413
+
+def test_unauthenticated_requests_do_not_spend_key_budget():
+    with tempfile.TemporaryDirectory() as d:
+        rl = "enabled: true\n  per_key:\n    capacity: 1\n    refill_per_sec: 0.0001"
+        c = TestClient(create_app(load_config(str(_cfg(Path(d), rl)))))
+        for _ in range(3):
+            assert c.get("/healthz").status_code == 401
+        assert c.get("/healthz", headers=HEADERS).status_code == 200
+        assert c.get("/healthz", headers=HEADERS).status_code == 429
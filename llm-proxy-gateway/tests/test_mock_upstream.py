@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+from llm_proxy_gateway.errors import UpstreamError
+from llm_proxy_gateway.evals.mock_upstream import Latency, MockUpstreamCfg, create_mock_upstream
+from llm_proxy_gateway.providers.http import UpstreamClient
+from llm_proxy_gateway.providers.openai import OpenAIProvider
+
+def _provider(monkeypatch, cfg: MockUpstreamCfg, sleeps: list) -> OpenAIProvider:
+    async def sleep(s: float) -> None:
+        sleeps.append(s)
+
+    monkeypatch.setenv("MOCK_UP_KEY", "x")
+    client = UpstreamClient(transport=httpx.ASGITransport(app=create_mock_upstream(cfg, sleep=sleep)))
+    return OpenAIProvider(base_url="http://mock-upstream/v1", api_key_env="MOCK_UP_KEY", client=client)
+
+def test_latency_specs():
+    rnd = random.Random(1)
+    assert Latency("fixed:0.25").sample(rnd) == 0.25
+    assert all(0.1 <= Latency("uniform:0.1,0.2").sample(rnd) <= 0.2 for _ in range(50))
+    assert all(Latency("normal:0,1").sample(rnd) >= 0.0 for _ in range(50))
+    assert Latency("lognormal:0.3,0.5").sample(rnd) > 0 and Latency("exp:0.3").sample(rnd) >= 0
+    with pytest.raises(ValueError):
+        Latency("uniform:0.1")
+    with pytest.raises(ValueError):
+        Latency("gamma:1,2")
+
+async def test_openai_provider_against_mock_upstream(monkeypatch):
+    sleeps: list = []
+    p = _provider(monkeypatch, MockUpstreamCfg(latency="fixed:0.5", tokens_per_second=20, completion_tokens=8), sleeps)
+    out = await p.chat_completions({"model": "m", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 4})
+    assert out["choices"][0]["message"]["content"] == "lorem ipsum dolor sit"
+    assert out["choices"][0]["finish_reason"] == "length" and out["usage"]["completion_tokens"] == 4
+    assert sleeps == [0.5]
+
+    sleeps.clear()
+    body = b"".join([c async for c in p.chat_completions_stream(
+        {"model": "m", "messages": [{"role": "user", "content": "hi"}], "stream": True, "stream_options": {"include_usage": True}}
+    )])
+    frames = [f for f in body.decode().split("\n\n") if f]
+    assert frames[-1] == "data: [DONE]"
+    chunks = [json.loads(f[6:]) for f in frames[:-1]]
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"]) == " ".join(["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"])
+    assert chunks[-1]["usage"]["completion_tokens"] == 8
+    # Time to first token, then one pacing gap between each of the 8 tokens.
+    assert sleeps == [0.5] + [0.05] * 7
+
+    emb = await p.embeddings({"model": "e", "input": ["a", "b"]})
+    assert len(emb["data"]) == 2 and len(emb["data"][0]["embedding"]) == 16
+
+async def test_injected_failures(monkeypatch):
+    p = _provider(monkeypatch, MockUpstreamCfg(rate_limit_rate=1.0, retry_after_seconds=3), [])
+    with pytest.raises(UpstreamError) as e:
+        await p.chat_completions({"model": "m", "messages": []})
+    assert e.value.upstream_status == 429 and e.value.retryable
+
+    p = _provider(monkeypatch, MockUpstreamCfg(error_rate=1.0), [])
+    with pytest.raises(UpstreamError) as e:
+        await p.completions({"model": "m", "prompt": "x"})
+    assert e.value.upstream_status == 500
+
+async def test_embeddings_count_toward_in_flight():
+    gate = asyncio.Event()
+
+    async def sleep(s: float) -> None:
+        await gate.wait()
+
+    app = create_mock_upstream(MockUpstreamCfg(), sleep=sleep)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock") as c:
+        calls = [asyncio.create_task(c.post("/v1/embeddings", json={"model": "e", "input": "x"})) for _ in range(3)]
+        for _ in range(50):
+            if (await c.get("/stats")).json()["in_flight"] == 3:
+                break
+            await asyncio.sleep(0.01)
+        gate.set()
+        assert all(r.status_code == 200 for r in await asyncio.gather(*calls))
+        stats = (await c.get("/stats")).json()
+    assert stats["peak_in_flight"] == 3 and stats["in_flight"] == 0 and stats["requests"] == 3
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.providers.mock import MockProvider
+
+def _cfg(tmp: Path) -> Path:
+    y = """auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+HEADERS = {"Authorization": "Bearer k1", "Content-Type": "application/json"}
+
+def test_invalid_json_and_schema_errors_are_422():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        r = c.post("/v1/chat/completions", headers=HEADERS, content=b"{not json")
+        assert r.status_code == 422
+        assert r.json()["detail"][0]["type"] == "json_invalid"
+        r = c.post("/v1/chat/completions", headers=HEADERS, json={"messages": []})
+        assert r.status_code == 422
+        assert r.json()["detail"][0]["loc"] == ["body", "model"]
+
+def test_upstream_payload_matches_model_dump_shape(monkeypatch):
+    seen = []
+    orig = MockProvider.chat_completions
+
+    async def spy(self, payload):
+        seen.append(payload)
+        return await orig(self, payload)
+
+    monkeypatch.setattr(MockProvider, "chat_completions", spy)
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        msgs = [{"role": "user", "content": "hi"}]
+        r = c.post("/v1/chat/completions", headers=HEADERS, json={"model": "mock:demo", "messages": msgs, "unknown": 1})
+        assert r.status_code == 200
+        # Unset optional parameters are left out; undeclared keys are dropped.
+        assert seen[-1] == {"model": "mock:demo", "messages": msgs, "temperature": 0.2, "stream": False}
+
+        tools = [{"type": "function", "function": {"name": "f", "parameters": {"type": "object"}}}]
+        msgs = [
+            {"role": "developer", "content": "be brief"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": None, "tool_calls": [{"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}]},
+            {"role": "tool", "tool_call_id": "c1", "content": "ok"},
+        ]
+        extra = {"tools": tools, "tool_choice": "auto", "stop": ["\n"], "top_p": 0.5, "max_tokens": None}
+        r = c.post("/v1/chat/completions", headers=HEADERS, json={"model": "mock:demo", "messages": msgs, **extra})
+        assert r.status_code == 200
+        assert seen[-1] == {"model": "mock:demo", "messages": msgs, "temperature": 0.2, "stream": False, **extra}
+        r = c.post("/v1/chat/completions", headers=HEADERS, json={"model": "mock:demo", "messages": msgs, "tools": "f"})
+        assert r.status_code == 422 and r.json()["detail"][0]["loc"] == ["body", "tools"]
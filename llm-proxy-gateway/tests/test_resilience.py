@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.errors import UpstreamError
+from llm_proxy_gateway.providers.base import BaseProvider
+from llm_proxy_gateway.resilience import CircuitBreaker, ResilientProvider, RetryBudget
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Flaky(BaseProvider):
+    name = "flaky"
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def chat_completions(self, payload):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"ok": True}
+
+    async def chat_completions_stream(self, payload):
+        self.calls += 1
+        for chunk in (b"a", b"b", b"c"):
+            yield chunk
+
+    async def completions(self, payload):
+        raise NotImplementedError
+
+    async def embeddings(self, payload):
+        raise NotImplementedError
+
+async def _no_sleep(_s):
+    return None
+
+async def test_retries_retryable_errors_only():
+    inner = Flaky([UpstreamError("x", upstream_status=503), UpstreamError("y")])
+    p = ResilientProvider("f", inner, max_retries=2, sleep=_no_sleep)
+    assert await p.chat_completions({}) == {"ok": True}
+    assert (inner.calls, p.retries) == (3, 2)
+
+    inner = Flaky([UpstreamError("bad request", upstream_status=400)])
+    p = ResilientProvider("f", inner, max_retries=2, sleep=_no_sleep)
+    with pytest.raises(UpstreamError):
+        await p.chat_completions({})
+    assert inner.calls == 1
+
+async def test_retry_budget_caps_retries():
+    clock = Clock()
+    budget = RetryBudget(ratio=0.0, min_per_sec=0.0, burst=1.0, clock=clock)
+    inner = Flaky([UpstreamError("x")] * 10)
+    p = ResilientProvider("f", inner, budget=budget, max_retries=5, sleep=_no_sleep)
+    with pytest.raises(UpstreamError):
+        await p.chat_completions({})
+    assert inner.calls == 2  # the one banked token allowed a single retry
+    assert budget.exhausted == 1
+
+async def test_circuit_opens_fails_fast_and_recovers_through_half_open():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=10, clock=clock)
+    inner = Flaky([UpstreamError("x")] * 3)
+    p = ResilientProvider("f", inner, breaker=breaker, max_retries=0)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            await p.chat_completions({})
+    assert breaker.state == "open"
+    with pytest.raises(UpstreamError) as e:
+        await p.chat_completions({})
+    assert e.value.status_code == 503 and inner.calls == 2
+    clock.now += 11
+    with pytest.raises(UpstreamError):
+        await p.chat_completions({})  # failed probe re-opens
+    assert breaker.state == "open"
+    clock.now += 11
+    assert await p.chat_completions({}) == {"ok": True}
+    assert breaker.state == "closed"
+
+async def test_abandoned_probe_stream_is_no_verdict():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=10, clock=clock)
+    p = ResilientProvider("f", Flaky([UpstreamError("x")]), breaker=breaker, max_retries=0)
+    with pytest.raises(UpstreamError):
+        await p.chat_completions({})
+    clock.now += 11
+    stream = p.chat_completions_stream({})
+    assert await stream.__anext__() == b"a"
+    await stream.aclose()  # client went away mid-stream
+    assert breaker.state == "half_open"
+    assert breaker.acquire() is True  # the probe slot was given back
+
+def test_calls_admitted_before_opening_do_not_free_probe_slots():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=10, clock=clock)
+    early = [breaker.acquire() for _ in range(3)]
+    assert early == [False] * 3
+    breaker.release(False, early[0])
+    clock.now += 11
+    assert breaker.acquire() is True
+    breaker.release(None, early[1])  # in flight since before the circuit opened
+    assert breaker.acquire() is None  # still only one probe at a time
+
+def _cfg(tmp: Path) -> Path:
+    y = """auth:
+  enabled: false
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  fallbacks:
+    "down:gpt-x": ["mock:backup"]
+  providers:
+    mock:
+      kind: mock
+    down:
+      kind: openai
+      base_url: "http://127.0.0.1:1/v1"
+      api_key_env: "DOWN_KEY"
+      connect_timeout_seconds: 0.5
+      retry:
+        max_retries: 0
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+def test_fallback_chain_moves_to_next_model(monkeypatch):
+    monkeypatch.setenv("DOWN_KEY", "k")
+    with tempfile.TemporaryDirectory() as d:
+        with TestClient(create_app(load_config(str(_cfg(Path(d)))))) as c:
+            body = {"model": "down:gpt-x", "messages": [{"role": "user", "content": "hi"}]}
+            r = c.post("/v1/chat/completions", json=body)
+            assert r.status_code == 200
+            assert r.json()["model"] == "mock:backup"
+            r = c.post("/v1/chat/completions", json={**body, "stream": True})
+            assert r.status_code == 200
+            assert "data: [DONE]" in r.text
+            r = c.post("/v1/chat/completions", json={**body, "model": "down:other"})
+            assert r.status_code == 502
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+
+from llm_proxy_gateway.middleware.rate_limit import TokenBucketLimiter
+from llm_proxy_gateway.middleware.shared_buckets import SharedBucketTable, SharedTokenBucketLimiter
+
+def _worker(path: str, n: int, out) -> None:
+    lim = SharedTokenBucketLimiter(SharedBucketTable(path, slots=64), "requests", refill_per_sec=0.0, capacity=10)
+    out.put(sum(1 for _ in range(n) if lim.allow("k1")))
+
+def test_capacity_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "rl.bin")
+    ctx = mp.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, 10, out)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(10)
+    assert sum(out.get(timeout=5) for _ in procs) == 10
+
+def test_namespaces_adjust_and_gc(tmp_path):
+    table = SharedBucketTable(str(tmp_path / "rl.bin"), slots=8)
+    a = SharedTokenBucketLimiter(table, "a", refill_per_sec=0.0, capacity=2)
+    b = SharedTokenBucketLimiter(table, "b", refill_per_sec=1e9, capacity=2)
+    assert a.allow("k") and a.allow("k") and not a.allow("k")
+    assert b.allow("k")  # separate bucket
+    a.adjust("k", 1.0)
+    assert a.allow("k")
+    assert table.gc() == 1  # b refilled instantly -> idle; a is still drained
+    assert table.live() == 1
+    for i in range(20):  # more keys than slots: idle slots get reused
+        assert b.allow(f"key-{i}")
+    assert table.table_full == 0
+
+def test_memory_backend_gc_drops_idle_buckets():
+    lim = TokenBucketLimiter(refill_per_sec=1e9, capacity=5)
+    drained = TokenBucketLimiter(refill_per_sec=0.0, capacity=5)
+    lim.allow("x")
+    drained.allow("x")
+    assert lim.gc() == 1 and len(lim) == 0
+    assert drained.gc() == 0 and len(drained) == 1
+
+def test_sliced_gc_keeps_probe_chains_intact(tmp_path):
+    table = SharedBucketTable(str(tmp_path / "rl.bin"), slots=32, gc_slice_slots=5)
+    drained = SharedTokenBucketLimiter(table, "live", refill_per_sec=0.0, capacity=1)
+    idle = SharedTokenBucketLimiter(table, "idle", refill_per_sec=1e9, capacity=1)
+    for i in range(14):  # interleaved so idle and live buckets share clusters
+        assert idle.allow(f"k{i}") and drained.allow(f"k{i}")
+    # Inserts already reuse some idle slots; the sweep drops the rest.
+    assert sum(table.gc_slices()) > 0 and table.live() == 14
+    # Every live bucket is still found (drained), not recreated full behind a broken chain.
+    assert not any(drained.allow(f"k{i}") for i in range(14))
+    assert table.gc() == 0
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from llm_proxy_gateway.singleflight import SingleFlight
+
+async def test_concurrent_duplicates_share_one_call():
+    sf = SingleFlight()
+    calls = 0
+    gate = asyncio.Event()
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await gate.wait()
+        return {"ok": calls}
+
+    tasks = [asyncio.create_task(sf.do("k", upstream)) for _ in range(10)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*tasks)
+    assert calls == 1
+    assert all(r == {"ok": 1} for r in results)
+    assert len(sf) == 0
+    assert sf.stats()["coalesced"] == 9
+
+async def test_error_reaches_every_waiter_and_key_is_released():
+    sf = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*[sf.do("k", boom) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(sf) == 0
+
+async def test_cancelled_waiter_does_not_cancel_others():
+    sf = SingleFlight()
+    gate = asyncio.Event()
+
+    async def upstream():
+        await gate.wait()
+        return 42
+
+    first = asyncio.create_task(sf.do("k", upstream))
+    second = asyncio.create_task(sf.do("k", upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+    assert await second == 42
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+async def test_call_cancelled_when_all_waiters_leave():
+    sf = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def upstream():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    t = asyncio.create_task(sf.do("k", upstream))
+    await started.wait()
+    t.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(sf) == 0
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import tempfile
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+
+from llm_proxy_gateway.app import create_app
+from llm_proxy_gateway.config import load_config
+from llm_proxy_gateway.providers.http import UpstreamClient
+from llm_proxy_gateway.providers.openai import OpenAIProvider
+
+def _cfg(tmp: Path) -> Path:
+    y = """auth:
+  enabled: true
+  api_keys: ["k1"]
+rate_limit:
+  enabled: false
+routing:
+  default_provider: mock
+  providers:
+    mock:
+      kind: mock
+"""
+    p = tmp / "c.yaml"
+    p.write_text(y, encoding="utf-8")
+    return p
+
+def _events(text: str) -> list:
+    out = []
+    for frame in text.split("\n\n"):
+        if frame.startswith("data: ") and frame != "data: [DONE]":
+            out.append(json.loads(frame[len("data: "):]))
+    return out
+
+def test_chat_stream_relays_sse_chunks():
+    with tempfile.TemporaryDirectory() as d:
+        c = TestClient(create_app(load_config(str(_cfg(Path(d))))))
+        headers = {"Authorization": "Bearer k1"}
+        body = {"model": "mock:demo", "messages": [{"role": "user", "content": "hi there"}]}
+        full = c.post("/v1/chat/completions", headers=headers, json=body).json()
+        r = c.post("/v1/chat/completions", headers=headers, json={**body, "stream": True})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        assert r.text.endswith("data: [DONE]\n\n")
+        events = _events(r.text)
+        assert all(e["object"] == "chat.completion.chunk" for e in events)
+        assert len(events) > 3
+        text = "".join(e["choices"][0]["delta"].get("content", "") for e in events)
+        assert text == full["choices"][0]["message"]["content"]
+        assert events[-1]["choices"][0]["finish_reason"] == "stop"
+
+async def test_openai_stream_passes_chunks_through(monkeypatch):
+    monkeypatch.setenv("UP_KEY", "sk-test")
+    frames = [b'data: {"n":1}\n\n', b'data: {"n":2}\n\n', b"data: [DONE]\n\n"]
+
+    async def gen():
+        for f in frames:
+            yield f
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=gen())
+
+    p = OpenAIProvider(base_url="http://up/v1", api_key_env="UP_KEY", client=UpstreamClient(transport=httpx.MockTransport(handler)))
+    got = [c async for c in p.chat_completions_stream({"model": "m", "messages": [], "stream": True})]
+    assert b"".join(got) == b"".join(frames)
+    await p.aclose()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from llm_proxy_gateway.middleware.rate_limit import TokenBucketLimiter, TokenUsageLimiter, estimate_tokens
+
+def _limiter(prompt_cap: int = 100, completion_cap: int = 100) -> TokenUsageLimiter:
+    return TokenUsageLimiter(
+        prompt=TokenBucketLimiter(refill_per_sec=0.0, capacity=prompt_cap),
+        completion=TokenBucketLimiter(refill_per_sec=0.0, capacity=completion_cap),
+        default_max_tokens=10,
+    )
+
+def _chat(text: str, max_tokens=None) -> dict:
+    return {"model": "m", "messages": [{"role": "user", "content": text}], "max_tokens": max_tokens}
+
+def test_estimate_uses_prompt_chars_and_max_tokens():
+    assert estimate_tokens("/v1/chat/completions", _chat("x" * 400, 50), 4.0, 256) == (100, 50)
+    assert estimate_tokens("/v1/completions", {"prompt": ["ab", "cd"]}, 4.0, 256) == (1, 256)
+    assert estimate_tokens("/v1/embeddings", {"input": "x" * 40}, 4.0, 256) == (10, 0)
+
+def test_settle_charges_real_usage_and_refunds_the_rest():
+    lim = _limiter()
+    res = lim.reserve("k", "/v1/chat/completions", _chat("x" * 200, 40))  # 50 + 40 reserved
+    res.record({"prompt_tokens": 20, "completion_tokens": 5})
+    lim.settle(res)
+    assert lim.prompt._buckets["k"].tokens == pytest.approx(80)
+    assert lim.completion._buckets["k"].tokens == pytest.approx(95)
+
+def test_no_upstream_call_refunds_everything_and_large_requests_reject():
+    lim = _limiter(prompt_cap=30)
+    res = lim.reserve("k", "/v1/chat/completions", _chat("x" * 80))
+    lim.settle(res)  # e.g. served from cache
+    assert lim.prompt._buckets["k"].tokens == pytest.approx(30)
+
+    res = lim.reserve("k", "/v1/chat/completions", _chat("x" * 400))  # capped at capacity
+    res.record({"prompt_tokens": 100, "completion_tokens": 1})
+    lim.settle(res)
+    assert lim.prompt._buckets["k"].tokens == pytest.approx(-30)  # debt, floored at -capacity
+    with pytest.raises(HTTPException) as e:
+        lim.reserve("k", "/v1/chat/completions", _chat("hi"))
+    assert e.value.status_code == 429
+    assert lim.completion._buckets["k"].tokens == pytest.approx(99)  # untouched by the rejected reserve
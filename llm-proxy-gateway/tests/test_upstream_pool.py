@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import httpx
+
+from llm_proxy_gateway.config import ProviderCfg
+from llm_proxy_gateway.providers.http import UpstreamClient
+from llm_proxy_gateway.providers.openai import OpenAIProvider
+from llm_proxy_gateway.routing import build_registry
+
+async def test_openai_provider_reuses_one_client(monkeypatch):
+    monkeypatch.setenv("UP_KEY", "sk-test")
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["authorization"])
+        return httpx.Response(200, json={"object": "list", "data": []})
+
+    client = UpstreamClient(transport=httpx.MockTransport(handler))
+    p = OpenAIProvider(base_url="http://up/v1", api_key_env="UP_KEY", client=client)
+    await p.startup()
+    first = client.client
+    for _ in range(3):
+        await p.embeddings({"model": "m", "input": "x"})
+    assert client.client is first
+    assert seen == ["Bearer sk-test"] * 3
+    st = p.stats()["pool"]
+    assert st["requests"] == 3 and st["in_flight"] == 0
+    await p.aclose()
+
+def test_registry_applies_pool_settings():
+    reg = build_registry({
+        "up": ProviderCfg(kind="openai", base_url="http://up/v1", api_key_env="K", max_connections=7, read_timeout_seconds=3.0),
+    })
+    client = reg.get("up").inner.client  # behind the circuit breaker / retry wrapper
+    assert client.max_connections == 7
+    assert client.read_timeout == 3.0